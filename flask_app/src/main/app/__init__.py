@@ -3,6 +3,7 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_admin import Admin
 from flask_wtf.csrf import CSRFProtect
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 from config import config
 
@@ -11,7 +12,10 @@ from sqlalchemy import event
 from sqlalchemy.engine import Engine
 import sqlite3
 
-db = SQLAlchemy()
+from .routing import RoutingSession
+
+# Reads inside replica_reads() go to a replica bind, see app/routing.py
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 csrf = CSRFProtect()
 
  ## Enforce FK in SQLite3 ##
@@ -22,6 +26,18 @@ def set_sqlite_pragma(dbapi_connection, connection_record):
         cursor.execute("PRAGMA foreign_keys=ON;")
         cursor.close()
 
+def configure_sqlite(engine, pragmas):
+    """Apply the configured SQLITE_PRAGMAS to each new connection of a SQLite engine."""
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_profile_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value};")
+        cursor.close()
+
 def create_app(config_name="development"): 
 
     basedir = os.path.abspath(os.path.dirname(__file__))
@@ -31,8 +47,32 @@ def create_app(config_name="development"):
                 static_folder=os.path.join(basedir, 'static'))
     
     app.config.from_object(config[config_name])
+    # Behind reverse proxies or a CDN, take the client's address and scheme
+    # from the X-Forwarded-* headers the trusted hops add
+    proxy_hops = app.config.get("TRUSTED_PROXY_HOPS", 0)
+    if proxy_hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops, x_proto=proxy_hops)
+    from . import (assets, availability, cache, hashing, identity, images, metrics, outbox, page_cache,
+                   passwords, ratelimit, routing, spool)
+    metrics.configure_engine_options(app)
     db.init_app(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            configure_sqlite(engine, app.config.get("SQLITE_PRAGMAS"))
+    metrics.init_app(app)
+    hashing.init_app(app)
+    passwords.init_app(app)
     csrf.init_app(app)
+    cache.init_app(app)
+    ratelimit.init_app(app)
+    identity.init_app(app)
+    spool.init_app(app)
+    outbox.init_app(app)
+    page_cache.init_app(app)
+    availability.init_app(app)
+    images.init_app(app)
+    assets.init_app(app)
+    routing.init_app(app)
     config[config_name].init_app(app)
 
     from .models import User, Role, Booking, Park, Message, AppIndexView, UserView, RoleView, BookingView, ParkView, MessageView
@@ -42,10 +82,8 @@ def create_app(config_name="development"):
     login_manager.login_view = 'login.login'
     login_manager.init_app(app)
     
-    # User loader function for Flask-Login
-    @login_manager.user_loader
-    def load_user(user_id):
-        return db.session.get(User, int(user_id))
+    # User loader function for Flask-Login; a cached principal, see app/identity.py
+    login_manager.user_loader(identity.load_principal)
     
     # Flask-Admin
     admin = Admin (app, name='Wednesdays-Wicked-Adventures', template_mode='bootstrap4', index_view=AppIndexView())
@@ -61,6 +99,33 @@ def create_app(config_name="development"):
     app.register_blueprint(login_blueprint)   
     from .main import main as main_blueprint
     app.register_blueprint(main_blueprint)
+    # JSON API
+    from .api import api as api_blueprint
+    app.register_blueprint(api_blueprint)
+    # Metrics for scraping
+    app.register_blueprint(metrics.metrics)
+
+    # CLI commands
+    from .inventory import inventory_cli
+    from .schema import schema_cli
+    from .images import images_cli
+    from .assets import assets_cli
+    from .passwords import passwords_cli
+    from .bulk import bookings_cli
+    from .spool import contact_cli
+    from .outbox import outbox_cli
+    from .idempotency import idempotency_cli
+    from .rollups import rollups_cli
+    app.cli.add_command(inventory_cli)
+    app.cli.add_command(schema_cli)
+    app.cli.add_command(images_cli)
+    app.cli.add_command(assets_cli)
+    app.cli.add_command(passwords_cli)
+    app.cli.add_command(bookings_cli)
+    app.cli.add_command(contact_cli)
+    app.cli.add_command(outbox_cli)
+    app.cli.add_command(idempotency_cli)
+    app.cli.add_command(rollups_cli)
 
     @app.errorhandler(404)
     def page_not_found(e):
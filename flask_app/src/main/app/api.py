@@ -0,0 +1,115 @@
+from datetime import date, datetime, time, timedelta
+from flask import Blueprint, current_app, jsonify, request, url_for
+from flask_login import login_required, current_user
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import joinedload
+from .availability import availability
+from .models import Booking
+from .routing import replica_reads
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+WINDOWS = ('upcoming', 'past')
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(booking):
+    return f'{booking.date.isoformat()},{booking.booking_id}'
+
+
+def decode_cursor(cursor):
+    """Parse a '<iso datetime>,<booking id>' cursor; raises ValueError if malformed."""
+    date_part, _, id_part = cursor.rpartition(',')
+    return datetime.fromisoformat(date_part), int(id_part)
+
+
+def bookings_page(user_id, window='upcoming', cursor=None, limit=50, now=None):
+    """
+    One keyset page of a user's bookings.
+
+    Upcoming bookings (today onwards) are returned soonest first and past
+    bookings most recent first. `cursor` is the (date, booking_id) of the
+    last row of the previous page, so each page is an index range scan on
+    ix_bookings_user_date no matter how deep the user pages.
+
+    Returns (bookings, next_cursor); next_cursor is None on the last page.
+    """
+    start_of_today = datetime.combine((now or datetime.now()).date(), time.min)
+    query = Booking.query.options(joinedload(Booking.park)).filter(Booking.user_id == user_id)
+
+    if window == 'upcoming':
+        query = query.filter(Booking.date >= start_of_today)
+        if cursor:
+            after_date, after_id = cursor
+            query = query.filter(or_(Booking.date > after_date,
+                                     and_(Booking.date == after_date, Booking.booking_id > after_id)))
+        query = query.order_by(Booking.date, Booking.booking_id)
+    else:
+        query = query.filter(Booking.date < start_of_today)
+        if cursor:
+            before_date, before_id = cursor
+            query = query.filter(or_(Booking.date < before_date,
+                                     and_(Booking.date == before_date, Booking.booking_id < before_id)))
+        query = query.order_by(Booking.date.desc(), Booking.booking_id.desc())
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.limit(limit + 1).all()
+    bookings = rows[:limit]
+    next_cursor = encode_cursor(bookings[-1]) if len(rows) > limit else None
+    return bookings, next_cursor
+
+
+def next_page_url(window, next_cursor, limit):
+    if next_cursor is None:
+        return None
+    cursor_arg = 'after' if window == 'upcoming' else 'before'
+    return url_for('api.bookings', window=window, limit=limit, **{cursor_arg: next_cursor})
+
+
+@api.route('/bookings')
+@replica_reads()
+@login_required
+def bookings():
+    window = request.args.get('window', 'upcoming')
+    if window not in WINDOWS:
+        return jsonify(error=f'window must be one of {", ".join(WINDOWS)}'), 400
+
+    default_limit = current_app.config.get('BOOKINGS_PAGE_SIZE', 50)
+    limit = request.args.get('limit', default_limit, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    raw_cursor = request.args.get('after' if window == 'upcoming' else 'before')
+    try:
+        cursor = decode_cursor(raw_cursor) if raw_cursor else None
+    except ValueError:
+        return jsonify(error='Invalid cursor'), 400
+
+    page, next_cursor = bookings_page(current_user.user_id, window, cursor, limit)
+    return jsonify(
+        bookings=[
+            dict(booking.to_json(), park={'name': booking.park.name, 'location': booking.park.location})
+            for booking in page
+        ],
+        next=next_page_url(window, next_cursor, limit)
+    )
+
+
+@api.route('/availability')
+@replica_reads()
+def park_availability():
+    """Remaining tickets per park and day, e.g. ?park_id=1&from=2030-05-01&to=2030-05-31."""
+    try:
+        first = date.fromisoformat(request.args['from']) if 'from' in request.args else date.today()
+        last = date.fromisoformat(request.args['to']) if 'to' in request.args else first + timedelta(days=30)
+    except ValueError:
+        return jsonify(error='from and to must be dates (YYYY-MM-DD)'), 400
+    max_days = current_app.config.get('AVAILABILITY_MAX_DAYS', 92)
+    if last < first or (last - first).days >= max_days:
+        return jsonify(error=f'to must be on or after from, and at most {max_days} days later'), 400
+
+    park_ids = request.args.getlist('park_id', type=int) or None
+    response = jsonify({'from': first.isoformat(), 'to': last.isoformat(),
+                        'parks': availability(park_ids, first, last)})
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config.get('AVAILABILITY_CACHE_TTL', 5)
+    return response
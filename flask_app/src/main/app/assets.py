@@ -0,0 +1,132 @@
+"""
+Fingerprinted static assets.
+
+The build step copies every static file to static/dist/ with a hash of its
+content in the name (css/styles.css -> dist/css/styles.3f9a1c2e7b04.css) and
+records the mapping in static/dist/manifest.json:
+
+    flask --app app assets build        # or: python -m app.assets
+
+Templates link assets with {{ static_url('css/styles.css') }}, which returns
+the fingerprinted URL when the manifest has one and the plain static URL
+otherwise. Fingerprinted files (and the image variants, which are already
+content-hashed) are served with a one-year immutable Cache-Control, so repeat
+visitors never revalidate them; a changed file gets a new name instead.
+"""
+import hashlib
+import json
+import os
+import re
+import click
+from flask import current_app, request, url_for
+from flask.cli import AppGroup
+
+assets_cli = AppGroup('assets', help='Fingerprint static assets.')
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+# Already content-hashed by `flask images build`
+HASHED_DIRS = (DIST_DIR + '/', 'images/variants/')
+IMMUTABLE_MAX_AGE = 31536000
+CSS_URL = re.compile(r'''url\((['"]?)/static/([^'")?#]+)\1\)''')
+
+
+def _fingerprint(path, content):
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    stem, ext = os.path.splitext(path)
+    return f'{DIST_DIR}/{stem}.{digest}{ext}'
+
+
+def _source_files(static_folder):
+    for root, dirs, files in os.walk(static_folder):
+        rel_root = os.path.relpath(root, static_folder).replace(os.sep, '/')
+        if rel_root != '.' and (rel_root + '/').startswith(HASHED_DIRS):
+            dirs[:] = []
+            continue
+        for name in sorted(files):
+            yield os.path.relpath(os.path.join(root, name), static_folder).replace(os.sep, '/')
+
+
+def build_manifest(static_folder):
+    """
+    Copy every static file into dist/ under a content-hashed name.
+
+    Stylesheets are processed last, with their url(/static/...) references
+    rewritten to the fingerprinted names, so an image change also changes
+    the hash of the stylesheet that uses it. Returns the manifest.
+    """
+    sources = sorted(_source_files(static_folder), key=lambda path: path.endswith('.css'))
+    manifest = {}
+    for path in sources:
+        with open(os.path.join(static_folder, path), 'rb') as f:
+            content = f.read()
+        if path.endswith('.css'):
+            content = CSS_URL.sub(
+                lambda m: f'url({m.group(1)}/static/{manifest.get(m.group(2), m.group(2))}{m.group(1)})',
+                content.decode('utf-8')
+            ).encode('utf-8')
+
+        hashed = _fingerprint(path, content)
+        out_path = os.path.join(static_folder, hashed)
+        if not os.path.exists(out_path):
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            with open(out_path, 'wb') as f:
+                f.write(content)
+        manifest[path] = hashed
+
+    with open(os.path.join(static_folder, DIST_DIR, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _manifest():
+    if 'asset_manifest' not in current_app.extensions:
+        current_app.extensions['asset_manifest'] = load_manifest(current_app.static_folder)
+    return current_app.extensions['asset_manifest']
+
+
+def manifest_version():
+    """A short digest of the asset manifest; changes whenever any asset does."""
+    manifest = _manifest()
+    if not manifest:
+        return ''
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def static_url(filename):
+    """URL for a static file, fingerprinted if the asset build has run."""
+    return url_for('static', filename=_manifest().get(filename, filename))
+
+
+def is_fingerprinted(filename):
+    # Each hashed directory keeps its manifest under a fixed, mutable name
+    return filename.startswith(HASHED_DIRS) and os.path.basename(filename) != MANIFEST_NAME
+
+
+def cache_fingerprinted(response):
+    if request.endpoint == 'static' and is_fingerprinted(request.view_args.get('filename', '')):
+        response.cache_control.public = True
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    app.jinja_env.globals['static_url'] = static_url
+    app.after_request(cache_fingerprinted)
+
+
+@assets_cli.command('build')
+def build_command():
+    """Copy static files to content-hashed names and write the manifest."""
+    manifest = build_manifest(current_app.static_folder)
+    click.echo(f'Fingerprinted {len(manifest)} file(s).')
@@ -0,0 +1,97 @@
+"""
+Per-park, per-day availability for the booking form.
+
+Remaining tickets are read from the park_day_capacity counters, which
+reserve() and release() keep current inside every booking transaction
+(app/inventory.py). A date range is therefore one range read on the
+counters' primary key, never an aggregate over bookings. Days without a
+counter have no bookings yet and offer the park's full daily capacity,
+taken from the catalogue.
+
+Each worker keeps recent answers for AVAILABILITY_CACHE_TTL seconds, so a
+busy sales day costs at most one query per park and range per worker every
+few seconds. The numbers are a hint for the calendar: a day that filled up
+since is still refused by reserve() when the form is submitted.
+"""
+from collections import OrderedDict
+from datetime import timedelta
+import threading
+import time
+from flask import current_app
+from sqlalchemy import select
+
+from . import db
+from .catalogue import get_parks
+from .models import ParkDayCapacity
+
+
+class AvailabilityCache:
+    """A small LRU of computed ranges, each kept for `ttl` seconds."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _compute(park_ids, first, last):
+    parks = [park for park in get_parks() if park_ids is None or park.park_id in park_ids]
+    query = (select(ParkDayCapacity.park_id, ParkDayCapacity.date,
+                    ParkDayCapacity.capacity, ParkDayCapacity.sold)
+             .where(ParkDayCapacity.date >= first, ParkDayCapacity.date <= last))
+    if park_ids is not None:
+        query = query.where(ParkDayCapacity.park_id.in_(park_ids))
+    counters = {(row.park_id, row.date): max(row.capacity - row.sold, 0)
+                for row in db.session.execute(query)}
+
+    days = [first + timedelta(days=n) for n in range((last - first).days + 1)]
+    return [
+        {
+            'park_id': park.park_id,
+            'capacity': park.daily_capacity,
+            'days': {day.isoformat(): counters.get((park.park_id, day), park.daily_capacity) for day in days},
+        }
+        for park in parks
+    ]
+
+
+def availability(park_ids, first, last):
+    """Remaining tickets per park (None: all parks) and day, from `first` to `last` inclusive."""
+    cache = current_app.extensions['availability_cache']
+    key = (tuple(sorted(park_ids)) if park_ids is not None else None, first, last)
+    parks = cache.get(key)
+    if parks is None:
+        parks = _compute(park_ids, first, last)
+        cache.set(key, parks)
+    return parks
+
+
+def init_app(app):
+    app.extensions['availability_cache'] = AvailabilityCache(app.config.get('AVAILABILITY_CACHE_MAX_ENTRIES', 256),
+                                                             app.config.get('AVAILABILITY_CACHE_TTL', 5))
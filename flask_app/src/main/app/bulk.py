@@ -0,0 +1,279 @@
+"""
+Bulk import and export of bookings, for group operators' files.
+
+Files are CSV or JSON Lines with one booking per row:
+
+    user_email, park_slug, date, num_tickets, health_safety
+
+user_id and park_id may be given instead of user_email and park_slug;
+health_safety is optional. Export writes the same columns plus booking_id,
+so an export can be edited and imported elsewhere.
+
+Both directions stream. Import reads the file row by row and works in
+batches: it looks up the batch's users and parks, takes the tickets from
+the park/day counters (app/inventory.py), inserts the bookings with one
+executemany and commits, so a transaction never spans more than one batch.
+Rows that fail validation or don't fit a day's capacity are reported by
+line number and skipped; the rest of the file is still imported. Export
+reads with yield_per, from a replica when one is configured.
+"""
+from contextlib import nullcontext
+import csv
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import islice
+import json
+import sys
+import click
+from flask.cli import AppGroup
+from sqlalchemy import insert, select
+
+from . import db
+from .inventory import SoldOut, reserve
+from .models import Booking, Park, User
+from .rollups import record
+from .routing import replica_reads
+
+bookings_cli = AppGroup('bookings', help='Import and export bookings in bulk.')
+
+EXPORT_COLUMNS = ('booking_id', 'user_email', 'park_slug', 'date', 'num_tickets', 'health_safety')
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 'on')
+
+
+class RowError(ValueError):
+    """A row that can't be imported; the message is shown to the operator."""
+
+
+@dataclass
+class ImportReport:
+    imported: int = 0
+    errors: list = field(default_factory=list)
+
+    def reject(self, line, message):
+        self.errors.append((line, message))
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, dict) pairs from a CSV or JSON Lines text stream."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_no, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            row = e
+        yield line_no, row
+
+
+def _int(row, name):
+    try:
+        value = int(row[name])
+    except (TypeError, ValueError):
+        raise RowError(f'{name} must be a whole number')
+    return value
+
+
+def _ref(row, name_key, id_key, kind):
+    """A (kind, value) key for the user or park a row names, by name or by id."""
+    if name_key in row:
+        return (kind, str(row[name_key]).strip())
+    if id_key in row:
+        return ('id', _int(row, id_key))
+    raise RowError(f'{name_key} or {id_key} is required')
+
+
+def _date(row):
+    try:
+        return datetime.fromisoformat(str(row['date']))
+    except KeyError:
+        raise RowError('date is required')
+    except ValueError:
+        raise RowError(f'date {row["date"]!r} is not an ISO date')
+
+
+def _parse(row):
+    """Check a row's shape and types; lookups against the database come later."""
+    if not isinstance(row, dict):
+        raise RowError('not a JSON object' if not isinstance(row, ValueError) else f'invalid JSON ({row})')
+    row = {key: value for key, value in row.items() if value not in (None, '')}
+
+    user = _ref(row, 'user_email', 'user_id', 'email')
+    park = _ref(row, 'park_slug', 'park_id', 'slug')
+    when = _date(row)
+    tickets = _int(row, 'num_tickets') if 'num_tickets' in row else 1
+    if tickets <= 0:
+        raise RowError('num_tickets must be positive')
+
+    health_safety = row.get('health_safety', False)
+    if isinstance(health_safety, str):
+        health_safety = health_safety.strip().lower() in TRUE_VALUES
+    return user, park, when, tickets, bool(health_safety)
+
+
+def _lookup(parsed):
+    """Resolve the batch's users and parks with one query each."""
+    emails = {user[1] for _, (user, *_rest) in parsed if user[0] == 'email'}
+    user_ids = {user[1] for _, (user, *_rest) in parsed if user[0] == 'id'}
+    slugs = {park[1] for _, (_user, park, *_rest) in parsed if park[0] == 'slug'}
+    park_ids = {park[1] for _, (_user, park, *_rest) in parsed if park[0] == 'id'}
+
+    users, parks = {}, {}
+    if emails or user_ids:
+        rows = db.session.execute(
+            select(User.user_id, User.email).where(
+                db.or_(User.email.in_(emails), User.user_id.in_(user_ids)))
+        ).all()
+        for user_id, email in rows:
+            users[('email', email)] = users[('id', user_id)] = user_id
+    if slugs or park_ids:
+        rows = db.session.execute(
+            select(Park.park_id, Park.slug).where(db.or_(Park.slug.in_(slugs), Park.park_id.in_(park_ids)))
+        ).all()
+        for park_id, slug in rows:
+            parks[('slug', slug)] = parks[('id', park_id)] = park_id
+    return users, parks
+
+
+def _resolve(batch, report):
+    """Parse the batch and resolve its users and parks; returns the valid rows grouped by (park_id, day)."""
+    parsed = []
+    for line, row in batch:
+        try:
+            parsed.append((line, _parse(row)))
+        except RowError as e:
+            report.reject(line, str(e))
+
+    users, parks = _lookup(parsed)
+    by_day = {}
+    for line, (user, park, when, tickets, health_safety) in parsed:
+        if user not in users:
+            report.reject(line, f'unknown user {user[1]!r}')
+        elif park not in parks:
+            report.reject(line, f'unknown park {park[1]!r}')
+        else:
+            values = dict(user_id=users[user], park_id=parks[park], date=when,
+                          num_tickets=tickets, health_safety=health_safety)
+            by_day.setdefault((values['park_id'], when.date()), []).append((line, values))
+    return by_day
+
+
+def _reserve(park_id, day, entries, report):
+    """Take the tickets for one park and day; returns the rows that fit."""
+    # One counter update for the whole group; if it doesn't fit, take the
+    # rows one at a time so as many as possible get in
+    try:
+        reserve(park_id, day, sum(values['num_tickets'] for _, values in entries))
+        return [values for _, values in entries]
+    except SoldOut:
+        pass
+    rows = []
+    for line, values in entries:
+        try:
+            reserve(park_id, day, values['num_tickets'])
+            rows.append(values)
+        except SoldOut:
+            report.reject(line, f'not enough tickets left at park {park_id} on {day.isoformat()}')
+    return rows
+
+
+def _import_batch(batch, report):
+    rows = []
+    for (park_id, day), entries in _resolve(batch, report).items():
+        rows += _reserve(park_id, day, entries, report)
+    if rows:
+        db.session.execute(insert(Booking), rows)
+        record(rows)
+    db.session.commit()
+    report.imported += len(rows)
+
+
+def import_bookings(rows, batch_size=1000):
+    """Import (line number, row) pairs in batches; returns an ImportReport."""
+    report = ImportReport()
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            report.errors.sort()
+            return report
+        try:
+            _import_batch(batch, report)
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+def export_rows(park_id=None, since=None, until=None, batch_size=1000):
+    """Yield bookings as dicts with EXPORT_COLUMNS, fetching batch_size rows at a time."""
+    query = (select(Booking.booking_id, User.email, Park.slug, Booking.date,
+                    Booking.num_tickets, Booking.health_safety)
+             .join(User, Booking.user_id == User.user_id)
+             .join(Park, Booking.park_id == Park.park_id)
+             .order_by(Booking.booking_id)
+             .execution_options(yield_per=batch_size))
+    if park_id is not None:
+        query = query.where(Booking.park_id == park_id)
+    if since is not None:
+        query = query.where(Booking.date >= since)
+    if until is not None:
+        query = query.where(Booking.date < until)
+
+    with replica_reads():
+        for row in db.session.execute(query):
+            yield dict(zip(EXPORT_COLUMNS, (row[0], row[1], row[2], row[3].isoformat(), row[4], row[5])))
+
+
+def write_rows(rows, columns, fmt, out):
+    """Write dicts to a text stream as CSV (with a header) or JSON Lines."""
+    if fmt == 'csv':
+        writer = csv.DictWriter(out, fieldnames=columns, lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        for row in rows:
+            out.write(json.dumps(row) + '\n')
+
+
+def _open(path, mode):
+    # newline='' lets the csv module handle line endings, as it requires
+    if path == '-':
+        return nullcontext(sys.stdout if mode == 'w' else sys.stdin)
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def _format_for(path, fmt):
+    if fmt:
+        return fmt
+    return 'jsonl' if str(path).endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+@bookings_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Default: from the file extension.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows per transaction.')
+def import_command(path, fmt, batch_size):
+    """Import bookings from a CSV or JSON Lines file ('-' for stdin)."""
+    with _open(path, 'r') as stream:
+        report = import_bookings(read_rows(stream, _format_for(path, fmt)), batch_size)
+    for line, message in report.errors:
+        click.echo(f'line {line}: {message}', err=True)
+    click.echo(f'Imported {report.imported} booking(s); {len(report.errors)} row(s) rejected.')
+    if report.errors:
+        sys.exit(1)
+
+
+@bookings_cli.command('export')
+@click.argument('path', default='-', type=click.Path(dir_okay=False, allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Default: from the file extension.')
+@click.option('--park', 'park_id', type=int, help='Only this park.')
+@click.option('--since', type=click.DateTime(['%Y-%m-%d']), help='Bookings on or after this day.')
+@click.option('--until', type=click.DateTime(['%Y-%m-%d']), help='Bookings before this day.')
+def export_command(path, fmt, park_id, since, until):
+    """Export bookings to a CSV or JSON Lines file (default: stdout)."""
+    with _open(path, 'w') as out:
+        write_rows(export_rows(park_id, since, until), EXPORT_COLUMNS, _format_for(path, fmt), out)
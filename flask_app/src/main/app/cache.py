@@ -0,0 +1,186 @@
+"""
+Key/value stores shared by the app's caching layers.
+
+MemoryStore keeps values inside the current process. SQLiteStore keeps them
+in a local SQLite file, so every Gunicorn worker on the host sees the same
+values; it is a stand-in for Redis with the same get/set/incr/delete
+semantics. update() is an atomic read-modify-write, as a Redis Lua script
+would do it. The store is picked with CACHE_STORE_URL:
+
+    memory://                      (default)
+    sqlite:////var/run/wwa/cache.db
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from flask import current_app
+
+
+class MemoryStore:
+    """Process-local store; values are kept as-is, so treat them as read-only."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._live(key, time.time())
+            return default if entry is None else entry[0]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    def incr(self, key, amount=1, ttl=None):
+        with self._lock:
+            now = time.time()
+            entry = self._live(key, now)
+            value = (entry[0] if entry else 0) + amount
+            expires_at = entry[1] if entry else (now + ttl if ttl else None)
+            self._data[key] = (value, expires_at)
+            return value
+
+    def update(self, key, fn, ttl=None):
+        """Atomically replace the value with fn(current value or None); returns the new value."""
+        with self._lock:
+            now = time.time()
+            entry = self._live(key, now)
+            value = fn(entry[0] if entry else None)
+            self._data[key] = (value, now + ttl if ttl else None)
+            return value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteStore:
+    """
+    Store backed by a local SQLite file, shared between processes.
+
+    Values must be JSON-serialisable. Each thread (and each forked worker)
+    opens its own connection. get, set and delete are single autocommit
+    statements; only incr and update take the write lock for a
+    read-modify-write (BEGIN IMMEDIATE), so reads never queue behind it.
+    """
+
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS kv ('
+            ' key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)'
+        )
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            # Autocommit: a lone statement is its own transaction, and reads
+            # never wait for the write lock
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def transaction(self):
+        """Hold the file's write lock for a block: `with store.transaction() as conn: ...`"""
+        return Transaction(self._connection())
+
+    def get(self, key, default=None):
+        row = self._connection().execute(
+            'SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+            (key, time.time())
+        ).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        self._connection().execute(
+            'INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, json.dumps(value), time.time() + ttl if ttl else None)
+        )
+
+    def incr(self, key, amount=1, ttl=None):
+        now = time.time()
+        with self.transaction() as conn:
+            conn.execute('DELETE FROM kv WHERE key = ? AND expires_at <= ?', (key, now))
+            conn.execute(
+                'INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + ?',
+                (key, json.dumps(amount), now + ttl if ttl else None, amount)
+            )
+            row = conn.execute('SELECT value FROM kv WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0])
+
+    def update(self, key, fn, ttl=None):
+        """Atomically replace the value with fn(current value or None); returns the new value."""
+        now = time.time()
+        with self.transaction() as conn:
+            row = conn.execute(
+                'SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+                (key, now)
+            ).fetchone()
+            value = fn(None if row is None else json.loads(row[0]))
+            conn.execute(
+                'INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value), now + ttl if ttl else None)
+            )
+        return value
+
+    def delete(self, key):
+        self._connection().execute('DELETE FROM kv WHERE key = ?', (key,))
+
+    def clear(self):
+        self._connection().execute('DELETE FROM kv')
+
+
+class Transaction:
+    """
+    BEGIN IMMEDIATE ... COMMIT around a block, so read-modify-writes are atomic.
+
+    Takes an autocommit connection (isolation_level=None) to a SQLite file;
+    the block gets the connection and holds the file's write lock.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+
+def store_from_url(url):
+    if url in (None, '', 'memory://'):
+        return MemoryStore()
+    if url.startswith('sqlite:///'):
+        return SQLiteStore(url[len('sqlite:///'):])
+    raise ValueError(f'Unsupported CACHE_STORE_URL: {url}')
+
+
+def init_app(app):
+    app.extensions['cache_store'] = store_from_url(app.config.get('CACHE_STORE_URL'))
+
+
+def get_store():
+    return current_app.extensions['cache_store']
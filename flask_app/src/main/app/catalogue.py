@@ -0,0 +1,99 @@
+"""
+Read-through cache of the park catalogue.
+
+Parks only change when an admin edits them, so each worker keeps an
+immutable snapshot of every park and serves the public pages from it. The
+snapshot is tagged with a version counter held in the shared cache store;
+ParkView bumps the counter on every save or delete, and each worker reloads
+its snapshot the next time it sees a version it doesn't hold. The time of
+that change is stored next to the counter, as a deleted park leaves no
+updated_at behind for Last-Modified to pick up.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import time
+from flask import abort, current_app
+from .cache import get_store
+from .models import Park
+from .routing import primary
+
+VERSION_KEY = 'catalogue:parks:version'
+CHANGED_KEY = 'catalogue:parks:changed_at'
+
+
+@dataclass(frozen=True)
+class ParkSnapshot:
+    park_id: int
+    name: str
+    location: str
+    description: str
+    image_path: str
+    short_description: str
+    slug: str
+    folder: str
+    hours: str
+    difficulty: str
+    min_age: int
+    price: str
+    wait_time: str
+    height_requirement: str
+    daily_capacity: int
+    updated_at: datetime
+
+    @classmethod
+    def from_model(cls, park):
+        return cls(**dict(park.to_json(), updated_at=park.updated_at))
+
+    def __str__(self):
+        return self.name
+
+
+class Catalogue:
+    def __init__(self, version, parks, changed_at=None):
+        self.version = version
+        # Naive UTC, like the parks' updated_at; None until the first change
+        self.changed_at = changed_at
+        self.parks = tuple(parks)
+        self.by_id = {park.park_id: park for park in self.parks}
+        self.by_slug = {park.slug: park for park in self.parks}
+
+
+def current_version():
+    return get_store().get(VERSION_KEY, 0)
+
+
+def get_catalogue():
+    """The current catalogue, reloading it from the database if it is stale."""
+    version = current_version()
+    catalogue = current_app.extensions.get('park_catalogue')
+    if catalogue is None or catalogue.version != version:
+        # Read the version before loading, so an edit racing with the load
+        # leaves us with a stale tag and we reload again next time. Always
+        # read the primary: a lagging replica would be cached as current
+        changed_at = get_store().get(CHANGED_KEY)
+        if changed_at is not None:
+            changed_at = datetime.fromtimestamp(changed_at, timezone.utc).replace(tzinfo=None)
+        with primary():
+            parks = Park.query.order_by(Park.park_id).all()
+        catalogue = Catalogue(version, [ParkSnapshot.from_model(park) for park in parks], changed_at)
+        current_app.extensions['park_catalogue'] = catalogue
+    return catalogue
+
+
+def get_parks():
+    return get_catalogue().parks
+
+
+def get_park_or_404(park_id):
+    park = get_catalogue().by_id.get(park_id)
+    if park is None:
+        abort(404)
+    return park
+
+
+def invalidate():
+    """Mark every worker's snapshot as stale."""
+    store = get_store()
+    # Before the bump, so a worker loading the new version sees this time
+    store.set(CHANGED_KEY, time.time())
+    store.incr(VERSION_KEY)
@@ -0,0 +1,183 @@
+"""
+Password hashing off the request threads.
+
+Hashing and verifying a password costs tens to hundreds of milliseconds of
+CPU. Run on a request thread, a burst of logins holds the worker's GIL and
+stalls every page it is rendering at the same time. Instead each Gunicorn
+worker hands the work to a small process pool of its own:
+
+    PASSWORD_HASH_WORKERS        processes in the pool (0 hashes inline, as in tests)
+    PASSWORD_HASH_MAX_PENDING    hashes running or queued at once; later ones wait
+    PASSWORD_HASH_QUEUE_TIMEOUT  how long they wait before the request gets a 503
+    PASSWORD_HASH_NICE           niceness of the pool, so page rendering wins the CPU
+
+The waiting request thread releases the GIL, so the worker keeps serving
+pages meanwhile. The pool is started on first use in each process, never
+in the Gunicorn master. Queueing is exported on /metrics:
+
+    password_hash_jobs_total{op}, password_hash_rejected_total  (counters)
+    password_hash_in_flight, password_hash_workers               (gauges)
+    password_hash_wait_seconds                                   (histogram: call to start of hashing)
+    password_hash_seconds_sum                                    (time spent hashing)
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import os
+import threading
+import time
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from .metrics import WAIT_BUCKETS, bucket_index, histogram
+from .passwords import current_method
+
+
+class HashingBusy(Exception):
+    """Raised when no hashing slot frees up within PASSWORD_HASH_QUEUE_TIMEOUT."""
+
+
+class HashStats:
+    """Counters for one hashing service."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.jobs = {'hash': 0, 'verify': 0}
+        self.rejected = 0
+        self.in_flight = 0
+        self.wait_count = 0
+        self.wait_sum = 0.0
+        self.wait_buckets = [0] * len(WAIT_BUCKETS)
+        self.work_sum = 0.0
+
+    def add(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def observe(self, op, wait, work):
+        with self._lock:
+            self.jobs[op] += 1
+            self.wait_count += 1
+            self.wait_sum += wait
+            index = bucket_index(wait)
+            if index < len(WAIT_BUCKETS):
+                self.wait_buckets[index] += 1
+            self.work_sum += work
+
+
+def _lower_priority(nice):
+    if nice:
+        os.nice(nice)
+
+
+def _timed(fn, args):
+    # Runs in the pool; wall-clock start time so the caller can measure queueing
+    started = time.time()
+    begun = time.perf_counter()
+    result = fn(*args)
+    return started, time.perf_counter() - begun, result
+
+
+class HashingService:
+    """Runs hash/verify in a bounded process pool, started lazily per process."""
+
+    def __init__(self, workers=1, max_pending=4, queue_timeout=5.0, nice=5):
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self.nice = nice
+        self.stats = HashStats()
+        self._slots = threading.BoundedSemaphore(max(max_pending, 1))
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                # spawn rather than fork: the worker has threads running
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_lower_priority, initargs=(self.nice,))
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, op, fn, *args):
+        called = time.time()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self.stats.add('rejected')
+            raise HashingBusy(f'No password hashing slot free after {self.queue_timeout}s')
+        self.stats.add('in_flight')
+        try:
+            if self.workers <= 0:
+                started, work, result = _timed(fn, args)
+            else:
+                try:
+                    started, work, result = self._pool().submit(_timed, fn, args).result()
+                except BrokenProcessPool:
+                    # A pool process died; start a fresh pool on the next call
+                    with self._lock:
+                        self._executor = None
+                    raise
+            self.stats.observe(op, max(started - called, 0.0), work)
+            return result
+        finally:
+            self.stats.add('in_flight', -1)
+            self._slots.release()
+
+    def hash(self, password, method):
+        return self._run('hash', generate_password_hash, password, method)
+
+    def verify(self, pwhash, password):
+        return self._run('verify', check_password_hash, pwhash, password)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def _service():
+    return current_app.extensions['password_hashing']
+
+
+def hash_password(password):
+    """Hash a password for storage with the current method, in the hashing pool."""
+    return _service().hash(password, current_method())
+
+
+def verify_password(pwhash, password):
+    """Check a password against a stored hash, in the hashing pool."""
+    return _service().verify(pwhash, password)
+
+
+def _samples(app):
+    service = app.extensions['password_hashing']
+    stats = service.stats
+    yield 'password_hash_workers', 'gauge', {}, service.workers
+    yield 'password_hash_in_flight', 'gauge', {}, stats.in_flight
+    for op, count in stats.jobs.items():
+        yield 'password_hash_jobs_total', 'counter', {'op': op}, count
+    yield 'password_hash_rejected_total', 'counter', {}, stats.rejected
+    yield from histogram('password_hash_wait_seconds', {}, stats.wait_buckets, stats.wait_sum, stats.wait_count)
+    yield 'password_hash_seconds_sum', 'counter', {}, stats.work_sum
+
+
+def _busy(error):
+    return ('We are handling a lot of sign-ins right now. Please try again in a moment.',
+            503, {'Retry-After': '1', 'Content-Type': 'text/plain; charset=utf-8'})
+
+
+def init_app(app):
+    """Create the app's hashing service; call after metrics.init_app."""
+    from .metrics import register_collector
+
+    app.extensions['password_hashing'] = HashingService(
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 1),
+        max_pending=app.config.get('PASSWORD_HASH_MAX_PENDING', 4),
+        queue_timeout=app.config.get('PASSWORD_HASH_QUEUE_TIMEOUT', 5.0),
+        nice=app.config.get('PASSWORD_HASH_NICE', 5),
+    )
+    register_collector(app, _samples)
+    app.register_error_handler(HashingBusy, _busy)
@@ -0,0 +1,74 @@
+"""
+Idempotent booking submissions.
+
+A double-click on "Confirm Booking", or a phone resending the POST after a
+dropped connection, used to create a second booking and take its tickets
+again. new_booking now renders a random key into the form, and
+booking_submit stores (user, key) with the booking's id in the same
+transaction as the booking. A replay finds the key with one primary-key
+lookup and gets the original answer without writing anything. Two copies
+racing each other collide on the key's primary key, so the loser rolls
+back, tickets included.
+
+Keys are kept for BOOKING_KEY_TTL seconds (a day by default). Expired keys
+are ignored, and `flask idempotency purge` deletes them.
+"""
+from datetime import timedelta
+import uuid
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete
+
+from . import db
+from .models import utcnow
+
+idempotency_cli = AppGroup('idempotency', help='Manage booking idempotency keys.')
+
+MAX_KEY_LENGTH = 64
+
+
+def new_key():
+    return uuid.uuid4().hex
+
+
+def valid_key(key):
+    return bool(key) and len(key) <= MAX_KEY_LENGTH
+
+
+def replayed_booking(user_id, key):
+    """The booking_id an earlier submission with `key` made, or None."""
+    from .models import IdempotencyKey
+
+    record = db.session.get(IdempotencyKey, (user_id, key))
+    if record is None:
+        return None
+    if record.expires_at <= utcnow():
+        # Expired; the key may be used again
+        db.session.delete(record)
+        return None
+    return record.booking_id
+
+
+def remember(user_id, key, booking_id):
+    """Record `key` in the current transaction; committing a duplicate raises IntegrityError."""
+    from .models import IdempotencyKey
+
+    ttl = current_app.config.get('BOOKING_KEY_TTL', 86400)
+    db.session.add(IdempotencyKey(user_id=user_id, key=key, booking_id=booking_id,
+                                  expires_at=utcnow() + timedelta(seconds=ttl)))
+
+
+def purge_expired(now=None):
+    """Delete expired keys; returns how many."""
+    from .models import IdempotencyKey
+
+    result = db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= (now or utcnow())))
+    db.session.commit()
+    return result.rowcount
+
+
+@idempotency_cli.command('purge')
+def purge_command():
+    """Delete expired idempotency keys."""
+    click.echo(f'Deleted {purge_expired()} expired key(s).')
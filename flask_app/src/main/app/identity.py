@@ -0,0 +1,188 @@
+"""
+Cached identity for Flask-Login.
+
+Loading the User on every authenticated request, then lazy-loading its role
+for has_role(), costs two queries per request, and Flask-Admin checks the
+role again for every view. Instead the user loader returns a Principal: an
+immutable snapshot of the user's id, name, email and role name, loaded with
+one joined query and kept in a short-lived LRU per worker.
+
+Like the park catalogue, cached principals are tagged with a version
+counter in the shared cache store. Saving or deleting a user or role in the
+admin panel and resetting a password bump the counter, so every worker
+reloads on its next request. IDENTITY_CACHE_TTL bounds how long an entry
+lives regardless.
+
+With SESSION_PRINCIPAL on, the principal also travels in the signed session
+cookie, so any worker can serve a signed-in request without touching the
+database, even with a cold cache. The cookie copy carries the user's
+session_epoch; a password reset or a change in the admin panel bumps the
+epoch in the database, and the cookie copy is then reloaded. The current
+epochs are kept in the cache store, and read from the database only when
+missing there.
+"""
+from collections import OrderedDict
+from dataclasses import astuple, dataclass
+from typing import Optional
+import threading
+import time
+from flask import current_app, session
+from flask_login import UserMixin, user_logged_out
+from sqlalchemy.orm import joinedload
+
+from . import db
+from .cache import get_store
+from .routing import primary
+
+VERSION_KEY = 'identity:version'
+SESSION_KEY = '_principal'
+# Bump when Principal's fields change, so older cookies are reloaded
+SESSION_FORMAT = 1
+
+
+@dataclass(frozen=True)
+class Principal(UserMixin):
+    user_id: int
+    name: str
+    last_name: str
+    email: str
+    role_name: Optional[str]
+    session_epoch: int = 0
+
+    @classmethod
+    def from_model(cls, user):
+        return cls(user.user_id, user.name, user.last_name, user.email,
+                   user.role.name if user.role is not None else None, user.session_epoch or 0)
+
+    def get_id(self):
+        return str(self.user_id)
+
+    def has_role(self, role_name: str) -> bool:
+        return self.role_name == role_name
+
+    def __str__(self):
+        return self.name + ' ' + self.last_name
+
+
+class IdentityCache:
+    """A bounded LRU of principals, each tagged with a version and an expiry."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, version):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            principal, entry_version, expires_at = entry
+            if entry_version != version or expires_at <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return principal
+
+    def set(self, user_id, version, principal):
+        with self._lock:
+            self._entries[user_id] = (principal, version, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _epoch_key(user_id):
+    return f'identity:epoch:{user_id}'
+
+
+def current_epoch(user_id):
+    """The user's session epoch, from the cache store or else the database; None if they are gone."""
+    from .models import User
+
+    epoch = get_store().get(_epoch_key(user_id))
+    if epoch is None:
+        with primary():
+            epoch = db.session.execute(
+                db.select(User.session_epoch).where(User.user_id == user_id)
+            ).scalar_one_or_none()
+        if epoch is not None:
+            _remember_epoch(user_id, epoch)
+    return epoch
+
+
+def _remember_epoch(user_id, epoch):
+    # Expires, so a worker that missed a bump (with a per-process store) catches up
+    get_store().set(_epoch_key(user_id), epoch, ttl=current_app.config.get('IDENTITY_CACHE_TTL', 60))
+
+
+def _from_session(user_id, version):
+    data = session.get(SESSION_KEY)
+    if not data or data[0] != SESSION_FORMAT or data[1] != version:
+        return None
+    principal = Principal(*data[2:])
+    if principal.user_id != user_id or principal.session_epoch != current_epoch(user_id):
+        return None
+    return principal
+
+
+def load_principal(user_id):
+    """Flask-Login user loader: the cached principal for `user_id`, or None."""
+    from .models import User
+
+    user_id = int(user_id)
+    cache = current_app.extensions['identity_cache']
+    in_session = current_app.config.get('SESSION_PRINCIPAL', False)
+    # Read the version before loading, as the catalogue does, so a change
+    # racing with the load leaves a stale tag rather than a stale principal
+    version = get_store().get(VERSION_KEY, 0)
+    if in_session:
+        principal = _from_session(user_id, version)
+        if principal is not None:
+            return principal
+    principal = cache.get(user_id, version)
+    if principal is None:
+        with primary():
+            user = db.session.execute(
+                db.select(User).options(joinedload(User.role)).where(User.user_id == user_id)
+            ).scalar_one_or_none()
+        if user is None:
+            return None
+        principal = Principal.from_model(user)
+        cache.set(user_id, version, principal)
+        if in_session:
+            _remember_epoch(user_id, principal.session_epoch)
+    if in_session:
+        session[SESSION_KEY] = [SESSION_FORMAT, version, *astuple(principal)]
+    return principal
+
+
+def bump_session_epoch(user):
+    """Retire `user`'s session principals; commit, then call invalidate(user.user_id)."""
+    user.session_epoch = (user.session_epoch or 0) + 1
+
+
+def invalidate(user_id=None):
+    """Make every worker reload the principals it has cached, and re-read `user_id`'s epoch."""
+    current_app.extensions['identity_cache'].clear()
+    if user_id is not None:
+        get_store().delete(_epoch_key(user_id))
+    get_store().incr(VERSION_KEY)
+
+
+def _forget_session(sender, **extra):
+    session.pop(SESSION_KEY, None)
+
+
+def init_app(app):
+    app.extensions['identity_cache'] = IdentityCache(app.config.get('IDENTITY_CACHE_MAX_ENTRIES', 1024),
+                                                     app.config.get('IDENTITY_CACHE_TTL', 60))
+    user_logged_out.connect(_forget_session, app)
@@ -0,0 +1,175 @@
+"""
+Responsive image variants for the park pages.
+
+The originals under static/images are several megabytes each. The build
+step resizes every PNG/JPEG to a set of widths in modern formats (AVIF where
+Pillow supports it, and WebP), names each variant after a hash of its source
+so it can be cached forever, and records them in
+static/images/variants/manifest.json:
+
+    flask --app app images build        # or: python -m app.images
+
+Templates use the Jinja helpers registered here, which fall back to the
+original file when no variants have been built:
+
+    {{ responsive_image('images/parks/witches/banner.png', alt='...', sizes='100vw') }}
+    {{ image_srcset('images/parks/witches/gallery/1.jpg') }}
+    {{ background_image('images/rollercoaster.png') }}
+
+Pillow is only needed to build the variants, not to serve them.
+"""
+import hashlib
+import json
+import os
+import click
+from flask import current_app, url_for
+from flask.cli import AppGroup
+from markupsafe import Markup, escape
+from .assets import static_url
+
+images_cli = AppGroup('images', help='Build responsive image variants.')
+
+VARIANTS_DIR = 'images/variants'
+MANIFEST_NAME = 'manifest.json'
+SOURCE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+DEFAULT_WIDTHS = (320, 640, 960, 1280, 1920)
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+
+
+def _supported_formats():
+    from PIL import features
+    return [fmt for fmt in ('avif', 'webp') if features.check(fmt)]
+
+
+def _source_images(static_folder):
+    images_root = os.path.join(static_folder, 'images')
+    variants_root = os.path.join(static_folder, VARIANTS_DIR)
+    for root, dirs, files in os.walk(images_root):
+        if os.path.commonpath([root, variants_root]) == variants_root:
+            continue
+        for name in sorted(files):
+            if name.lower().endswith(SOURCE_EXTENSIONS):
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, static_folder).replace(os.sep, '/')
+
+
+def build_variants(static_folder, widths=DEFAULT_WIDTHS, formats=None, quality=70):
+    """
+    Generate variants for every image under static/images and write the manifest.
+
+    Variants whose content-hashed file already exists are skipped, so
+    re-running the build only processes new or changed originals.
+    Returns the manifest.
+    """
+    from PIL import Image
+
+    formats = formats or _supported_formats()
+    manifest = {}
+    for source in _source_images(static_folder):
+        source_path = os.path.join(static_folder, source)
+        with open(source_path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+
+        with Image.open(source_path) as original:
+            original.load()
+            width, height = original.size
+            targets = sorted({w for w in widths if w < width} | {min(width, max(widths))})
+
+            stem = os.path.splitext(source)[0]
+            variants = {}
+            for fmt in formats:
+                variants[fmt] = []
+                for target in targets:
+                    name = f'{VARIANTS_DIR}/{stem[len("images/"):]}-{digest}-{target}.{fmt}'
+                    out_path = os.path.join(static_folder, name)
+                    if not os.path.exists(out_path):
+                        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+                        resized = original.resize((target, round(height * target / width)), Image.LANCZOS)
+                        if resized.mode not in ('RGB', 'RGBA'):
+                            resized = resized.convert('RGBA')
+                        resized.save(out_path, format=fmt.upper(), quality=quality)
+                    variants[fmt].append([target, name])
+
+        manifest[source] = {'width': width, 'height': height, 'variants': variants}
+
+    manifest_path = os.path.join(static_folder, VARIANTS_DIR, MANIFEST_NAME)
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, VARIANTS_DIR, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _manifest():
+    if 'image_manifest' not in current_app.extensions:
+        current_app.extensions['image_manifest'] = load_manifest(current_app.static_folder)
+    return current_app.extensions['image_manifest']
+
+
+def _srcset(entry, fmt):
+    return ', '.join(f"{url_for('static', filename=name)} {width}w"
+                     for width, name in entry['variants'].get(fmt, []))
+
+
+def image_srcset(path, fmt='webp'):
+    """srcset attribute value for `path`, or '' if no variants were built."""
+    entry = _manifest().get(path)
+    return _srcset(entry, fmt) if entry else ''
+
+
+def responsive_image(path, alt='', sizes='100vw', **attrs):
+    """A <picture> with AVIF/WebP sources for `path`, falling back to the original."""
+    entry = _manifest().get(path)
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+    if 'class_' in attrs:
+        attrs['class'] = attrs.pop('class_')
+    if entry:
+        attrs.setdefault('width', entry['width'])
+        attrs.setdefault('height', entry['height'])
+    img_attrs = ''.join(f' {name}="{escape(value)}"' for name, value in attrs.items())
+    img = Markup(f'<img src="{static_url(path)}" alt="{escape(alt)}"{img_attrs}>')
+    if not entry:
+        return img
+
+    sources = ''.join(
+        f'<source type="{MIME_TYPES[fmt]}" srcset="{_srcset(entry, fmt)}" sizes="{escape(sizes)}">'
+        for fmt in ('avif', 'webp') if entry['variants'].get(fmt)
+    )
+    return Markup(f'<picture>{sources}{img}</picture>')
+
+
+def background_image(path):
+    """CSS background-image value preferring the largest AVIF/WebP variant."""
+    entry = _manifest().get(path)
+    original = f'url("{static_url(path)}")'
+    if not entry:
+        return Markup(original)
+    candidates = [
+        f'url("{url_for("static", filename=entry["variants"][fmt][-1][1])}") type("{MIME_TYPES[fmt]}")'
+        for fmt in ('avif', 'webp') if entry['variants'].get(fmt)
+    ]
+    return Markup(f'image-set({", ".join(candidates + [original])})')
+
+
+def init_app(app):
+    app.jinja_env.globals.update(
+        responsive_image=responsive_image,
+        image_srcset=image_srcset,
+        background_image=background_image,
+    )
+
+
+@images_cli.command('build')
+@click.option('--quality', default=70, show_default=True, help='Encoder quality (0-100).')
+def build_command(quality):
+    """Resize static images into AVIF/WebP variants and write the manifest."""
+    manifest = build_variants(current_app.static_folder, quality=quality)
+    click.echo(f'Built variants for {len(manifest)} image(s).')
@@ -0,0 +1,170 @@
+"""
+Per-park, per-day ticket inventory.
+
+Every (park, day) pair owns a single ParkDayCapacity row with a running
+count of sold tickets. Reservations bump that counter with a conditional
+UPDATE inside the caller's transaction, so checking availability never has
+to aggregate the bookings table and two concurrent requests can't both take
+the last tickets.
+"""
+from datetime import date, datetime
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .models import Booking, Park, ParkDayCapacity
+
+inventory_cli = AppGroup('inventory', help='Manage per-day park ticket inventory.')
+
+
+class SoldOut(Exception):
+    """Raised when a reservation would exceed a park's daily capacity."""
+
+    def __init__(self, park_id, day, tickets):
+        self.park_id = park_id
+        self.day = day
+        self.tickets = tickets
+        super().__init__(
+            f'Not enough tickets left on {day.isoformat()} for {tickets} more visitor(s).'
+        )
+
+
+def _as_day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _increment(park_id, day, tickets):
+    result = db.session.execute(
+        update(ParkDayCapacity)
+        .where(ParkDayCapacity.park_id == park_id,
+               ParkDayCapacity.date == day,
+               ParkDayCapacity.sold + tickets <= ParkDayCapacity.capacity)
+        .values(sold=ParkDayCapacity.sold + tickets)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def _create_counter(park_id, day):
+    """Insert an empty counter for the day; returns False if one already exists."""
+    capacity = db.session.execute(
+        select(Park.daily_capacity).where(Park.park_id == park_id)
+    ).scalar()
+    if capacity is None:
+        raise LookupError(f'Unknown park {park_id}')
+
+    try:
+        with db.session.begin_nested():
+            db.session.execute(
+                insert(ParkDayCapacity).values(park_id=park_id, date=day, capacity=capacity, sold=0)
+            )
+    except IntegrityError:
+        # Another request created the counter first
+        return False
+    return True
+
+
+def reserve(park_id, day, tickets):
+    """
+    Take `tickets` seats for `park_id` on `day` in the current transaction.
+
+    Raises SoldOut without changing anything if the day can't fit them. The
+    counter row is created lazily on the first reservation of a day.
+    """
+    park_id = int(park_id)
+    day = _as_day(day)
+    if tickets <= 0:
+        raise ValueError('tickets must be positive')
+
+    if _increment(park_id, day, tickets):
+        return
+
+    exists = db.session.execute(
+        select(ParkDayCapacity.sold)
+        .where(ParkDayCapacity.park_id == park_id, ParkDayCapacity.date == day)
+    ).first()
+    if exists is None:
+        _create_counter(park_id, day)
+        if _increment(park_id, day, tickets):
+            return
+
+    raise SoldOut(park_id, day, tickets)
+
+
+def release(park_id, day, tickets):
+    """Give `tickets` seats back to `park_id` on `day` (e.g. after a cancellation)."""
+    if tickets <= 0:
+        return
+    db.session.execute(
+        update(ParkDayCapacity)
+        .where(ParkDayCapacity.park_id == int(park_id),
+               ParkDayCapacity.date == _as_day(day))
+        .values(sold=case((ParkDayCapacity.sold > tickets, ParkDayCapacity.sold - tickets), else_=0))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def remaining(park_id, day):
+    """Tickets still available for `park_id` on `day`."""
+    row = db.session.execute(
+        select(ParkDayCapacity.capacity, ParkDayCapacity.sold)
+        .where(ParkDayCapacity.park_id == int(park_id),
+               ParkDayCapacity.date == _as_day(day))
+    ).first()
+    if row is None:
+        return db.session.execute(
+            select(Park.daily_capacity).where(Park.park_id == int(park_id))
+        ).scalar()
+    return max(row.capacity - row.sold, 0)
+
+
+def sync_capacity(park, from_day=None):
+    """Propagate a changed Park.daily_capacity to today's and future counters."""
+    from_day = from_day or datetime.now().date()
+    db.session.execute(
+        update(ParkDayCapacity)
+        .where(ParkDayCapacity.park_id == park.park_id,
+               ParkDayCapacity.date >= from_day)
+        .values(capacity=park.daily_capacity)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def rebuild():
+    """
+    Recompute every counter from the bookings table.
+
+    This is the one-off migration for databases that already hold bookings;
+    it is the only place that aggregates over bookings.
+    """
+    day = func.date(Booking.date)
+    totals = db.session.execute(
+        select(Booking.park_id, day.label('day'), func.sum(Booking.num_tickets).label('sold'))
+        .group_by(Booking.park_id, day)
+    ).all()
+    capacities = dict(db.session.execute(select(Park.park_id, Park.daily_capacity)).all())
+
+    db.session.execute(ParkDayCapacity.__table__.delete())
+    rows = [
+        {
+            'park_id': row.park_id,
+            'date': date.fromisoformat(row.day) if isinstance(row.day, str) else row.day,
+            'capacity': capacities[row.park_id],
+            'sold': row.sold,
+        }
+        for row in totals
+    ]
+    if rows:
+        db.session.execute(insert(ParkDayCapacity), rows)
+    db.session.commit()
+    return len(rows)
+
+
+@inventory_cli.command('rebuild')
+def rebuild_command():
+    """Recompute sold-ticket counters from existing bookings."""
+    count = rebuild()
+    click.echo(f'Rebuilt {count} park/day counter(s).')
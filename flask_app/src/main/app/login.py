@@ -1,10 +1,14 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required
-from werkzeug.security import generate_password_hash, check_password_hash
 from .models import User, Role
 from . import db
+from .hashing import hash_password, verify_password
+from .identity import bump_session_epoch, invalidate as invalidate_identity
+from .passwords import needs_rehash, schedule_rehash
+from .ratelimit import check_email, limit_ip, record_attempt
 
 auth_login = Blueprint('login', __name__)
+auth_login.before_request(limit_ip)
 
 @auth_login.route('/login')
 def login():
@@ -19,12 +23,17 @@ def login_post():
         flash('Email and password are required.')
         return redirect(url_for('login.login'))
 
+    check_email(email)
     user = User.query.filter_by(email=email).first()
 
-    if not user or not check_password_hash(user.password, password):
+    if not user or not verify_password(user.password, password):
+        record_attempt(email)
         flash('Please check your login details and try again.')
         return redirect(url_for('login.login'))
 
+    if needs_rehash(user.password):
+        schedule_rehash(user, password)
+
     login_user(user, remember=False)
     return redirect(url_for('main.profile'))
 
@@ -41,10 +50,14 @@ def forgot_password_submit():
         flash("Email and new password are required.")
         return redirect(url_for('login.forgot_password_form'))
     
+    check_email(email)
+    record_attempt(email)
     user = User.query.filter_by(email=email).first()
     if user:
-        user.password = generate_password_hash(new_password, method='pbkdf2:sha256')
+        user.password = hash_password(new_password)
+        bump_session_epoch(user)
         db.session.commit()
+        invalidate_identity(user.user_id)
         flash("Password successfully updated. You can now login.")
         return redirect(url_for('login.login'))
     else:
@@ -73,7 +86,7 @@ def register_post():
         return redirect(url_for('login.register'))
 
     customer_role = Role.query.filter_by(name='customer').first()
-    new_user = User(email=email, name=name, last_name=last_name, role=customer_role, password=generate_password_hash(password, method='pbkdf2:sha256'))
+    new_user = User(email=email, name=name, last_name=last_name, role=customer_role, password=hash_password(password))
     db.session.add(new_user)
     db.session.commit()
 
@@ -1,52 +1,142 @@
 from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from flask_login import login_required, current_user
-from .models import Booking, Park, Message
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from .models import Booking
+from .catalogue import get_parks, get_park_or_404
+from .page_cache import cached_page, conditional_page
+from .inventory import reserve, SoldOut
+from .rollups import record
+from .api import bookings_page, next_page_url
+from .routing import replica_reads
+from .spool import submit_message
+from .outbox import emit, has_handlers
+from .idempotency import new_key, remember, replayed_booking, valid_key
 from . import db
 
 main = Blueprint('main', __name__)
 
 @main.route('/')
+@replica_reads()
+@conditional_page
+@cached_page
 def index():
-    parks = Park.query.all()
+    parks = get_parks()
     return render_template('index.html', parks=parks)
 
 @main.route('/parks/<int:park_id>')
+@replica_reads()
+@conditional_page
+@cached_page
 def park_detail(park_id):
-    park = Park.query.get_or_404(park_id)
+    park = get_park_or_404(park_id)
     return render_template('park_detail.html', park=park)
 
 @main.route('/profile')
+@replica_reads()
 @login_required
 def profile():
-    return render_template('profile.html', name=current_user.name)
+    # Only the first page of each window is rendered; the rest is fetched
+    # from /api/bookings as the user scrolls
+    limit = current_app.config['BOOKINGS_PAGE_SIZE']
+    upcoming, upcoming_next = bookings_page(current_user.user_id, 'upcoming', limit=limit)
+    past, past_next = bookings_page(current_user.user_id, 'past', limit=limit)
+    total_bookings = db.session.scalar(
+        select(func.count()).select_from(Booking).where(Booking.user_id == current_user.user_id)
+    )
+    return render_template('profile.html', name=current_user.name,
+                           upcoming=upcoming,
+                           upcoming_next_url=next_page_url('upcoming', upcoming_next, limit),
+                           past=past,
+                           past_next_url=next_page_url('past', past_next, limit),
+                           total_bookings=total_bookings)
 
 @main.route('/booking/new')
 @login_required
 def new_booking():
-    parks = Park.query.all()
+    parks = get_parks()
     today = datetime.now().strftime('%Y-%m-%d')
-    return render_template('new_booking.html', parks=parks, today=today)
+    return render_template('new_booking.html', parks=parks, today=today, idempotency_key=new_key())
 
 @main.route('/booking', methods=['GET'])
 @login_required
 def booking_form():
     return redirect(url_for('main.profile')), 302
 
+def _submission_key():
+    """The form's idempotency key, or None if it is missing or malformed."""
+    key = request.form.get('idempotency_key')
+    return key if valid_key(key) else None
+
+def _booking_from_form():
+    """The booking the form asks for, or None if a field is missing or malformed."""
+    try:
+        booking = Booking(
+            user_id=current_user.user_id,
+            park_id=int(request.form['park_id']),
+            date=datetime.fromisoformat(request.form['date']),
+            num_tickets=int(request.form['num_tickets']),
+            health_safety='health_safety' in request.form
+        )
+    except (KeyError, ValueError):
+        return None
+    return booking if booking.num_tickets > 0 else None
+
+def _queue_follow_ups(booking, key):
+    """Store the submission's key and the booking.created event with the booking."""
+    if key or has_handlers('booking.created'):
+        # Assigns the booking_id that the key and the event refer to
+        db.session.flush()
+    if key:
+        remember(current_user.user_id, key, booking.booking_id)
+    # Follow-up work is queued in the same transaction, for the outbox worker
+    emit('booking.created', {
+        'booking_id': booking.booking_id, 'user_id': booking.user_id, 'email': current_user.email,
+        'name': current_user.name, 'park_id': booking.park_id, 'date': booking.date.isoformat(),
+        'num_tickets': booking.num_tickets, 'health_safety': booking.health_safety,
+    })
+
+def _commit_booking(key):
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A copy of this submission committed first; this one's tickets are released too
+        db.session.rollback()
+        if key is None or replayed_booking(current_user.user_id, key) is None:
+            raise
+
 @main.route('/booking', methods=['POST'])
 @login_required
 def booking_submit():
-    booking = Booking(
-        user_id=current_user.user_id,
-        park_id=request.form['park_id'],
-        date=datetime.fromisoformat(request.form['date']),
-        num_tickets=int(request.form['num_tickets']),
-        health_safety='health_safety' in request.form
-    )
+    # A resubmitted form gets the original answer without booking again
+    key = _submission_key()
+    if key and replayed_booking(current_user.user_id, key) is not None:
+        return redirect(url_for('main.profile'))
 
-    db.session.add(booking)
-    db.session.commit()
+    booking = _booking_from_form()
+    if booking is None:
+        flash('Please choose a park, a date and at least one ticket.', 'error')
+        return redirect(url_for('main.new_booking'))
+
+    # Take the tickets from the day's counter in the same transaction as the insert
+    try:
+        reserve(booking.park_id, booking.date, booking.num_tickets)
+    except SoldOut:
+        db.session.rollback()
+        flash('Sorry, there are not enough tickets left for that day. Please pick another date.', 'error')
+        return redirect(url_for('main.new_booking'))
+    except LookupError:
+        # Only a tampered form names a park that doesn't exist
+        db.session.rollback()
+        flash('Please choose one of our parks.', 'error')
+        return redirect(url_for('main.new_booking'))
 
+    db.session.add(booking)
+    # Keep the admin dashboard's totals current in the same transaction
+    record([booking])
+    _queue_follow_ups(booking, key)
+    _commit_booking(key)
     return redirect(url_for('main.profile'))
 
 @main.route('/health-safety-guidelines')
@@ -73,19 +163,13 @@ def contact_submit():
             flash('Please fill in all fields.', 'error')
             return redirect(referrer + '#contact')
         
-        message = Message(
-            name=request.form['name'],
-            email=request.form['email'],
-            message=request.form['message']
-        )
-        
-        db.session.add(message)
-        db.session.commit()
+        submit_message(request.form['name'], request.form['email'], request.form['message'])
         
         flash('Thank you for your message! We will get back to you soon.', 'success')
         
-    except Exception as e:
-        print(f"Error sending message: {e}")
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Could not store a contact message')
         flash('Sorry, there was an error sending your message. Please try again.', 'error')
     
     return redirect(referrer + '#contact')
\ No newline at end of file
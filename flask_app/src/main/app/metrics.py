@@ -0,0 +1,301 @@
+"""
+Process metrics in the Prometheus text format, served at /metrics.
+
+Each Gunicorn worker has its own connection pool, so every sample carries the
+worker's pid; sum over `pid` for host-wide figures. Other modules add their
+own samples with register_collector().
+
+A scrape reaches whichever worker accepts it. With METRICS_DIR set, every
+worker writes its samples to <METRICS_DIR>/<pid>.json every
+METRICS_PUBLISH_INTERVAL seconds, and a scrape returns the samples of all
+live workers on the host, its own freshly collected. Files of workers that
+have exited are removed. Without METRICS_DIR a scrape only covers the worker
+that answered it, which is fine for a single process.
+
+Connection pool metrics, per bind:
+
+    db_pool_size, db_pool_checked_out, db_pool_overflow     (gauges)
+    db_pool_checkouts_total, db_pool_connects_total,
+    db_pool_invalidations_total, db_pool_timeouts_total     (counters)
+    db_pool_wait_seconds                                    (histogram of time spent waiting for a connection)
+
+Scrapers must send METRICS_TOKEN as a bearer token; while it is unset,
+/metrics refuses every request.
+"""
+from bisect import bisect_left
+import glob
+import hmac
+import json
+import os
+import threading
+import time
+from flask import Blueprint, abort, current_app, request
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+from . import db
+
+metrics = Blueprint('metrics', __name__)
+
+# Upper bounds, in seconds, of the buckets of wait-time histograms
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+
+def bucket_index(seconds):
+    """Index of the first WAIT_BUCKETS bound `seconds` falls under (len(WAIT_BUCKETS): only +Inf)."""
+    return bisect_left(WAIT_BUCKETS, seconds)
+
+
+def histogram(name, labels, buckets, total, count):
+    """Samples of a wait-time histogram from per-bucket (non-cumulative) counts."""
+    cumulative = 0
+    for bound, observed in zip(WAIT_BUCKETS, buckets):
+        cumulative += observed
+        yield f'{name}_bucket', 'histogram', dict(labels, le=str(bound)), cumulative
+    yield f'{name}_bucket', 'histogram', dict(labels, le='+Inf'), count
+    yield f'{name}_sum', 'histogram', labels, total
+    yield f'{name}_count', 'histogram', labels, count
+
+
+class PoolStats:
+    """Counters for one connection pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_count = 0
+        self.wait_sum = 0.0
+        self.wait_buckets = [0] * len(WAIT_BUCKETS)
+
+    def add(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def observe_wait(self, seconds):
+        with self._lock:
+            self.wait_count += 1
+            self.wait_sum += seconds
+            index = bucket_index(seconds)
+            if index < len(WAIT_BUCKETS):
+                self.wait_buckets[index] += 1
+
+
+class InstrumentedQueuePool(QueuePool):
+    """A QueuePool that records how long each checkout waited for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            self.stats.add('timeouts')
+            raise
+        finally:
+            self.stats.observe_wait(time.perf_counter() - started)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def _stats(pool):
+    stats = getattr(pool, 'stats', None)
+    if stats is None:
+        stats = pool.stats = PoolStats()
+    return stats
+
+
+def configure_engine_options(app):
+    """Use the instrumented pool for server databases; call before db.init_app."""
+    options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}
+    if 'pool_size' in options:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(options, poolclass=InstrumentedQueuePool)
+
+
+def _watch_engine(engine):
+    # Pool listeners registered on the engine survive pool.recreate()
+    event.listen(engine, 'checkout', lambda *args: _stats(engine.pool).add('checkouts'))
+    event.listen(engine, 'connect', lambda *args: _stats(engine.pool).add('connects'))
+    event.listen(engine, 'invalidate', lambda *args: _stats(engine.pool).add('invalidations'))
+
+
+def _pool_samples(app):
+    with app.app_context():
+        engines = dict(db.engines)
+    for bind, engine in engines.items():
+        pool = engine.pool
+        labels = {'bind': bind or 'default'}
+        stats = _stats(pool)
+        for name, method in (('size', 'size'), ('checked_out', 'checkedout'), ('overflow', 'overflow')):
+            if hasattr(pool, method):
+                yield f'db_pool_{name}', 'gauge', labels, getattr(pool, method)()
+        yield 'db_pool_checkouts_total', 'counter', labels, stats.checkouts
+        yield 'db_pool_connects_total', 'counter', labels, stats.connects
+        yield 'db_pool_invalidations_total', 'counter', labels, stats.invalidations
+        yield 'db_pool_timeouts_total', 'counter', labels, stats.timeouts
+        yield from histogram('db_pool_wait_seconds', labels, stats.wait_buckets, stats.wait_sum, stats.wait_count)
+
+
+def register_collector(app, collector):
+    """Add a callable returning (name, type, labels, value) samples for `app`."""
+    app.extensions['metrics_collectors'].append(collector)
+
+
+def _family(name, kind):
+    if kind == 'histogram':
+        for suffix in ('_bucket', '_sum', '_count'):
+            if name.endswith(suffix):
+                return name[:-len(suffix)]
+    return name
+
+
+def collect(app):
+    """This process's samples as [name, type, labels, value], each labelled with the pid."""
+    pid = str(os.getpid())
+    return [[name, kind, dict(labels, pid=pid), value]
+            for collector in app.extensions['metrics_collectors']
+            for name, kind, labels, value in collector(app)]
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def publish(app):
+    """Write this process's samples to METRICS_DIR for the worker that answers the next scrape."""
+    directory = app.config.get('METRICS_DIR')
+    if not directory:
+        return
+    path = os.path.join(directory, f'{os.getpid()}.json')
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(collect(app), f)
+    # Readers never see a half-written file
+    os.replace(f'{path}.tmp', path)
+
+
+def _host_samples(app):
+    """Fresh samples of this process plus the last published ones of every other live worker."""
+    directory = app.config['METRICS_DIR']
+    publish(app)
+    samples = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        pid = int(os.path.basename(path)[:-len('.json')])
+        if not _alive(pid):
+            _unlink(path)
+            continue
+        try:
+            with open(path) as f:
+                samples += json.load(f)
+        except (OSError, ValueError):
+            # Removed by its worker on exit since the glob
+            continue
+    return samples
+
+
+def _unlink(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def render(app):
+    """The text exposition format; samples of one metric are kept together."""
+    samples = _host_samples(app) if app.config.get('METRICS_DIR') else collect(app)
+    families = {}
+    for name, kind, labels, value in samples:
+        label_text = ','.join(f'{key}="{val}"' for key, val in sorted(labels.items()))
+        family = _family(name, kind)
+        families.setdefault(family, [f'# TYPE {family} {kind}']).append(f'{name}{{{label_text}}} {value}')
+    return ''.join(line + '\n' for lines in families.values() for line in lines)
+
+
+class Publisher:
+    """A daemon thread per process that publishes its samples every `interval` seconds."""
+
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pid = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        # Once per process: from Gunicorn's post_fork, or on the first request
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopping = threading.Event()
+            threading.Thread(target=self._run, name='metrics-publisher', daemon=True).start()
+
+    def stop(self):
+        """Stop publishing and remove this process's file, e.g. as the worker exits."""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self._pid = None
+        self._stopping.set()
+        _unlink(os.path.join(self.app.config['METRICS_DIR'], f'{os.getpid()}.json'))
+
+    def _run(self):
+        stopping = self._stopping
+        while True:
+            try:
+                publish(self.app)
+            except Exception:
+                self.app.logger.exception('Could not publish metrics')
+            if stopping.wait(self.interval):
+                return
+
+
+def start_publisher(app):
+    """Start this process's publisher, if METRICS_DIR is set; for Gunicorn's post_fork."""
+    publisher = app.extensions.get('metrics_publisher')
+    if publisher is not None:
+        publisher.start()
+
+
+def stop_publisher(app):
+    """Stop this process's publisher; for Gunicorn's worker_exit."""
+    publisher = app.extensions.get('metrics_publisher')
+    if publisher is not None:
+        publisher.stop()
+
+
+@metrics.route('/metrics')
+def metrics_endpoint():
+    token = current_app.config.get('METRICS_TOKEN')
+    # Closed until a token is configured
+    if not token or not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(401)
+    return render(current_app), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+def init_app(app):
+    """Start collecting pool metrics; call after db.init_app."""
+    app.extensions['metrics_collectors'] = [_pool_samples]
+    with app.app_context():
+        for engine in db.engines.values():
+            _watch_engine(engine)
+    directory = app.config.get('METRICS_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        publisher = app.extensions['metrics_publisher'] = Publisher(
+            app, app.config.get('METRICS_PUBLISH_INTERVAL', 5))
+        app.before_request(publisher.start)
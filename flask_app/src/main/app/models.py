@@ -1,19 +1,33 @@
-from wtforms.validators import DataRequired, Email 
-from werkzeug.security import generate_password_hash
+from wtforms.validators import DataRequired, Email, ValidationError
 from flask_login import UserMixin, current_user
 from flask_admin.contrib.sqla import ModelView
-from flask_admin import AdminIndexView
-from flask import redirect, url_for, flash
+from flask_admin import AdminIndexView, expose
+from flask import Response, g, redirect, request, stream_with_context, url_for, flash
+from werkzeug.utils import secure_filename
+import csv
+import io
+from datetime import datetime, timezone
 from . import db
+from .routing import replica_reads
+from .hashing import hash_password
+
+def utcnow():
+    """The current time as naive UTC, which is how timestamp columns store it."""
+    # Use it as a default rather than func.now(), which is local time on MySQL
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 
 class User(UserMixin,db.Model):
     __tablename__ = 'users'
     user_id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     last_name = db.Column(db.String(100), nullable=False)
+    # The unique constraint's index serves lookups by email
     email = db.Column(db.String(100), unique=True, nullable=False) 
     password = db.Column(db.String(255), nullable=False) 
     role_id = db.Column(db.Integer, db.ForeignKey('roles.role_id'))
+    # Bumped to retire the principals in this user's session cookies
+    session_epoch = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     bookings = db.relationship('Booking', backref='user')
     role = db.relationship('Role', back_populates='users')
 
@@ -72,6 +86,8 @@ class Park(db.Model):
     price = db.Column(db.String(50), default='Starting at $49.99')
     wait_time = db.Column(db.String(50), default='30-60 minutes')
     height_requirement = db.Column(db.String(50), default='48" (1.2m)')
+    daily_capacity = db.Column(db.Integer, nullable=False, default=500, server_default='500')
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
     bookings = db.relationship('Booking', backref='park')
     
 
@@ -90,7 +106,9 @@ class Park(db.Model):
             'min_age': self.min_age,
             'price':self.price, 
             'wait_time': self.wait_time,
-            'height_requirement': self.height_requirement
+            'height_requirement': self.height_requirement,
+            'daily_capacity': self.daily_capacity,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
  
         }
 
@@ -106,6 +124,11 @@ class Booking(db.Model):
     date = db.Column(db.DateTime, nullable=False)
     num_tickets = db.Column(db.Integer, nullable=False, default=1)
     health_safety = db.Column(db.Boolean, nullable=False, default=False)
+    __table_args__ = (
+        # Profile listing (a user's bookings by date) and per-park day lookups
+        db.Index('ix_bookings_user_date', 'user_id', 'date'),
+        db.Index('ix_bookings_park_date', 'park_id', 'date'),
+    )
 
     def to_json(self):
         return {
@@ -120,13 +143,73 @@ class Booking(db.Model):
     def __repr__(self):
         return f''
     
+class ParkDayCapacity(db.Model):
+    __tablename__ = 'park_day_capacity'
+    park_id = db.Column(db.Integer, db.ForeignKey('parks.park_id', ondelete='CASCADE'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    capacity = db.Column(db.Integer, nullable=False)
+    sold = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (
+        db.CheckConstraint('sold >= 0', name='ck_park_day_capacity_sold'),
+    )
+
+    def to_json(self):
+        return {
+            'park_id': self.park_id,
+            'date': self.date.isoformat(),
+            'capacity': self.capacity,
+            'sold': self.sold,
+            'remaining': max(self.capacity - self.sold, 0)
+        }
+
+class OutboxEvent(db.Model):
+    __tablename__ = 'outbox'
+    event_id = db.Column(db.Integer, primary_key=True)
+    topic = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=utcnow, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # When the worker may next take the event; NULL once it has given up
+    available_at = db.Column(db.DateTime, index=True)
+    last_error = db.Column(db.Text)
+    # Handlers that have already succeeded; a retry skips them
+    delivered_to = db.Column(db.JSON)
+    # Set by the claim that holds the current lease
+    lease_token = db.Column(db.String(32))
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    key = db.Column(db.String(64), primary_key=True)
+    booking_id = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class BookingDailyRollup(db.Model):
+    __tablename__ = 'booking_daily_rollup'
+    park_id = db.Column(db.Integer, db.ForeignKey('parks.park_id', ondelete='CASCADE'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    bookings = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    tickets = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Bookings that opted in to the health & safety guidelines
+    health_safety = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    __table_args__ = (
+        # The dashboard reads a range of days across every park
+        db.Index('ix_booking_daily_rollup_date', 'date'),
+    )
+
+class BookingUserRollup(db.Model):
+    __tablename__ = 'booking_user_rollup'
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    bookings = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    tickets = db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True)
+
 class Message(db.Model):
     __tablename__ = 'messages'
     message_id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(100), nullable=False)
     message = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.DateTime, default=db.func.now())
+    created_at = db.Column(db.DateTime, default=db.func.now(), index=True)
 
     def to_json(self):
         return {
@@ -139,16 +222,95 @@ class Message(db.Model):
 
 
 class AppModelView(ModelView):
+    # Rows fetched per round trip, and written per response chunk, by CSV exports
+    export_batch_size = 500
+
     def is_accessible(self):
         return (current_user.is_authenticated and current_user.has_role('admin'))
+
+    def get_list(self, *args, **kwargs):
+        # List pages only read; edits and deletes still go to the primary
+        with replica_reads():
+            return super().get_list(*args, **kwargs)
+
+    # _export_data and _export_csv replace Flask-Admin's private export
+    # methods; they follow Flask-Admin==1.6.1, pinned in requirements.txt and
+    # checked by test_admin_export.py. Re-check them when upgrading.
+    def get_count_query(self):
+        # Exports never show a total, so don't COUNT the rows before streaming them
+        if g.get('admin_export'):
+            return None
+        return super().get_count_query()
+
+    def _export_data(self):
+        # As upstream: macros in column_formatters_export can't render outside a template
+        exported = [name for name, _ in self._export_columns]
+        for name, formatter in self.column_formatters_export.items():
+            if name in exported and formatter.__name__ == 'inner':
+                raise NotImplementedError(
+                    'Macros are not implemented in export. Exclude column in column_formatters_export, '
+                    f'column_export_list, or column_export_exclude_list. Column: {name}')
+
+        # Flask-Admin runs the export query here and holds every row in
+        # memory; build it with the list view's search and filters applied
+        # in SQL, but leave it unexecuted for _export_csv to stream
+        view_args = self._get_list_extra_args()
+        sort_column = self._get_column_by_idx(view_args.sort)
+        if sort_column is not None:
+            sort_column = sort_column[0]
+        g.admin_export = True
+        try:
+            return self.get_list(0, sort_column, view_args.sort_desc, view_args.search, view_args.filters,
+                                 execute=False, page_size=self.export_max_rows)
+        finally:
+            g.admin_export = False
+
+    def _export_csv(self, return_url):
+        _count, query = self._export_data()
+        columns = self._export_columns
+
+        def generate():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow([label for _, label in columns])
+            # The generator outlives the view, so route its reads here
+            with replica_reads():
+                for n, model in enumerate(query.yield_per(self.export_batch_size), 1):
+                    writer.writerow([self.get_export_value(model, name) for name, _ in columns])
+                    if n % self.export_batch_size == 0:
+                        yield buffer.getvalue()
+                        buffer.seek(0)
+                        buffer.truncate()
+            yield buffer.getvalue()
+
+        filename = secure_filename(self.get_export_name(export_type='csv'))
+        return Response(stream_with_context(generate()), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment;filename={filename}'})
     
     def inaccessible_callback(self, name, **kwargs):
         flash('ADMIN ACCESS ONLY! Please login with Admin credentials!')
         return redirect(url_for("login.login"))
 
 class AppIndexView(AdminIndexView):
+    # Days shown on the dashboard unless ?days= asks for another window
+    dashboard_days = 14
+    dashboard_max_days = 92
+
     def is_accessible(self):
         return (current_user.is_authenticated and current_user.has_role('admin'))
+
+    @expose('/')
+    def index(self):
+        from datetime import date, timedelta
+        from .rollups import dashboard
+
+        days = request.args.get('days', self.dashboard_days, type=int)
+        days = min(max(days, 1), self.dashboard_max_days)
+        first = date.today()
+        # Reads only the rollup tables, never bookings
+        with replica_reads():
+            stats = dashboard(first, first + timedelta(days=days - 1))
+        return self.render('admin/dashboard.html', stats=stats, window=days)
     
     def inaccessible_callback(self, name, **kwargs):
         flash('ADMIN ACCESS ONLY! Please login with Admin credentials!')
@@ -157,7 +319,9 @@ class AppIndexView(AdminIndexView):
 
 class UserView(AppModelView):
 
+    can_export = True
     column_list = ('name', 'last_name', 'email', 'password', 'role') 
+    column_export_exclude_list = ('password',)
     column_labels = {
         'name': 'Name',
         'last_name': 'Last Name',
@@ -181,7 +345,17 @@ class UserView(AppModelView):
     }
 
     def on_model_change(self, form, model, is_created):
-        model.password = generate_password_hash(model.password, method='pbkdf2:sha256')
+        from .identity import bump_session_epoch
+        model.password = hash_password(model.password)
+        bump_session_epoch(model)
+
+    def after_model_change(self, form, model, is_created):
+        from .identity import invalidate
+        invalidate(model.user_id)
+
+    def after_model_delete(self, model):
+        from .identity import invalidate
+        invalidate(model.user_id)
 
 class RoleView(AppModelView):
 
@@ -197,8 +371,17 @@ class RoleView(AppModelView):
         'name': {'validators': [DataRequired()]}
     }
 
+    def after_model_change(self, form, model, is_created):
+        from .identity import invalidate
+        invalidate()
+
+    def after_model_delete(self, model):
+        from .identity import invalidate
+        invalidate()
+
 class BookingView(AppModelView):
   
+    can_export = True
     column_list = ('park', 'date', 'num_tickets', 'health_safety', 'user')  
     column_labels = {
         'park': 'Park',
@@ -207,7 +390,7 @@ class BookingView(AppModelView):
         'health_safety': 'Health & Safety',
         'user': 'User'
     }  
-    column_filters = ('park', 'user')
+    column_filters = ('park', 'user', 'date')
     column_searchable_list = ('park.name', 'user.name')
     column_sortable_list = ()  
     form_columns = ('park', 'date', 'num_tickets', 'health_safety', 'user') 
@@ -219,9 +402,40 @@ class BookingView(AppModelView):
         'health_safety': {'validators': [DataRequired()]}
     }
 
+    def on_model_change(self, form, model, is_created):
+        from .inventory import reserve, release, SoldOut
+        from .rollups import record
+
+        if not is_created:
+            # park_id and user_id are only synced from the relationships at
+            # flush time, so they still hold the booking's original values
+            state = db.inspect(model)
+            old = dict(park_id=model.park_id, user_id=model.user_id, date=_previous_value(state, 'date'),
+                       num_tickets=_previous_value(state, 'num_tickets'),
+                       health_safety=_previous_value(state, 'health_safety'))
+            release(old['park_id'], old['date'], old['num_tickets'])
+            record([old], sign=-1)
+
+        try:
+            reserve(model.park.park_id, model.date, model.num_tickets)
+        except SoldOut as e:
+            raise ValidationError(str(e))
+        record([dict(park_id=model.park.park_id, user_id=model.user.user_id, date=model.date,
+                     num_tickets=model.num_tickets, health_safety=model.health_safety)])
+
+    def on_model_delete(self, model):
+        from .inventory import release
+        from .rollups import record
+        release(model.park_id, model.date, model.num_tickets)
+        record([model], sign=-1)
+
+def _previous_value(state, attr):
+    history = state.attrs[attr].history
+    return history.deleted[0] if history.deleted else state.attrs[attr].value
+
 class ParkView(AppModelView):
   
-    column_list = ('name', 'location', 'description', 'image_path', 'short_description', 'slug', 'folder', 'hours', 'min_age', 'price', 'wait_time', 'height_requirement')
+    column_list = ('name', 'location', 'description', 'image_path', 'short_description', 'slug', 'folder', 'hours', 'min_age', 'price', 'wait_time', 'height_requirement', 'daily_capacity')
     column_labels = {
         'name': 'Name',
         'location': 'Location',
@@ -234,7 +448,8 @@ class ParkView(AppModelView):
         'min_age': 'Min Age',
         'price': 'Price',
         'wait_time': 'Wait Time',
-        'height_requirement': 'Height Requirement'
+        'height_requirement': 'Height Requirement',
+        'daily_capacity': 'Daily Capacity'
     }
     column_filters = ('name', 'location')
     column_formatters = {
@@ -242,7 +457,7 @@ class ParkView(AppModelView):
     }
     column_searchable_list = ('name', 'location')
     column_sortable_list = ()
-    form_columns = ('name', 'location', 'description', 'image_path', 'short_description', 'slug', 'folder', 'hours', 'min_age', 'price', 'wait_time', 'height_requirement')
+    form_columns = ('name', 'location', 'description', 'image_path', 'short_description', 'slug', 'folder', 'hours', 'min_age', 'price', 'wait_time', 'height_requirement', 'daily_capacity')
     form_args = {
         'name': {'validators': [DataRequired()]},
         'location': {'validators': [DataRequired()]},
@@ -255,11 +470,30 @@ class ParkView(AppModelView):
         'min_age': {'validators': [DataRequired()]},
         'price': {'validators': [DataRequired()]},
         'wait_time': {'validators': [DataRequired()]},
-        'height_requirement': {'validators': [DataRequired()]}
+        'height_requirement': {'validators': [DataRequired()]},
+        'daily_capacity': {'validators': [DataRequired()]}
     }
 
+    def on_model_change(self, form, model, is_created):
+        if not is_created and db.inspect(model).attrs.daily_capacity.history.has_changes():
+            from .inventory import sync_capacity
+            sync_capacity(model)
+
+    def after_model_change(self, form, model, is_created):
+        self._invalidate_caches()
+
+    def after_model_delete(self, model):
+        self._invalidate_caches()
+
+    def _invalidate_caches(self):
+        from .catalogue import invalidate
+        from .page_cache import purge
+        invalidate()
+        purge()
+
 class MessageView(AppModelView):
    
+    can_export = True
     column_list = ('name', 'email', 'message', 'created_at')
     column_labels = {'name': 'Name', 'email': 'Email', 'message': 'Message', 'created_at': 'Create Date'}
     column_filters = ('email',)
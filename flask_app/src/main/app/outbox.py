@@ -0,0 +1,240 @@
+"""
+Transactional outbox for work that follows a booking.
+
+A booking's confirmation email, analytics event and anything added later
+must not run inside the booking request, or its latency grows with every
+side effect. Instead booking_submit writes an OutboxEvent in the same
+transaction as the Booking: either both are committed or neither is. A
+separate worker process delivers the events:
+
+    flask --app app outbox work
+
+The worker claims due events in batches and hands each one to the handlers
+registered for its topic. A claim only takes events that are still due
+when it leases them, so two workers never hold the same event. An event is deleted once every handler has
+succeeded. If a handler fails, the handlers that did succeed are recorded
+on the event (delivered_to), and only the rest run when it is retried with
+exponential backoff. After OUTBOX_MAX_ATTEMPTS it is parked (available_at
+NULL) for an operator to look at with `flask outbox status`. Delivery is
+still at least once: a worker that crashes mid-event runs its handlers
+again, so handlers use the event id to skip work already done.
+
+Handlers are registered per app with register_handler(app, topic, fn). The
+built-in ones are switched on by configuration:
+
+    MAIL_SERVER / MAIL_PORT / MAIL_SENDER  booking confirmation emails (SMTP)
+    OUTBOX_WEBHOOK_URL                     every event POSTed as JSON
+"""
+from datetime import timedelta
+from email.message import EmailMessage
+import json
+import smtplib
+import time
+import urllib.request
+import uuid
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, func, select, update
+
+from . import db
+from .models import utcnow
+
+outbox_cli = AppGroup('outbox', help='Deliver and inspect outbox events.')
+
+# How long a claimed event is hidden from other workers while it is delivered
+LEASE_SECONDS = 300
+MAX_BACKOFF = 3600
+
+
+def register_handler(app, topic, handler):
+    """Call handler(event) for each `topic` event; it must tolerate repeats."""
+    app.extensions['outbox_handlers'].setdefault(topic, []).append(handler)
+
+
+def _handler_name(handler):
+    """How `handler` is recorded in an event's delivered_to."""
+    return f'{handler.__module__}.{handler.__qualname__}'
+
+
+def has_handlers(topic):
+    """Whether `topic` events would be delivered anywhere; emit() skips them otherwise."""
+    return bool(current_app.extensions['outbox_handlers'].get(topic))
+
+
+def emit(topic, payload):
+    """Add an event to the current transaction; it is delivered once that commits."""
+    from .models import OutboxEvent
+
+    if not has_handlers(topic):
+        return None
+    event = OutboxEvent(topic=topic, payload=payload, available_at=utcnow())
+    db.session.add(event)
+    return event
+
+
+def _due(batch_size, now):
+    """Ids of up to `batch_size` events due at `now`."""
+    from .models import OutboxEvent
+
+    return db.session.execute(
+        select(OutboxEvent.event_id)
+        .where(OutboxEvent.available_at <= now)
+        .order_by(OutboxEvent.event_id)
+        .limit(batch_size)
+        # Lets workers on PostgreSQL skip each other's rows; SQLite ignores it
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+
+
+def _lease(event_ids, now):
+    """Lease those of `event_ids` still due at `now`; returns the rows this call took."""
+    from .models import OutboxEvent
+
+    if not event_ids:
+        return []
+    # Another worker may have read the same ids; only one UPDATE finds them
+    # still due, and the token tells its rows apart from anyone else's
+    token = uuid.uuid4().hex
+    db.session.execute(
+        update(OutboxEvent)
+        .where(OutboxEvent.event_id.in_(event_ids), OutboxEvent.available_at <= now)
+        .values(available_at=now + timedelta(seconds=LEASE_SECONDS), lease_token=token)
+    )
+    # Plain rows rather than instances, so the commits that follow don't expire them
+    return db.session.execute(
+        select(OutboxEvent.event_id, OutboxEvent.topic, OutboxEvent.payload, OutboxEvent.attempts,
+               OutboxEvent.delivered_to)
+        .where(OutboxEvent.event_id.in_(event_ids), OutboxEvent.lease_token == token)
+        .order_by(OutboxEvent.event_id)
+    ).all()
+
+
+def claim(batch_size, now=None):
+    """Lease up to `batch_size` due events to this worker; returns rows of id, topic, payload, attempts, delivered_to."""
+    now = now or utcnow()
+    events = _lease(_due(batch_size, now), now)
+    db.session.commit()
+    return events
+
+
+def _run_handlers(event, handlers, done):
+    """Run the handlers not yet in `done`, adding each one that succeeds."""
+    for handler in handlers:
+        name = _handler_name(handler)
+        if name not in done:
+            handler(event)
+            done.append(name)
+
+
+def _failed(event, error, done, now, max_attempts):
+    """Schedule a retry of the handlers still to run, or park the event."""
+    from .models import OutboxEvent
+
+    attempts = event.attempts + 1
+    parked = attempts >= max_attempts
+    current_app.logger.warning('Outbox event %s (%s) failed, attempt %d%s: %s', event.event_id,
+                               event.topic, attempts, ', parked' if parked else '', error)
+    db.session.execute(
+        update(OutboxEvent).where(OutboxEvent.event_id == event.event_id).values(
+            attempts=attempts, last_error=str(error)[:500], delivered_to=done,
+            available_at=None if parked else now + timedelta(seconds=min(2 ** attempts, MAX_BACKOFF)))
+    )
+    db.session.commit()
+
+
+def deliver(batch_size=100, now=None):
+    """Claim one batch and run its handlers; returns (delivered, failed)."""
+    from .models import OutboxEvent
+
+    now = now or utcnow()
+    handlers = current_app.extensions['outbox_handlers']
+    max_attempts = current_app.config.get('OUTBOX_MAX_ATTEMPTS', 8)
+    delivered, failed = [], 0
+    for event in claim(batch_size, now):
+        done = list(event.delivered_to or ())
+        try:
+            _run_handlers(event, handlers.get(event.topic, ()), done)
+        except Exception as e:
+            db.session.rollback()
+            failed += 1
+            _failed(event, e, done, now, max_attempts)
+        else:
+            delivered.append(event.event_id)
+    if delivered:
+        db.session.execute(delete(OutboxEvent).where(OutboxEvent.event_id.in_(delivered)))
+    db.session.commit()
+    return len(delivered), failed
+
+
+def send_booking_confirmation(event):
+    """Email the customer their booking details."""
+    from .models import Park
+
+    config = current_app.config
+    booking = event.payload
+    park = db.session.get(Park, booking['park_id'])
+    message = EmailMessage()
+    message['From'] = config.get('MAIL_SENDER', 'bookings@localhost')
+    message['To'] = booking['email']
+    message['Subject'] = f'Your booking at {park.name}'
+    # Receivers can drop repeats of the same event
+    message['Message-ID'] = f'<booking-{booking["booking_id"]}-event-{event.event_id}@wwa>'
+    message.set_content(
+        f'Hello {booking["name"]},\n\n'
+        f'Your booking #{booking["booking_id"]} for {booking["num_tickets"]} ticket(s) '
+        f'at {park.name} on {booking["date"][:10]} is confirmed.\n'
+    )
+    with smtplib.SMTP(config['MAIL_SERVER'], config.get('MAIL_PORT', 25), timeout=10) as smtp:
+        smtp.send_message(message)
+
+
+def post_webhook(event):
+    """POST the event as JSON, with its id for de-duplication."""
+    body = json.dumps({'id': event.event_id, 'topic': event.topic, 'payload': event.payload}).encode()
+    request = urllib.request.Request(current_app.config['OUTBOX_WEBHOOK_URL'], data=body, method='POST',
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        response.read()
+
+
+@outbox_cli.command('work')
+@click.option('--once', is_flag=True, help='Deliver what is due now, then exit.')
+@click.option('--batch-size', type=int, help='Events claimed at a time (default: OUTBOX_BATCH_SIZE).')
+def work_command(once, batch_size):
+    """Deliver outbox events until interrupted."""
+    batch_size = batch_size or current_app.config.get('OUTBOX_BATCH_SIZE', 100)
+    interval = current_app.config.get('OUTBOX_POLL_INTERVAL', 1.0)
+    total = 0
+    while True:
+        delivered, failed = deliver(batch_size)
+        total += delivered
+        if once and not delivered and not failed:
+            click.echo(f'Delivered {total} event(s).')
+            return
+        if not delivered and not failed:
+            time.sleep(interval)
+
+
+@outbox_cli.command('status')
+def status_command():
+    """Show waiting and parked events."""
+    from .models import OutboxEvent
+
+    rows = db.session.execute(
+        select(OutboxEvent.topic, OutboxEvent.available_at.is_(None), func.count())
+        .group_by(OutboxEvent.topic, OutboxEvent.available_at.is_(None))
+        .order_by(OutboxEvent.topic)
+    ).all()
+    if not rows:
+        click.echo('The outbox is empty.')
+    for topic, parked, count in rows:
+        click.echo(f'{topic}: {count} {"parked" if parked else "waiting"}')
+
+
+def init_app(app):
+    app.extensions['outbox_handlers'] = {}
+    if app.config.get('MAIL_SERVER'):
+        register_handler(app, 'booking.created', send_booking_confirmation)
+    if app.config.get('OUTBOX_WEBHOOK_URL'):
+        register_handler(app, 'booking.created', post_webhook)
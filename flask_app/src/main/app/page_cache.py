@@ -0,0 +1,209 @@
+"""
+Full-page cache for anonymous visitors.
+
+For logged-out visitors the public pages only differ in the contact form's
+CSRF token and any pending flash messages. Views wrapped in @cached_page
+render once per (endpoint, view args, locale, catalogue version) with those
+parts replaced by placeholders ("holes"); later hits are a dictionary lookup
+plus a string replace that fills the holes for the current visitor.
+
+Templates mark a hole with {{ cache_hole('csrf_token') }}; outside a cached
+render it simply returns the real content. Authenticated requests are never
+cached. The catalogue version in the key means a park saved in one worker
+retires the cached pages of every worker.
+
+@conditional_page adds ETag / Last-Modified validators to the same pages,
+so a returning visitor whose copy is still current gets a 304 before any
+rendering happens.
+"""
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+import hashlib
+import threading
+import time
+from flask import current_app, g, make_response, render_template, request, session
+from flask_login import current_user
+from flask_wtf.csrf import generate_csrf
+from markupsafe import Markup
+from .assets import manifest_version
+from .catalogue import current_version, get_catalogue, get_park_or_404
+
+HOLES = {
+    'csrf_token': generate_csrf,
+    'flash_messages': lambda: render_template('components/flash-messages.html'),
+}
+
+
+def _marker(name):
+    return f'<!--page-cache-hole:{name}-->'
+
+
+class PageCache:
+    """A bounded LRU of rendered pages."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+            return page
+
+    def set(self, key, page):
+        with self._lock:
+            self._pages[key] = page
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+    def __len__(self):
+        return len(self._pages)
+
+
+def init_app(app):
+    app.extensions['page_cache'] = PageCache(app.config.get('PAGE_CACHE_MAX_ENTRIES', 256))
+    app.jinja_env.globals['cache_hole'] = cache_hole
+
+
+def cache_hole(name):
+    if g.get('page_cache_render'):
+        return Markup(_marker(name))
+    return Markup(HOLES[name]())
+
+
+def fill_holes(html):
+    for name, render in HOLES.items():
+        marker = _marker(name)
+        if marker in html:
+            html = html.replace(marker, render())
+    return html
+
+
+def purge():
+    current_app.extensions['page_cache'].clear()
+
+
+def _locale():
+    return request.accept_languages.best_match(current_app.config.get('LANGUAGES', ['en'])) or 'en'
+
+
+def cached_page(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_app.config.get('PAGE_CACHE_ENABLED', True) or current_user.is_authenticated:
+            return view(*args, **kwargs)
+
+        cache = current_app.extensions['page_cache']
+        key = (request.endpoint, tuple(sorted(kwargs.items())), _locale(), current_version())
+        html = cache.get(key)
+        if html is None:
+            g.page_cache_render = True
+            try:
+                response = make_response(view(*args, **kwargs))
+            finally:
+                g.page_cache_render = False
+            html = response.get_data(as_text=True)
+            if response.status_code != 200:
+                response.set_data(fill_holes(html))
+                return response
+            cache.set(key, html)
+
+        response = make_response(fill_holes(html))
+        response.vary.add('Cookie')
+        response.vary.add('Accept-Language')
+        return response
+    return wrapper
+
+
+def _token_window():
+    """
+    Start of the current CSRF freshness window.
+
+    Pages embed a CSRF token that expires after WTF_CSRF_TIME_LIMIT, so the
+    validators roll over every half limit; a copy revalidated with a 304 can
+    never carry a token older than the limit.
+    """
+    limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    if not limit:
+        return 0
+    half = max(limit // 2, 1)
+    return int(time.time()) // half * half
+
+
+def _last_modified(kwargs):
+    if 'park_id' in kwargs:
+        stamps = [get_park_or_404(kwargs['park_id']).updated_at]
+    else:
+        catalogue = get_catalogue()
+        # changed_at also covers parks deleted since
+        stamps = [park.updated_at for park in catalogue.parks] + [catalogue.changed_at]
+    stamps = [stamp for stamp in stamps if stamp is not None]
+    window = datetime.fromtimestamp(_token_window(), timezone.utc)
+    # Timestamps are stored as naive UTC
+    stamps = [stamp.replace(tzinfo=timezone.utc, microsecond=0) for stamp in stamps]
+    return max(stamps + [window])
+
+
+def _etag(kwargs):
+    parts = [
+        current_app.config.get('RELEASE', ''),
+        # Pages link fingerprinted assets, so a rebuilt asset changes the page
+        manifest_version(),
+        request.endpoint,
+        repr(sorted(kwargs.items())),
+        _locale(),
+        str(current_version()),
+        str(_token_window()),
+        # The page carries a token bound to this session's CSRF secret
+        session.get('csrf_token', ''),
+    ]
+    return hashlib.sha256('|'.join(parts).encode()).hexdigest()[:32]
+
+
+def conditional_page(view):
+    """
+    Answer If-None-Match / If-Modified-Since with 304 for anonymous visitors.
+
+    Logged-in pages and responses carrying flash messages are never
+    revalidated, they always render.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if current_user.is_authenticated or session.get('_flashes'):
+            response = make_response(view(*args, **kwargs))
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+
+        etag = _etag(kwargs)
+        last_modified = _last_modified(kwargs)
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains(etag)
+        else:
+            not_modified = request.if_modified_since is not None and last_modified <= request.if_modified_since
+
+        if not_modified:
+            response = current_app.response_class(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            # Rendering may have just created this visitor's CSRF secret
+            etag = _etag(kwargs)
+
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+        return response
+    return wrapper
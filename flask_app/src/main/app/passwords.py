@@ -0,0 +1,154 @@
+"""
+Password policy: the KDF new hashes use, and upgrading old ones.
+
+PASSWORD_HASH_METHOD is a Werkzeug method string:
+
+    scrypt:32768:8:1        scrypt with cost N, block size r, parallelism p
+    pbkdf2:sha256:1000000   PBKDF2 with a digest and iteration count
+
+Every stored hash records the method it was made with, so changing the
+policy never locks anyone out. When a user logs in with a hash made by
+another method, or by the same one with other parameters, it is rehashed
+with the current method on a background thread, so the login itself
+doesn't wait for it.
+
+`flask passwords tune` measures this machine and prints the strongest
+parameters that still verify within a target latency; `flask passwords
+status` shows how many stored hashes are outdated.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func, update
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash
+
+from . import db
+
+passwords_cli = AppGroup('passwords', help='Tune and inspect password hashing.')
+
+SCRYPT_DEFAULTS = ('32768', '8', '1')
+
+
+def canonical_method(method):
+    """The full method string Werkzeug records for `method`, with defaults filled in."""
+    kind, *params = method.split(':')
+    if kind == 'scrypt' and len(params) <= 3:
+        return 'scrypt:' + ':'.join(params + list(SCRYPT_DEFAULTS[len(params):]))
+    if kind == 'pbkdf2' and len(params) <= 2:
+        defaults = ['sha256', str(DEFAULT_PBKDF2_ITERATIONS)]
+        return 'pbkdf2:' + ':'.join(params + defaults[len(params):])
+    raise ValueError(f'Unsupported PASSWORD_HASH_METHOD {method!r}; use scrypt:N:r:p or pbkdf2:digest:iterations')
+
+
+def current_method():
+    return canonical_method(current_app.config['PASSWORD_HASH_METHOD'])
+
+
+def needs_rehash(pwhash):
+    """True if `pwhash` was not made with the current method and parameters."""
+    return pwhash.split('$', 1)[0] != current_method()
+
+
+class Rehasher:
+    """A single background thread that upgrades hashes after a successful login."""
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rehash')
+                self._pid = os.getpid()
+            return self._executor
+
+    def submit(self, user_id, old_hash, password):
+        return self._pool().submit(self._rehash, user_id, old_hash, password)
+
+    def _rehash(self, user_id, old_hash, password):
+        from .hashing import hash_password
+        from .models import User
+
+        with self.app.app_context():
+            try:
+                new_hash = hash_password(password)
+                # Skip it if the password was changed in the meantime
+                db.session.execute(update(User)
+                                   .where(User.user_id == user_id, User.password == old_hash)
+                                   .values(password=new_hash))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception('Could not rehash the password of user %s', user_id)
+
+    def drain(self):
+        """Wait for the rehashes submitted so far."""
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.submit(lambda: None).result()
+
+
+def schedule_rehash(user, password):
+    """Rehash `user`'s password with the current method in the background."""
+    return current_app.extensions['password_rehash'].submit(user.user_id, user.password, password)
+
+
+def _timed_hash(method):
+    started = time.perf_counter()
+    generate_password_hash('benchmark', method)
+    return (time.perf_counter() - started) * 1000
+
+
+def tune(target_ms, kind='scrypt', max_memory_mb=64):
+    """The strongest method of `kind` that hashes within `target_ms` here, and its cost in ms."""
+    if kind == 'pbkdf2':
+        probe = 100_000
+        per_iteration = _timed_hash(f'pbkdf2:sha256:{probe}') / probe
+        iterations = max(int(target_ms / per_iteration) // 10_000 * 10_000, 10_000)
+        method = f'pbkdf2:sha256:{iterations}'
+        return method, _timed_hash(method)
+
+    # scrypt needs 128 * N * r bytes; double N while it fits in time and memory
+    best = ('scrypt:1024:8:1', _timed_hash('scrypt:1024:8:1'))
+    n = 2048
+    while 128 * n * 8 <= max_memory_mb * 2**20:
+        elapsed = _timed_hash(f'scrypt:{n}:8:1')
+        if elapsed > target_ms:
+            break
+        best = (f'scrypt:{n}:8:1', elapsed)
+        n *= 2
+    return best
+
+
+@passwords_cli.command('tune')
+@click.option('--target-ms', default=250, show_default=True, help='Acceptable time to verify one password.')
+@click.option('--kind', type=click.Choice(['scrypt', 'pbkdf2']), default='scrypt', show_default=True)
+@click.option('--max-memory-mb', default=64, show_default=True, help='Memory limit for one scrypt hash.')
+def tune_command(target_ms, kind, max_memory_mb):
+    """Suggest PASSWORD_HASH_METHOD for this machine."""
+    method, elapsed = tune(target_ms, kind, max_memory_mb)
+    click.echo(f'PASSWORD_HASH_METHOD={method}  # {elapsed:.0f} ms per hash on this machine')
+
+
+@passwords_cli.command('status')
+def status_command():
+    """Count stored hashes by method."""
+    from .models import User
+
+    method = func.substr(User.password, 1, func.instr(User.password, '$') - 1)
+    rows = db.session.execute(db.select(method, func.count()).group_by(method)).all()
+    current = current_method()
+    for name, count in rows:
+        click.echo(f'{name:30} {count:6}{"" if name == current else "  (outdated)"}')
+    click.echo(f'Current method: {current}')
+
+
+def init_app(app):
+    canonical_method(app.config['PASSWORD_HASH_METHOD'])
+    app.extensions['password_rehash'] = Rehasher(app)
@@ -0,0 +1,149 @@
+"""
+Rate limits for the sign-in forms.
+
+Every failed login costs a full password verification, so unthrottled
+credential stuffing turns into CPU exhaustion. Two limits apply, both kept
+in the cache store (app/cache.py); with CACHE_STORE_URL=sqlite:///... they
+are shared by every worker on the host:
+
+- Per client IP, a token bucket on every POST to the auth blueprint: bursts
+  of up to RATELIMIT_IP_BURST, refilled at RATELIMIT_IP_PER_MINUTE. Behind
+  a reverse proxy, set TRUSTED_PROXY_HOPS so the client's own address is
+  used rather than the proxy's, which every visitor would share.
+- Per email address, a sliding window: once RATELIMIT_EMAIL_ATTEMPTS
+  failed logins or password resets were made for an address within
+  RATELIMIT_EMAIL_WINDOW seconds, further attempts for it are refused
+  before any password is checked.
+
+Refused requests get a 429 with Retry-After. Rejections are exported on
+/metrics as ratelimit_rejected_total{limit}.
+"""
+import math
+import threading
+import time
+from flask import current_app, request
+
+from .cache import get_store
+
+_lock = threading.Lock()
+
+
+class RateLimited(Exception):
+    """Raised when a limit is exhausted; retry_after is in seconds."""
+
+    def __init__(self, limit, retry_after):
+        super().__init__(f'{limit} rate limit exceeded')
+        self.limit = limit
+        self.retry_after = max(int(math.ceil(retry_after)), 1)
+
+
+def take_token(store, key, burst, per_minute, now=None):
+    """Take one token from the bucket at `key`; returns seconds to wait, 0 if allowed."""
+    now = time.time() if now is None else now
+    rate = per_minute / 60.0
+
+    def refill(state):
+        tokens, stamp, _ = state or (burst, now, 0)
+        tokens = min(burst, tokens + (now - stamp) * rate)
+        if tokens >= 1:
+            return [tokens - 1, now, 0]
+        return [tokens, now, (1 - tokens) / rate]
+
+    # Keep the bucket until it would have refilled completely
+    return store.update(key, refill, ttl=math.ceil(burst / rate) + 1)[2]
+
+
+class SlidingWindow:
+    """
+    Approximate sliding-window counter over two fixed windows.
+
+    The previous window's count is weighted by how much of it still overlaps
+    the sliding window, which needs nothing beyond incr/get.
+    """
+
+    def __init__(self, store, prefix, window):
+        self.store = store
+        self.prefix = prefix
+        self.window = window
+
+    def _keys(self, ident, now):
+        current = int(now // self.window)
+        return f'{self.prefix}:{ident}:{current}', f'{self.prefix}:{ident}:{current - 1}'
+
+    def count(self, ident, now=None):
+        now = time.time() if now is None else now
+        current, previous = self._keys(ident, now)
+        overlap = 1 - (now % self.window) / self.window
+        return self.store.get(current, 0) + self.store.get(previous, 0) * overlap
+
+    def add(self, ident, now=None):
+        now = time.time() if now is None else now
+        self.store.incr(self._keys(ident, now)[0], ttl=2 * self.window)
+
+    def retry_after(self, now=None):
+        now = time.time() if now is None else now
+        return self.window - now % self.window
+
+
+def _enabled():
+    return current_app.config.get('RATELIMIT_ENABLED', True)
+
+
+def _reject(limit, retry_after):
+    stats = current_app.extensions['ratelimit_rejections']
+    with _lock:
+        stats[limit] += 1
+    raise RateLimited(limit, retry_after)
+
+
+def _email_window():
+    return SlidingWindow(get_store(), 'ratelimit:email', current_app.config.get('RATELIMIT_EMAIL_WINDOW', 900))
+
+
+def _email_key(email):
+    return (email or '').strip().lower()
+
+
+def limit_ip():
+    """before_request hook for the auth blueprint: one token per form POST."""
+    if request.method != 'POST' or not _enabled():
+        return
+    config = current_app.config
+    wait = take_token(get_store(), f'ratelimit:ip:{request.remote_addr}',
+                      config.get('RATELIMIT_IP_BURST', 20), config.get('RATELIMIT_IP_PER_MINUTE', 10))
+    if wait:
+        _reject('ip', wait)
+
+
+def check_email(email):
+    """Refuse the request if `email` has used up its attempts."""
+    if not _enabled():
+        return
+    window = _email_window()
+    if window.count(_email_key(email)) >= current_app.config.get('RATELIMIT_EMAIL_ATTEMPTS', 10):
+        _reject('email', window.retry_after())
+
+
+def record_attempt(email):
+    """Count a failed login or a password reset against `email`."""
+    if _enabled():
+        _email_window().add(_email_key(email))
+
+
+def _samples(app):
+    for limit, count in app.extensions['ratelimit_rejections'].items():
+        yield 'ratelimit_rejected_total', 'counter', {'limit': limit}, count
+
+
+def _too_many(error):
+    return ('Too many attempts. Please wait a moment and try again.',
+            429, {'Retry-After': str(error.retry_after), 'Content-Type': 'text/plain; charset=utf-8'})
+
+
+def init_app(app):
+    """Register the 429 handler and metrics; call after cache and metrics init_app."""
+    from .metrics import register_collector
+
+    app.extensions['ratelimit_rejections'] = {'ip': 0, 'email': 0}
+    register_collector(app, _samples)
+    app.register_error_handler(RateLimited, _too_many)
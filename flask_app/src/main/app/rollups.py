@@ -0,0 +1,174 @@
+"""
+Booking rollups for the admin dashboard.
+
+The dashboard shows tickets per park per day, the health & safety opt-in
+rate and the top customers. Computed from `bookings` on every load, each of
+those would scan the whole table, and operations staff refresh the page all
+day during events. Instead two small tables hold running totals:
+
+    booking_daily_rollup  per park and day: bookings, tickets, opt-ins
+    booking_user_rollup   per user: bookings, tickets
+
+Like the ticket counters (app/inventory.py), they are bumped with a
+conditional UPDATE, inserting the row on first use, in the same transaction
+as the booking. Booking form submissions, bulk imports and admin edits and
+deletes all keep them current. Bookings written any other way, such as SQL
+run by hand, are picked up by `flask rollups compact`. It recomputes from
+`bookings` the daily rows from a week ago onwards (every day with --all),
+and the per-user totals of the users who have bookings in that window.
+Run it periodically, e.g. nightly from cron.
+"""
+from datetime import date, datetime, timedelta
+import click
+from flask.cli import AppGroup
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .models import Booking, BookingDailyRollup, BookingUserRollup
+
+rollups_cli = AppGroup('rollups', help='Maintain the booking rollups behind the admin dashboard.')
+
+
+def _as_day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _bump(model, key, bookings, tickets, **extra):
+    """Add to the row for `key`, creating it first if needed."""
+    where = [getattr(model, column) == value for column, value in key.items()]
+    values = dict(bookings=model.bookings + bookings, tickets=model.tickets + tickets,
+                  **{column: getattr(model, column) + amount for column, amount in extra.items()})
+    statement = update(model).where(*where).values(**values).execution_options(synchronize_session=False)
+    if db.session.execute(statement).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(model).values(**key, bookings=bookings, tickets=tickets, **extra))
+    except IntegrityError:
+        # Another transaction created the row first
+        db.session.execute(statement)
+
+
+def record(bookings, sign=1):
+    """
+    Add bookings to the rollups in the current transaction (sign=-1 takes them off).
+
+    `bookings` are Booking instances or dicts with park_id, user_id, date,
+    num_tickets and health_safety. Each park/day and user is updated once.
+    """
+    days, users = {}, {}
+    for booking in bookings:
+        if isinstance(booking, dict):
+            park_id, user_id, when = booking['park_id'], booking['user_id'], booking['date']
+            tickets, health_safety = booking['num_tickets'], booking.get('health_safety', False)
+        else:
+            park_id, user_id, when = booking.park_id, booking.user_id, booking.date
+            tickets, health_safety = booking.num_tickets, booking.health_safety
+        day = days.setdefault((int(park_id), _as_day(when)), [0, 0, 0])
+        day[0] += sign
+        day[1] += sign * tickets
+        day[2] += sign * bool(health_safety)
+        user = users.setdefault(int(user_id), [0, 0])
+        user[0] += sign
+        user[1] += sign * tickets
+
+    for (park_id, day), (count, tickets, opted_in) in days.items():
+        _bump(BookingDailyRollup, {'park_id': park_id, 'date': day}, count, tickets, health_safety=opted_in)
+    for user_id, (count, tickets) in users.items():
+        _bump(BookingUserRollup, {'user_id': user_id}, count, tickets)
+
+
+def compact(since=None):
+    """
+    Recompute the rollups from `bookings`; returns the number of daily rows written.
+
+    Daily rows are rebuilt from `since` onwards (every day if None), so a
+    periodic run only reads a few days of bookings through
+    ix_bookings_park_date. Likewise only the users with bookings from
+    `since` onwards have their totals recomputed, each through
+    ix_bookings_user_date; with since=None every user's are.
+    """
+    day = func.date(Booking.date)
+    query = (select(Booking.park_id, day.label('day'), func.count().label('bookings'),
+                    func.sum(Booking.num_tickets).label('tickets'),
+                    func.sum(case((Booking.health_safety, 1), else_=0)).label('health_safety'))
+             .group_by(Booking.park_id, day))
+    user_query = (select(Booking.user_id, func.count().label('bookings'),
+                         func.sum(Booking.num_tickets).label('tickets'))
+                  .group_by(Booking.user_id))
+    clear = BookingDailyRollup.__table__.delete()
+    clear_users = BookingUserRollup.__table__.delete()
+    if since is not None:
+        start = datetime.combine(since, datetime.min.time())
+        query = query.where(Booking.date >= start)
+        clear = clear.where(BookingDailyRollup.date >= since)
+        # Users without bookings in the window keep their running totals
+        recent = select(Booking.user_id).where(Booking.date >= start).distinct().scalar_subquery()
+        user_query = user_query.where(Booking.user_id.in_(recent))
+        clear_users = clear_users.where(BookingUserRollup.user_id.in_(recent))
+
+    # Delete first: on SQLite that takes the write lock, so no booking can
+    # commit between the reads below and the inserts
+    db.session.execute(clear)
+    db.session.execute(clear_users)
+
+    rows = []
+    for row in db.session.execute(query):
+        row = row._asdict()
+        day_value = row.pop('day')
+        rows.append(dict(row, date=date.fromisoformat(day_value) if isinstance(day_value, str) else day_value))
+    users = [row._asdict() for row in db.session.execute(user_query)]
+
+    if rows:
+        db.session.execute(insert(BookingDailyRollup), rows)
+    if users:
+        db.session.execute(insert(BookingUserRollup), users)
+    db.session.commit()
+    return len(rows)
+
+
+def dashboard(first, last, top=10):
+    """What the admin dashboard shows for days `first` to `last`, read from the rollups only."""
+    from .models import Park, User
+
+    per_day = db.session.execute(
+        select(BookingDailyRollup.park_id, BookingDailyRollup.date, BookingDailyRollup.tickets)
+        .where(BookingDailyRollup.date >= first, BookingDailyRollup.date <= last)
+    ).all()
+    tickets = {(row.park_id, row.date): row.tickets for row in per_day}
+
+    totals = db.session.execute(
+        select(func.coalesce(func.sum(BookingDailyRollup.bookings), 0),
+               func.coalesce(func.sum(BookingDailyRollup.health_safety), 0))
+        .where(BookingDailyRollup.date >= first, BookingDailyRollup.date <= last)
+    ).one()
+
+    customers = db.session.execute(
+        select(User.name, User.last_name, User.email, BookingUserRollup.bookings, BookingUserRollup.tickets)
+        .join(User, User.user_id == BookingUserRollup.user_id)
+        .where(BookingUserRollup.bookings > 0)
+        .order_by(BookingUserRollup.tickets.desc(), BookingUserRollup.user_id)
+        .limit(top)
+    ).all()
+
+    parks = db.session.execute(select(Park.park_id, Park.name).order_by(Park.park_id)).all()
+    days = [first + timedelta(days=n) for n in range((last - first).days + 1)]
+    return {
+        'days': days,
+        'parks': [{'name': park.name, 'tickets': [tickets.get((park.park_id, day), 0) for day in days]}
+                  for park in parks],
+        'bookings': totals[0],
+        'health_safety_rate': totals[1] / totals[0] if totals[0] else None,
+        'top_customers': customers,
+    }
+
+
+@rollups_cli.command('compact')
+@click.option('--days', default=7, show_default=True, help='Rebuild daily rows from this many days ago.')
+@click.option('--all', 'everything', is_flag=True, help='Rebuild every day.')
+def compact_command(days, everything):
+    """Recompute the rollups from the bookings table."""
+    since = None if everything else date.today() - timedelta(days=days)
+    count = compact(since)
+    click.echo(f'Rebuilt {count} park/day rollup(s) and the totals of the users who booked in them.')
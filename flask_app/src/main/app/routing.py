@@ -0,0 +1,84 @@
+"""
+Read-replica routing for db.session.
+
+Replicas are extra binds configured with REPLICA_DATABASE_URLS. Queries go to
+the primary unless they run inside replica_reads(), which views that only
+read wrap themselves in:
+
+    @main.route('/profile')
+    @replica_reads()
+    def profile(): ...
+
+Even there, everything that writes (flushes, INSERT/UPDATE/DELETE) goes to
+the primary, and so does every query after the first write of a request.
+A request that wrote also pins its visitor to the primary for
+REPLICA_STICKY_SECONDS, so they read their own writes while the replicas
+catch up. primary() forces the primary for reads that must never be stale,
+such as the catalogue reload.
+"""
+from contextlib import contextmanager
+import random
+import time
+from flask import current_app, g, has_app_context, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+STICKY_KEY = '_primary_until'
+
+
+class RoutingSession(Session):
+    """A session that sends reads inside replica_reads() to a replica bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            if self._flushing or isinstance(clause, UpdateBase):
+                g.db_wrote = True
+            elif _use_replica():
+                return self._db.engines[_replica_key()]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _use_replica():
+    if g.get('db_route') != 'replica' or g.get('db_wrote'):
+        return False
+    if not current_app.config.get('REPLICA_BINDS'):
+        return False
+    return not (has_request_context() and session.get(STICKY_KEY, 0) > time.time())
+
+
+def _replica_key():
+    # One replica per request, so its reads see a single consistent replica
+    if 'replica_key' not in g:
+        g.replica_key = random.choice(current_app.config['REPLICA_BINDS'])
+    return g.replica_key
+
+
+@contextmanager
+def _route(target):
+    previous = g.get('db_route')
+    g.db_route = target
+    try:
+        yield
+    finally:
+        g.db_route = previous
+
+
+def replica_reads():
+    """Context manager / decorator sending the reads within it to a replica."""
+    return _route('replica')
+
+
+def primary():
+    """Context manager / decorator keeping the reads within it on the primary."""
+    return _route('primary')
+
+
+def remember_writes(response):
+    """Pin a visitor whose request wrote to the primary for a while."""
+    if g.get('db_wrote') and current_app.config.get('REPLICA_BINDS'):
+        session[STICKY_KEY] = time.time() + current_app.config.get('REPLICA_STICKY_SECONDS', 10)
+    return response
+
+
+def init_app(app):
+    app.after_request(remember_writes)
@@ -0,0 +1,69 @@
+"""
+In-place schema upgrades for existing databases.
+
+db.create_all() only creates tables that are missing, so an installation
+created by an older release never picks up new columns or indexes. upgrade()
+brings an existing database in line with the models: it creates missing
+tables, adds missing columns and creates missing indexes. It never drops or
+alters anything, so it is safe to run on every deploy.
+"""
+import click
+from flask.cli import AppGroup
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn
+
+from . import db
+
+schema_cli = AppGroup('schema', help='Inspect and upgrade the database schema.')
+
+
+def _add_missing_columns(connection, inspector, table):
+    existing = {column['name'] for column in inspector.get_columns(table.name)}
+    added = []
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        if not column.nullable and column.server_default is None:
+            raise RuntimeError(
+                f'Cannot add NOT NULL column {table.name}.{column.name} without a server_default'
+            )
+        ddl = CreateColumn(column).compile(dialect=connection.dialect)
+        connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {ddl}')
+        added.append(f'{table.name}.{column.name}')
+    return added
+
+
+def _create_missing_indexes(connection, inspector, table):
+    existing = {index['name'] for index in inspector.get_indexes(table.name)}
+    created = []
+    for index in table.indexes:
+        if index.name not in existing:
+            index.create(bind=connection)
+            created.append(index.name)
+    return created
+
+
+def upgrade():
+    """Apply additive schema changes; returns a list of what was changed."""
+    changes = []
+    with db.engine.begin() as connection:
+        inspector = inspect(connection)
+        existing_tables = set(inspector.get_table_names())
+
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                table.create(bind=connection)
+                changes.append(f'table {table.name}')
+                continue
+            changes += [f'column {name}' for name in _add_missing_columns(connection, inspector, table)]
+            changes += [f'index {name}' for name in _create_missing_indexes(connection, inspector, table)]
+    return changes
+
+
+@schema_cli.command('upgrade')
+def upgrade_command():
+    """Create missing tables, columns and indexes."""
+    changes = upgrade()
+    for change in changes:
+        click.echo(f'Created {change}')
+    click.echo(f'Schema up to date ({len(changes)} change(s) applied).')
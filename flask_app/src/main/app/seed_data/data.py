@@ -1,6 +1,6 @@
 from app import db
 from app.models import User, Role, Park
-from werkzeug.security import generate_password_hash
+from app.hashing import hash_password
 import os
 
 def seed_dev_data():
@@ -31,7 +31,7 @@ def seed_dev_data():
         name="Admin",
         last_name="One",
         email="admin1@example.com",
-        password=generate_password_hash(dev_password, method='pbkdf2:sha256'),
+        password=hash_password(dev_password),
         role=admin_role
     )
 
@@ -39,7 +39,7 @@ def seed_dev_data():
         name="Admin",
         last_name="Two",
         email="admin2@example.com",
-        password=generate_password_hash(dev_password, method='pbkdf2:sha256'),
+        password=hash_password(dev_password),
         role=admin_role
     )
 
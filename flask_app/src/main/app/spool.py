@@ -0,0 +1,258 @@
+"""
+Write-behind spool for contact-form messages.
+
+A marketing campaign can bring a burst of contact-form posts, and inserting
+each one straight into `messages` contends for the database's write lock
+with the bookings being made at the same time. Instead the form appends the
+message to a spool, a small SQLite file on the local disk, and returns. A
+background thread in each worker moves spooled messages into `messages` in
+batches, one transaction per batch. Gunicorn starts it as each worker boots
+and drains it as the worker exits (see gunicorn.conf.py); under other
+servers it starts with the first message and drains at interpreter exit:
+
+    CONTACT_SPOOL_PATH      the spool file, relative to the instance folder
+                            (empty: insert messages directly, as in tests)
+    CONTACT_SPOOL_INTERVAL  seconds between flushes (0: no thread; use
+                            `flask contact flush`)
+    CONTACT_SPOOL_BATCH     messages per insert
+
+Every worker on the host shares the spool file. A flush leases the rows it
+takes, so two workers never insert the same batch; a failed batch is retried
+with exponential backoff, and a worker that dies mid-flush leaves its lease
+to expire. Delivery is at least once: a crash between the insert and the
+spool update can repeat a batch. The spool is exported on /metrics:
+
+    contact_spool_pending                                (gauge)
+    contact_spool_flushed_total, contact_spool_failures_total  (counters)
+"""
+import atexit
+from datetime import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import insert
+
+from . import db
+from .cache import Transaction
+from .models import utcnow
+
+contact_cli = AppGroup('contact', help='Manage the contact-form spool.')
+
+# How long a flush may hold rows before another worker can take them
+LEASE_SECONDS = 60
+MAX_BACKOFF = 300
+
+
+class MessageSpool:
+    """An append-only queue of messages in a local SQLite file."""
+
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self.flushed = 0
+        self.failures = 0
+        self._local = threading.local()
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS spool ('
+            ' id INTEGER PRIMARY KEY, payload TEXT NOT NULL,'
+            ' attempts INTEGER NOT NULL DEFAULT 0, not_before REAL NOT NULL DEFAULT 0)'
+        )
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            # Appends only wait for the WAL write, not an fsync of the file
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def transaction(self):
+        return Transaction(self._connection())
+
+    def append(self, name, email, message, created_at=None):
+        created_at = created_at or utcnow()
+        payload = json.dumps({'name': name, 'email': email, 'message': message,
+                              'created_at': created_at.isoformat()})
+        self._connection().execute('INSERT INTO spool (payload) VALUES (?)', (payload,))
+
+    def take(self, limit, now=None):
+        """Lease up to `limit` due messages; returns [(id, attempts, fields)]."""
+        now = time.time() if now is None else now
+        with self.transaction() as conn:
+            rows = conn.execute(
+                'SELECT id, attempts, payload FROM spool WHERE not_before <= ? ORDER BY id LIMIT ?',
+                (now, limit)
+            ).fetchall()
+            conn.executemany('UPDATE spool SET not_before = ? WHERE id = ?',
+                             [(now + LEASE_SECONDS, row[0]) for row in rows])
+        return [(row_id, attempts, json.loads(payload)) for row_id, attempts, payload in rows]
+
+    def ack(self, ids):
+        with self.transaction() as conn:
+            conn.executemany('DELETE FROM spool WHERE id = ?', [(row_id,) for row_id in ids])
+
+    def retry(self, rows, now=None):
+        """Put leased rows back, each due again after its backoff."""
+        now = time.time() if now is None else now
+        with self.transaction() as conn:
+            conn.executemany(
+                'UPDATE spool SET attempts = ?, not_before = ? WHERE id = ?',
+                [(attempts + 1, now + min(2 ** attempts, MAX_BACKOFF), row_id)
+                 for row_id, attempts, _fields in rows]
+            )
+
+    def pending(self):
+        return self._connection().execute('SELECT COUNT(*) FROM spool').fetchone()[0]
+
+    def flush(self, batch_size=500, now=None):
+        """Insert due messages into `messages`, a batch per transaction; returns how many."""
+        from .models import Message
+
+        total = 0
+        while True:
+            rows = self.take(batch_size, now)
+            if not rows:
+                return total
+            values = [dict(fields, created_at=datetime.fromisoformat(fields['created_at']))
+                      for _row_id, _attempts, fields in rows]
+            try:
+                db.session.execute(insert(Message), values)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                self.failures += 1
+                self.retry(rows, now)
+                current_app.logger.exception('Could not flush %d contact message(s); will retry', len(rows))
+                return total
+            self.ack([row_id for row_id, _attempts, _fields in rows])
+            self.flushed += len(rows)
+            total += len(rows)
+
+
+class Flusher:
+    """A daemon thread per process that flushes the spool every `interval` seconds."""
+
+    def __init__(self, app, spool, interval):
+        self.app = app
+        self.spool = spool
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        # Once per process: from Gunicorn's post_fork, or on first use under
+        # other servers. Never in the Gunicorn master
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopping = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='contact-spool', daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout=5.0):
+        """Stop this process's thread and flush what is due, e.g. as the worker exits."""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self._pid = None
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._flush()
+
+    def _flush(self):
+        with self.app.app_context():
+            try:
+                self.spool.flush(self.app.config.get('CONTACT_SPOOL_BATCH', 500))
+            except Exception:
+                self.app.logger.exception('Contact spool flush failed')
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            self._flush()
+
+
+def start_flusher(app):
+    """Start this process's flusher, if the app has one; for Gunicorn's post_fork."""
+    flusher = app.extensions.get('contact_spool_flusher')
+    if flusher is not None:
+        flusher.start()
+
+
+def stop_flusher(app):
+    """Stop this process's flusher after a last flush; for Gunicorn's worker_exit."""
+    flusher = app.extensions.get('contact_spool_flusher')
+    if flusher is not None:
+        flusher.stop()
+
+
+def submit_message(name, email, message):
+    """Store a contact-form message, through the spool when one is configured."""
+    from .models import Message
+
+    spool = current_app.extensions.get('contact_spool')
+    if spool is None:
+        db.session.add(Message(name=name, email=email, message=message))
+        db.session.commit()
+        return
+    spool.append(name, email, message)
+    flusher = current_app.extensions.get('contact_spool_flusher')
+    if flusher is not None:
+        flusher.start()
+
+
+def _spool():
+    spool = current_app.extensions.get('contact_spool')
+    if spool is None:
+        raise click.ClickException('CONTACT_SPOOL_PATH is not set.')
+    return spool
+
+
+@contact_cli.command('flush')
+def flush_command():
+    """Move every due spooled message into the database."""
+    count = _spool().flush(current_app.config.get('CONTACT_SPOOL_BATCH', 500))
+    click.echo(f'Flushed {count} message(s); {_spool().pending()} still spooled.')
+
+
+@contact_cli.command('status')
+def status_command():
+    """Show how many messages are waiting in the spool."""
+    click.echo(f'{_spool().pending()} message(s) spooled at {_spool().path}.')
+
+
+def _samples(app):
+    spool = app.extensions.get('contact_spool')
+    if spool is None:
+        return
+    yield 'contact_spool_pending', 'gauge', {}, spool.pending()
+    yield 'contact_spool_flushed_total', 'counter', {}, spool.flushed
+    yield 'contact_spool_failures_total', 'counter', {}, spool.failures
+
+
+def init_app(app):
+    """Open the app's contact spool, if configured; call after metrics.init_app."""
+    from .metrics import register_collector
+
+    path = app.config.get('CONTACT_SPOOL_PATH')
+    if not path:
+        return
+    if not os.path.isabs(path):
+        os.makedirs(app.instance_path, exist_ok=True)
+        path = os.path.join(app.instance_path, path)
+    spool = app.extensions['contact_spool'] = MessageSpool(path)
+    interval = app.config.get('CONTACT_SPOOL_INTERVAL', 1.0)
+    if interval:
+        app.extensions['contact_spool_flusher'] = Flusher(app, spool, interval)
+    register_collector(app, _samples)
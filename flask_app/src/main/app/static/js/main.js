@@ -250,6 +250,7 @@ document.addEventListener('DOMContentLoaded', function() {
             const thumb = document.querySelector(`.thumb-item[data-index="${index}"]`);
             if (!thumb) return;
             
+            galleryMainImg.srcset = thumb.dataset.srcset || '';
             galleryMainImg.src = thumb.dataset.src;
             
             galleryThumbItems.forEach(item => {
@@ -392,6 +393,135 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // ============================================
+    // Booking Availability
+    // Remaining tickets per day come from /api/availability, so sold-out
+    // days are refused before the form is sent
+    // ============================================
+    
+    function initializeAvailability() {
+        if (!visitDate?.dataset.availabilityUrl || !parkSelect) return;
+        
+        const hint = document.getElementById('visitDateHint');
+        const defaultHint = hint?.textContent || '';
+        let days = {};
+        
+        function checkDate() {
+            const left = days[visitDate.value];
+            const wanted = parseInt(numTickets?.value || '1', 10);
+            let message = '';
+            
+            if (left === 0) {
+                message = 'Sold out on this day. Please pick another date.';
+            } else if (left !== undefined && left < wanted) {
+                message = `Only ${left} ticket(s) left on this day.`;
+            }
+            visitDate.setCustomValidity(message);
+            visitDate.classList.toggle('sold-out', left === 0);
+            if (hint) {
+                hint.textContent = message || (left !== undefined ? `${left} ticket(s) left` : defaultHint);
+            }
+        }
+        
+        async function loadAvailability() {
+            days = {};
+            checkDate();
+            if (!parkSelect.value) return;
+            
+            // The next 92 days (the most one request may ask for) from the earliest bookable day
+            const params = new URLSearchParams({ park_id: parkSelect.value });
+            if (visitDate.min) {
+                const last = new Date(`${visitDate.min}T00:00:00Z`);
+                last.setUTCDate(last.getUTCDate() + 91);
+                params.set('from', visitDate.min);
+                params.set('to', last.toISOString().split('T')[0]);
+            }
+            
+            try {
+                const response = await fetch(`${visitDate.dataset.availabilityUrl}?${params}`, {
+                    headers: { 'Accept': 'application/json' }
+                });
+                if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                
+                const data = await response.json();
+                days = data.parks[0]?.days || {};
+            } catch (e) {
+                // The server still refuses sold-out days, so the form keeps working
+                console.error('Error loading availability:', e);
+            }
+            checkDate();
+        }
+        
+        parkSelect.addEventListener('change', loadAvailability);
+        visitDate.addEventListener('change', checkDate);
+        numTickets?.addEventListener('input', checkDate);
+        loadAvailability();
+    }
+
+    // ============================================
+    // Profile Bookings Pagination
+    // ============================================
+    
+    function escapeHtml(value) {
+        const div = document.createElement('div');
+        div.textContent = value;
+        return div.innerHTML;
+    }
+    
+    function renderBookingRow(booking) {
+        const healthTag = booking.health_safety
+            ? '<span class="tag success">Yes</span>'
+            : '<span class="tag">No</span>';
+        
+        return `
+            <tr>
+                <td>
+                    <strong>${escapeHtml(booking.park.name)}</strong>
+                    <div class="location">${escapeHtml(booking.park.location)}</div>
+                </td>
+                <td>${booking.date.split('T')[0]}</td>
+                <td>
+                    <span class="ticket-count">${booking.num_tickets}</span>
+                </td>
+                <td>${healthTag}</td>
+            </tr>
+        `;
+    }
+    
+    function initializeBookingsPagination() {
+        const loadMoreButtons = document.querySelectorAll('.load-more-bookings');
+        
+        loadMoreButtons.forEach(button => {
+            const component = button.closest('.bookings-table-component');
+            const rows = component?.querySelector('.bookings-rows');
+            if (!rows) return;
+            
+            button.addEventListener('click', async function() {
+                button.disabled = true;
+                
+                try {
+                    const response = await fetch(button.dataset.nextUrl, {
+                        headers: { 'Accept': 'application/json' }
+                    });
+                    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                    
+                    const page = await response.json();
+                    rows.insertAdjacentHTML('beforeend', page.bookings.map(renderBookingRow).join(''));
+                    
+                    if (page.next) {
+                        button.dataset.nextUrl = page.next;
+                        button.disabled = false;
+                    } else {
+                        button.remove();
+                    }
+                } catch (e) {
+                    console.error('Error loading bookings:', e);
+                    button.disabled = false;
+                }
+            });
+        });
+    }
+
     // ============================================
     // Page Navigation Utilities
     // ============================================
@@ -431,6 +561,12 @@ document.addEventListener('DOMContentLoaded', function() {
         // Initialize booking form
         initializeBookingForm();
         
+        // Initialize booking availability hints
+        initializeAvailability();
+        
+        // Initialize profile bookings pagination
+        initializeBookingsPagination();
+        
         // Initialize page navigation utilities
         initializePageNavigation();
     }
@@ -5,9 +5,134 @@ from dotenv import load_dotenv
 env_path = Path(__file__).parent.parent / '.env'
 load_dotenv(env_path)
 
+
+def _env_flag(name, default):
+    return os.getenv(name, default).lower() in ("1", "true", "yes", "on")
+
+
+def cpu_count():
+    try:
+        # Respects CPU affinity / container cpusets, unlike os.cpu_count()
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def worker_count():
+    return int(os.getenv("GUNICORN_WORKERS", cpu_count() * 2 + 1))
+
+
+def thread_count():
+    return int(os.getenv("GUNICORN_THREADS", 4))
+
+
+def engine_options(uri):
+    """
+    SQLAlchemy engine options for a server database, from the environment.
+
+    Each Gunicorn worker has its own pool, sized by default to one
+    connection per request thread plus a little overflow. DB_MAX_CONNECTIONS,
+    if set, is the connection budget for the whole host and caps each
+    worker's pool at its share. Connections are pinged before use and
+    recycled before MySQL's wait_timeout can drop them. SQLite keeps
+    SQLAlchemy's defaults.
+    """
+    if not uri or uri.startswith("sqlite"):
+        return {}
+    pool_size = int(os.getenv("DB_POOL_SIZE", thread_count()))
+    max_overflow = int(os.getenv("DB_MAX_OVERFLOW", max(pool_size // 2, 1)))
+    if os.getenv("DB_MAX_CONNECTIONS"):
+        share = max(int(os.getenv("DB_MAX_CONNECTIONS")) // worker_count(), 1)
+        pool_size = min(pool_size, share)
+        max_overflow = min(max_overflow, share - pool_size)
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 10)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": _env_flag("DB_POOL_PRE_PING", "true"),
+    }
+
+
+# PRAGMAs applied to every new SQLite connection, selected with SQLITE_PROFILE.
+# "performance" uses WAL so readers never wait for a writer, and a busy
+# timeout so concurrent writers queue instead of failing with
+# "database is locked".
+SQLITE_PROFILES = {
+    "default": {},
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "mmap_size": 268435456,
+        "cache_size": -16000,
+        "temp_store": "MEMORY",
+    },
+}
+
+
 class Config:
     SQLALCHEMY_DATABASE_URI = "sqlite:///flask_app.db"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    BOOKINGS_PAGE_SIZE = 50
+    CACHE_STORE_URL = os.getenv("CACHE_STORE_URL", "memory://")
+    PAGE_CACHE_ENABLED = True
+    PAGE_CACHE_MAX_ENTRIES = 256
+    LANGUAGES = ['en']
+    # Bump on deploy so browsers revalidate pages rendered by older templates
+    RELEASE = os.getenv("RELEASE", "")
+    SQLITE_PRAGMAS = SQLITE_PROFILES[os.getenv("SQLITE_PROFILE", "performance")]
+    # Read replicas, as extra binds; see app/routing.py
+    REPLICA_DATABASE_URLS = [url for url in os.getenv("REPLICA_DATABASE_URLS", "").split(",") if url]
+    SQLALCHEMY_BINDS = {f"replica{n}": url for n, url in enumerate(REPLICA_DATABASE_URLS, 1)}
+    REPLICA_BINDS = list(SQLALCHEMY_BINDS)
+    # How long a visitor reads from the primary after writing
+    REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", 10))
+    # Bearer token required by /metrics; unset closes the endpoint
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+    # Where workers share their samples, so any of them can answer a scrape
+    # for the whole host; see app/metrics.py
+    METRICS_DIR = os.getenv("METRICS_DIR", "")
+    METRICS_PUBLISH_INTERVAL = float(os.getenv("METRICS_PUBLISH_INTERVAL", 5))
+    # Per-worker password hashing pool; see app/hashing.py
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 1))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 4))
+    PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", 5))
+    PASSWORD_HASH_NICE = int(os.getenv("PASSWORD_HASH_NICE", 5))
+    # Sign-in throttling, kept in the cache store; see app/ratelimit.py
+    RATELIMIT_ENABLED = _env_flag("RATELIMIT_ENABLED", "true")
+    RATELIMIT_IP_BURST = int(os.getenv("RATELIMIT_IP_BURST", 20))
+    RATELIMIT_IP_PER_MINUTE = float(os.getenv("RATELIMIT_IP_PER_MINUTE", 10))
+    RATELIMIT_EMAIL_ATTEMPTS = int(os.getenv("RATELIMIT_EMAIL_ATTEMPTS", 10))
+    RATELIMIT_EMAIL_WINDOW = int(os.getenv("RATELIMIT_EMAIL_WINDOW", 900))
+    # Reverse proxies in front of the app whose X-Forwarded-For is trusted;
+    # the client IP behind them keys the per-IP limit
+    TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", 0))
+    # Cached Flask-Login principals; see app/identity.py
+    IDENTITY_CACHE_TTL = int(os.getenv("IDENTITY_CACHE_TTL", 60))
+    IDENTITY_CACHE_MAX_ENTRIES = int(os.getenv("IDENTITY_CACHE_MAX_ENTRIES", 1024))
+    # Carry the principal in the signed session cookie
+    SESSION_PRINCIPAL = _env_flag("SESSION_PRINCIPAL", "false")
+    # KDF for new hashes; older ones are upgraded on login. See app/passwords.py
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    # Write-behind spool for contact messages; see app/spool.py
+    CONTACT_SPOOL_PATH = os.getenv("CONTACT_SPOOL_PATH", "contact_spool.db")
+    CONTACT_SPOOL_INTERVAL = float(os.getenv("CONTACT_SPOOL_INTERVAL", 1))
+    CONTACT_SPOOL_BATCH = int(os.getenv("CONTACT_SPOOL_BATCH", 500))
+    # Booking side effects, delivered by `flask outbox work`; see app/outbox.py
+    OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 100))
+    OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 1))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+    OUTBOX_WEBHOOK_URL = os.getenv("OUTBOX_WEBHOOK_URL")
+    MAIL_SERVER = os.getenv("MAIL_SERVER")
+    MAIL_PORT = int(os.getenv("MAIL_PORT", 25))
+    MAIL_SENDER = os.getenv("MAIL_SENDER", "bookings@localhost")
+    # How long a booking form's idempotency key is remembered; see app/idempotency.py
+    BOOKING_KEY_TTL = int(os.getenv("BOOKING_KEY_TTL", 86400))
+    # /api/availability, read from the ticket counters; see app/availability.py
+    AVAILABILITY_CACHE_TTL = int(os.getenv("AVAILABILITY_CACHE_TTL", 5))
+    AVAILABILITY_CACHE_MAX_ENTRIES = 256
+    AVAILABILITY_MAX_DAYS = 92
 
     @staticmethod
     def init_app(app):
@@ -16,6 +141,7 @@ class Config:
 class DevelopmentConfig(Config):
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = os.getenv("DEV_DATABASE_URL", "sqlite:///flask_app.db")
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
     WTF_CSRF_ENABLED = True
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-fallback-key'
 
@@ -34,10 +160,19 @@ class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.getenv("TEST_DATABASE_URL", "sqlite:///:memory:")
     WTF_CSRF_ENABLED = False
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'test-fallback-key'
+    # Hash inline; tests that need the pool start their own
+    PASSWORD_HASH_WORKERS = 0
+    # Matches the fixtures, so logins in tests don't trigger rehashes
+    PASSWORD_HASH_METHOD = "pbkdf2:sha256"
+    # Store contact messages directly; spool tests open their own
+    CONTACT_SPOOL_PATH = ""
+    METRICS_TOKEN = "test-metrics-token"
+    METRICS_DIR = ""
 
 class ProductionConfig(Config):
     DEBUG = False
     SQLALCHEMY_DATABASE_URI = os.getenv("PROD_DATABASE_URL")
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
     WTF_CSRF_ENABLED = True
     SECRET_KEY = os.environ.get('SECRET_KEY') or None
 
@@ -0,0 +1,73 @@
+"""
+Gunicorn settings for the production container.
+
+Every value can be overridden from the environment (GUNICORN_WORKERS,
+GUNICORN_THREADS, ...). Worker and thread counts default to values derived
+from the CPUs this process may run on: the usual 2 x CPUs + 1 processes,
+each with a few threads so a worker waiting on the database or a slow
+client does not stall the others.
+
+The app is preloaded in the master so workers share its memory
+copy-on-write; database connections are never shared across the fork (see
+post_fork). Reload gracefully with `kill -HUP <master pid>` for config
+changes, or `kill -USR2` then `kill -QUIT <old master pid>` to pick up new
+code, since preloaded code is only re-imported by a new master.
+"""
+import os
+from config import Config, thread_count, worker_count
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+# Also used by config.engine_options to size each worker's database pool
+workers = worker_count()
+threads = thread_count()
+worker_class = "gthread"
+preload_app = True
+
+# Park edits, role changes and sign-out-everywhere bump versions in the cache
+# store; a per-process store would only tell the worker that made the change.
+# Unless CACHE_STORE_URL names one, share a SQLite store in the instance folder
+_instance = os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance")
+if workers > 1 and Config.CACHE_STORE_URL in ("", "memory://"):
+    os.makedirs(_instance, exist_ok=True)
+    Config.CACHE_STORE_URL = f"sqlite:///{os.path.join(_instance, 'cache.db')}"
+# Likewise a scrape of /metrics should cover every worker, not just the one
+# that answered it
+if workers > 1 and not Config.METRICS_DIR:
+    Config.METRICS_DIR = os.path.join(_instance, "metrics")
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+# Recycle workers now and then so slow leaks can't accumulate
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    # Connections opened by the master while preloading must not be shared
+    # with the children; drop them from each worker's pool without closing
+    # the master's sockets
+    from app import db
+    from app.metrics import start_publisher
+    from app.spool import start_flusher
+    from wsgi import app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    # Spooled contact messages are flushed from every worker as soon as it is
+    # up, not only after its first contact-form post
+    start_flusher(app)
+    start_publisher(app)
+
+
+def worker_exit(server, worker):
+    # Recycled (max_requests) or stopped: move what is spooled into the
+    # database before going
+    from app.metrics import stop_publisher
+    from app.spool import stop_flusher
+    from wsgi import app
+    stop_flusher(app)
+    stop_publisher(app)
@@ -0,0 +1,15 @@
+"""
+WSGI entry point for production servers.
+
+Builds the app once, with the configuration named by FLASK_CONFIG
+(production by default), for Gunicorn to serve:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+`flask --app wsgi ...` runs CLI commands (e.g. `schema upgrade`) against the
+same configuration, without the development config's drop-and-reseed.
+"""
+import os
+from app import create_app
+
+app = create_app(os.getenv("FLASK_CONFIG", "production"))
@@ -5,7 +5,7 @@ setup(
     version='1.0.dev0',
     packages=find_packages(where='main'),
     package_dir={'': 'main'},
-    py_modules=['config'],
+    py_modules=['config', 'wsgi'],
     include_package_data=True,
     install_requires=[
         'Flask==3.1.2',
@@ -16,7 +16,8 @@ setup(
         'Flask-Admin==1.6.1',
         'WTForms==3.1.2',
         'Flask-WTF==1.2.2',
-        'python-dotenv==1.2.1'
+        'python-dotenv==1.2.1',
+        'gunicorn==23.0.0'
         
     ],
     python_requires='>=3.9',
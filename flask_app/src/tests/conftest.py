@@ -7,6 +7,7 @@ import os
 import sys
 import tempfile
 import warnings
+from contextlib import contextmanager
 
 # Suppress SQLAlchemy deprecation warnings
 from sqlalchemy.exc import SADeprecationWarning
@@ -16,6 +17,7 @@ warnings.filterwarnings("ignore", category=DeprecationWarning)
 # Add the main directory to Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'main'))
 
+from sqlalchemy import event
 from app import create_app, db
 from app.models import User, Role, Park, Booking
 from werkzeug.security import generate_password_hash
@@ -97,6 +99,38 @@ def authenticated_client(client, app):
                 sess['_user_id'] = str(user.user_id)
     return client
 
+@pytest.fixture
+def assert_max_queries(app):
+    """
+    Context manager asserting that the wrapped block issues at most
+    `limit` SQL statements, e.g.::
+
+        with assert_max_queries(4) as queries:
+            client.get('/profile')
+
+    `queries` holds the executed statements for inspection.
+    """
+    with app.app_context():
+        engine = db.engine
+
+    @contextmanager
+    def _assert_max_queries(limit):
+        statements = []
+
+        def _record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, 'before_cursor_execute', _record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', _record)
+        assert len(statements) <= limit, (
+            f'Expected at most {limit} queries, got {len(statements)}:\n' + '\n'.join(statements)
+        )
+
+    return _assert_max_queries
+
 def _create_test_data():
     """
     Create initial test data: roles, users, and parks
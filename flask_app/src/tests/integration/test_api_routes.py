@@ -0,0 +1,103 @@
+"""
+Integration tests for the JSON API routes
+"""
+import sys
+import os
+from datetime import datetime
+
+# Add the main directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'main'))
+
+
+def _add_bookings(app, dates):
+    with app.app_context():
+        from app import db
+        from app.models import Park, User, Booking
+        user = User.query.filter_by(email='test@example.com').first()
+        park = Park.query.first()
+        db.session.add_all([
+            Booking(user_id=user.user_id, park_id=park.park_id, date=date, num_tickets=1)
+            for date in dates
+        ])
+        db.session.commit()
+
+
+def _walk(client, url):
+    """Follow `next` links from url and return every booking date seen"""
+    dates = []
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        page = response.get_json()
+        dates += [booking['date'] for booking in page['bookings']]
+        url = page['next']
+    return dates
+
+
+class TestBookingsApi:
+    """Test GET /api/bookings"""
+
+    def test_requires_login(self, client):
+        """Test that the bookings API requires authentication"""
+        response = client.get('/api/bookings')
+        assert response.status_code == 302
+        assert '/login' in response.location
+
+    def test_upcoming_pages_in_date_order(self, authenticated_client, app):
+        """Test that upcoming bookings are paged soonest first without gaps"""
+        # Two bookings share a timestamp to exercise the id tie-breaker
+        dates = [datetime(2030, 1, d) for d in (5, 1, 3, 3, 2)]
+        _add_bookings(app, dates + [datetime(2020, 1, 1)])
+
+        seen = _walk(authenticated_client, '/api/bookings?window=upcoming&limit=2')
+
+        assert seen == [d.isoformat() for d in sorted(dates)]
+
+    def test_past_pages_most_recent_first(self, authenticated_client, app):
+        """Test that past bookings are paged most recent first"""
+        dates = [datetime(2020, 3, d) for d in (1, 7, 4)]
+        _add_bookings(app, dates + [datetime(2030, 1, 1)])
+
+        seen = _walk(authenticated_client, '/api/bookings?window=past&limit=1')
+
+        assert seen == [d.isoformat() for d in sorted(dates, reverse=True)]
+
+    def test_page_includes_park(self, authenticated_client, app):
+        """Test that each booking carries its park name and location"""
+        _add_bookings(app, [datetime(2030, 6, 1)])
+        page = authenticated_client.get('/api/bookings').get_json()
+        assert page['bookings'][0]['park'] == {'name': 'Leprechaun Park', 'location': 'Dublin'}
+        assert page['next'] is None
+
+    def test_only_own_bookings(self, app):
+        """Test that a user never sees another user's bookings"""
+        _add_bookings(app, [datetime(2030, 6, 1)])
+        with app.app_context():
+            from app.models import User
+            admin = User.query.filter_by(email='admin@example.com').first()
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(admin.user_id)
+        assert client.get('/api/bookings').get_json()['bookings'] == []
+
+    def test_invalid_window(self, authenticated_client):
+        """Test that an unknown window is rejected"""
+        response = authenticated_client.get('/api/bookings?window=someday')
+        assert response.status_code == 400
+
+    def test_invalid_cursor(self, authenticated_client):
+        """Test that a malformed cursor is rejected"""
+        response = authenticated_client.get('/api/bookings?window=past&before=yesterday')
+        assert response.status_code == 400
+
+    def test_profile_renders_first_page_only(self, authenticated_client, app):
+        """Test that the profile renders one page per window and links the rest"""
+        app.config['BOOKINGS_PAGE_SIZE'] = 2
+        _add_bookings(app, [datetime(2030, 1, d) for d in range(1, 6)])
+
+        response = authenticated_client.get('/profile')
+
+        assert response.status_code == 200
+        assert b'<strong>5</strong> total bookings' in response.data
+        assert response.data.count(b'class="ticket-count"') == 2
+        assert b'data-next-url="/api/bookings?window=upcoming' in response.data
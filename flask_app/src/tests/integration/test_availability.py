@@ -0,0 +1,87 @@
+"""
+Integration tests for the availability API
+"""
+import pytest
+import sys
+import os
+from datetime import date
+from unittest.mock import patch
+
+# Add the main directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'main'))
+
+from app import db
+from app.inventory import release, reserve
+
+
+def _get(client, **args):
+    return client.get('/api/availability', query_string=args)
+
+
+class TestAvailability:
+    """Test /api/availability"""
+
+    def test_remaining_per_day(self, app, client):
+        """Booked days show what is left; other days the park's full capacity"""
+        reserve(1, date(2030, 5, 2), 120)
+        reserve(1, date(2030, 5, 3), 500)
+        db.session.commit()
+
+        response = _get(client, park_id=1, **{'from': '2030-05-01', 'to': '2030-05-03'})
+        assert response.status_code == 200
+        assert response.get_json() == {
+            'from': '2030-05-01', 'to': '2030-05-03',
+            'parks': [{'park_id': 1, 'capacity': 500,
+                       'days': {'2030-05-01': 500, '2030-05-02': 380, '2030-05-03': 0}}],
+        }
+        assert response.headers['Cache-Control'] in ('public, max-age=5', 'max-age=5, public')
+
+    def test_all_parks_one_query(self, app, client, assert_max_queries):
+        """Without park_id every park is listed, read from the counters alone"""
+        reserve(2, date(2030, 5, 1), 10)
+        db.session.commit()
+        client.get('/')  # load the catalogue
+        with assert_max_queries(1) as queries:
+            parks = _get(client, **{'from': '2030-05-01', 'to': '2030-05-01'}).get_json()['parks']
+        assert [park['days']['2030-05-01'] for park in parks] == [500, 490, 500]
+        assert 'FROM park_day_capacity' in queries[0] and 'bookings' not in queries[0]
+
+    def test_cached_briefly(self, app, client):
+        """Answers are reused within the TTL and refreshed after it"""
+        args = {'park_id': 1, 'from': '2030-05-01', 'to': '2030-05-01'}
+        assert _get(client, **args).get_json()['parks'][0]['days']['2030-05-01'] == 500
+        reserve(1, date(2030, 5, 1), 5)
+        db.session.commit()
+        assert _get(client, **args).get_json()['parks'][0]['days']['2030-05-01'] == 500
+        with patch('app.availability.time.monotonic', return_value=10**9):
+            assert _get(client, **args).get_json()['parks'][0]['days']['2030-05-01'] == 495
+
+    def test_release_frees_tickets(self, app, client):
+        """Cancelled tickets show up again"""
+        reserve(1, date(2030, 5, 1), 500)
+        release(1, date(2030, 5, 1), 20)
+        db.session.commit()
+        days = _get(client, park_id=1, **{'from': '2030-05-01', 'to': '2030-05-01'}).get_json()['parks'][0]['days']
+        assert days == {'2030-05-01': 20}
+
+    def test_default_range(self, app, client):
+        """Without dates, the next 31 days from today are returned"""
+        data = _get(client, park_id=3).get_json()
+        assert data['from'] == date.today().isoformat()
+        assert len(data['parks'][0]['days']) == 31
+
+    @pytest.mark.parametrize('args', [
+        {'from': 'tomorrow'},
+        {'from': '2030-05-02', 'to': '2030-05-01'},
+        {'from': '2030-01-01', 'to': '2030-12-31'},
+    ])
+    def test_bad_ranges(self, client, args):
+        """Malformed, reversed and overlong ranges are refused"""
+        response = _get(client, **args)
+        assert response.status_code == 400
+        assert 'error' in response.get_json()
+
+    def test_booking_form_links_endpoint(self, authenticated_client):
+        """The booking form tells its script where to fetch availability"""
+        html = authenticated_client.get('/booking/new').get_data(as_text=True)
+        assert 'data-availability-url="/api/availability"' in html
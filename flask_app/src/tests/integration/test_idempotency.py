@@ -0,0 +1,99 @@
+"""
+Integration tests for idempotent booking submissions
+"""
+import sys
+import os
+import re
+from datetime import date, timedelta
+from unittest.mock import patch
+
+# Add the main directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'main'))
+
+from app import db
+from app.idempotency import purge_expired
+from app.inventory import remaining
+from app.models import Booking, IdempotencyKey, utcnow
+
+
+def _form_key(client):
+    html = client.get('/booking/new').get_data(as_text=True)
+    return re.search(r'name="idempotency_key" value="([0-9a-f]+)"', html).group(1)
+
+
+def _book(client, key, num_tickets=2):
+    return client.post('/booking', data={'park_id': '1', 'date': '2030-05-01', 'num_tickets': str(num_tickets),
+                                         'health_safety': 'on', 'idempotency_key': key})
+
+
+class TestIdempotentBooking:
+    """Test /booking with an idempotency key"""
+
+    def test_form_carries_a_fresh_key(self, authenticated_client):
+        """Each booking form gets its own key"""
+        assert _form_key(authenticated_client) != _form_key(authenticated_client)
+
+    def test_replay_books_once(self, app, authenticated_client, assert_max_queries):
+        """Resubmitting the same form redirects like the original without booking again"""
+        key = _form_key(authenticated_client)
+        first = _book(authenticated_client, key)
+        with assert_max_queries(1) as queries:
+            replay = _book(authenticated_client, key)
+        assert replay.status_code == first.status_code == 302
+        assert replay.location == first.location
+        assert not [sql for sql in queries if not sql.startswith('SELECT')]
+        assert Booking.query.count() == 1
+        assert remaining(1, date(2030, 5, 1)) == 498
+
+    def test_new_form_books_again(self, app, authenticated_client):
+        """A second form is a second booking"""
+        _book(authenticated_client, _form_key(authenticated_client))
+        _book(authenticated_client, _form_key(authenticated_client))
+        assert Booking.query.count() == 2
+
+    def test_keys_are_per_user(self, app, authenticated_client):
+        """Another user's key doesn't match"""
+        key = _form_key(authenticated_client)
+        _book(authenticated_client, key)
+        db.session.add(IdempotencyKey(user_id=2, key='other', booking_id=1,
+                                      expires_at=utcnow() + timedelta(days=1)))
+        db.session.commit()
+        _book(authenticated_client, 'other')
+        assert Booking.query.count() == 2
+
+    def test_concurrent_copy_rolled_back(self, app, authenticated_client):
+        """A copy that raced past the check loses on the key and releases its tickets"""
+        key = _form_key(authenticated_client)
+        _book(authenticated_client, key)
+        booking_id = Booking.query.one().booking_id
+        with patch('app.main.replayed_booking', side_effect=[None, booking_id]):
+            response = _book(authenticated_client, key)
+        assert response.status_code == 302
+        assert Booking.query.count() == 1
+        assert remaining(1, date(2030, 5, 1)) == 498
+
+    def test_without_key(self, app, authenticated_client):
+        """Old forms without a key still book"""
+        authenticated_client.post('/booking', data={'park_id': '1', 'date': '2030-05-01', 'num_tickets': '1'})
+        assert Booking.query.count() == 1
+        assert IdempotencyKey.query.count() == 0
+
+
+class TestExpiry:
+    """Test key expiry"""
+
+    def test_expired_key_books_again(self, app, authenticated_client):
+        """Once a key has expired it no longer blocks a booking"""
+        app.config['BOOKING_KEY_TTL'] = -1
+        key = _form_key(authenticated_client)
+        _book(authenticated_client, key)
+        _book(authenticated_client, key)
+        assert Booking.query.count() == 2
+        assert IdempotencyKey.query.count() == 1
+
+    def test_purge(self, app, authenticated_client, runner):
+        """`flask idempotency purge` deletes only expired keys"""
+        _book(authenticated_client, _form_key(authenticated_client))
+        assert purge_expired() == 0
+        assert purge_expired(now=utcnow() + timedelta(days=2)) == 1
+        assert 'Deleted 0 expired key(s).' in runner.invoke(args=['idempotency', 'purge']).output
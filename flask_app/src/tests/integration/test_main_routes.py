@@ -42,6 +42,13 @@ class TestMainRoutes:
             assert park.name.encode() in response.data
             assert park.location.encode() in response.data
     
+    def test_index_steady_state_skips_database(self, client, assert_max_queries):
+        """Test that anonymous park pages are served from the catalogue cache"""
+        client.get('/')
+        with assert_max_queries(0):
+            assert client.get('/').status_code == 200
+            assert client.get('/parks/1').status_code == 200
+
     def test_park_detail_not_found(self, client):
         """Test park detail with invalid ID"""
         response = client.get('/parks/99999')
@@ -164,6 +171,54 @@ class TestMainRoutes:
             booking = Booking.query.filter_by(user_id=user.user_id).order_by(Booking.booking_id.desc()).first()
             assert booking.health_safety == False
     
+    def test_create_booking_over_capacity_rejected(self, authenticated_client, app):
+        """Test POST /booking is rejected once the day is sold out"""
+        with app.app_context():
+            from app import db
+            from app.models import Park, Booking
+            park = Park.query.first()
+            park.daily_capacity = 4
+            db.session.commit()
+            park_id = park.park_id
+
+        data = {'park_id': park_id, 'date': '2026-09-20T10:00', 'num_tickets': '3', 'health_safety': 'on'}
+        response = authenticated_client.post('/booking', data=data)
+        assert '/profile' in response.location
+
+        response = authenticated_client.post('/booking', data=data)
+        assert response.status_code == 302
+        assert '/booking/new' in response.location
+
+        with app.app_context():
+            assert Booking.query.filter_by(park_id=park_id).count() == 1
+
+    def test_create_booking_unknown_park_rejected(self, authenticated_client, app):
+        """Test POST /booking with a park that doesn't exist goes back to the form"""
+        data = {'park_id': '9999', 'date': '2026-09-20T10:00', 'num_tickets': '1'}
+        response = authenticated_client.post('/booking', data=data)
+        assert response.status_code == 302
+        assert '/booking/new' in response.location
+
+        with app.app_context():
+            from app.models import Booking
+            assert Booking.query.filter_by(park_id=9999).count() == 0
+
+    @pytest.mark.parametrize('field, value', [
+        ('num_tickets', '0'), ('num_tickets', '-2'), ('num_tickets', 'two'),
+        ('park_id', 'first'), ('date', 'tomorrow'),
+    ])
+    def test_create_booking_invalid_form_rejected(self, authenticated_client, app, field, value):
+        """Test POST /booking with a malformed field goes back to the form without booking"""
+        data = {'park_id': '1', 'date': '2026-09-20T10:00', 'num_tickets': '1'}
+        data[field] = value
+        response = authenticated_client.post('/booking', data=data)
+        assert response.status_code == 302
+        assert '/booking/new' in response.location
+
+        with app.app_context():
+            from app.models import Booking
+            assert Booking.query.count() == 0
+
     def test_404_error_handler(self, client):
         """Test 404 error handler"""
         response = client.get('/nonexistent-page-12345')
@@ -198,7 +253,43 @@ class TestMainRoutesExpanded:
         response = authenticated_client.get('/profile')
         assert response.status_code == 200
         assert b'Test' in response.data
-    
+
+    def _add_bookings(self, app, count, extra_parks=0):
+        with app.app_context():
+            from app import db
+            from app.models import Park, User, Booking
+            db.session.add_all([
+                Park(name=f'Extra Park {i}', location='Sligo', description='Extra',
+                     short_description='Extra', slug=f'extra-park-{i}')
+                for i in range(extra_parks)
+            ])
+            user = User.query.filter_by(email='test@example.com').first()
+            parks = Park.query.all()
+            db.session.add_all([
+                Booking(user_id=user.user_id, park_id=parks[i % len(parks)].park_id,
+                        date=datetime(2026, 11, 1 + i % 28), num_tickets=1)
+                for i in range(count)
+            ])
+            db.session.commit()
+
+    def test_profile_lists_bookings_with_parks(self, authenticated_client, app):
+        """Test that the profile shows each booking's park and the total"""
+        self._add_bookings(app, 3)
+        response = authenticated_client.get('/profile')
+        assert response.status_code == 200
+        assert b'<strong>3</strong> total bookings' in response.data
+        assert b'Leprechaun Park' in response.data
+        assert b'Cork' in response.data
+
+    def test_profile_bookings_avoid_n_plus_one(self, authenticated_client, app, assert_max_queries):
+        """Test that the profile page does not issue one query per booking"""
+        self._add_bookings(app, 40, extra_parks=10)
+        # user, role, upcoming and past pages with parks, bookings count
+        with assert_max_queries(5):
+            response = authenticated_client.get('/profile')
+        assert b'<strong>40</strong> total bookings' in response.data
+        assert b'Extra Park 9' in response.data
+
     # ==========================================
     # Booking Route Tests (POST edge cases)
     # ==========================================
@@ -0,0 +1,215 @@
+"""
+Integration tests for the booking outbox and its worker, against local
+SMTP and HTTP stand-ins
+"""
+import pytest
+import sys
+import os
+import json
+import socketserver
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the main directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'main'))
+
+from app import db
+from app.models import Booking, OutboxEvent, utcnow
+from app.outbox import _due, _lease, claim, deliver, emit, init_app, register_handler
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib.send_message."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.reply('220 localhost')
+        while True:
+            line = self.rfile.readline().decode().strip()
+            command = line[:4].upper()
+            if not line or command == 'QUIT':
+                self.reply('221 bye')
+                return
+            if command == 'DATA':
+                self.reply('354 go ahead')
+                data = b''
+                while not data.endswith(b'\r\n.\r\n'):
+                    data += self.rfile.readline()
+                self.server.messages.append(data.decode())
+            self.reply('250 ok')
+
+
+@pytest.fixture
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _SMTPHandler)
+    server.daemon_threads = True
+    server.messages = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def webhook_server():
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            server.posts.append(json.loads(body))
+            self.send_response(server.status)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.posts = []
+    server.status = 204
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def outbox_app(app, smtp_server, webhook_server):
+    app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=smtp_server.server_address[1],
+                      OUTBOX_WEBHOOK_URL=f'http://127.0.0.1:{webhook_server.server_address[1]}/events')
+    init_app(app)
+    return app
+
+
+def _book(client, num_tickets=2):
+    return client.post('/booking', data={'park_id': '1', 'date': '2030-05-01',
+                                         'num_tickets': str(num_tickets), 'health_safety': 'on'})
+
+
+class TestEmit:
+    """Test writing events with the booking"""
+
+    def test_event_in_booking_transaction(self, outbox_app, authenticated_client):
+        """A booking writes its event in the same transaction, and runs no handlers"""
+        assert _book(authenticated_client).status_code == 302
+        event = OutboxEvent.query.one()
+        booking = Booking.query.one()
+        assert event.topic == 'booking.created'
+        assert event.payload['booking_id'] == booking.booking_id
+        assert event.payload['email'] == 'test@example.com'
+
+    def test_rolled_back_with_booking(self, outbox_app):
+        """An event never outlives a booking that wasn't committed"""
+        emit('booking.created', {'booking_id': 1})
+        db.session.rollback()
+        assert OutboxEvent.query.count() == 0
+
+    def test_nothing_written_without_handlers(self, app, authenticated_client):
+        """With no handlers configured, bookings write no events"""
+        _book(authenticated_client)
+        assert OutboxEvent.query.count() == 0
+
+
+class TestWorker:
+    """Test delivery by the worker"""
+
+    def test_email_and_webhook_delivered(self, outbox_app, authenticated_client, smtp_server, webhook_server):
+        """The worker sends the confirmation email and posts the event, then deletes it"""
+        _book(authenticated_client)
+        assert deliver() == (1, 0)
+        assert len(smtp_server.messages) == 1
+        assert 'To: test@example.com' in smtp_server.messages[0]
+        assert 'at Leprechaun Park on 2030-05-01 is confirmed' in smtp_server.messages[0]
+        assert webhook_server.posts[0]['topic'] == 'booking.created'
+        assert webhook_server.posts[0]['payload']['num_tickets'] == 2
+        assert OutboxEvent.query.count() == 0
+
+    def test_failure_backs_off_then_parks(self, outbox_app, authenticated_client, webhook_server):
+        """A failing handler retries the event later, and gives up after OUTBOX_MAX_ATTEMPTS"""
+        outbox_app.config['OUTBOX_MAX_ATTEMPTS'] = 2
+        webhook_server.status = 500
+        _book(authenticated_client)
+        now = utcnow()
+
+        assert deliver(now=now) == (0, 1)
+        event = OutboxEvent.query.one()
+        assert event.attempts == 1 and 'HTTP Error 500' in event.last_error
+        assert deliver(now=now) == (0, 0)
+
+        db.session.expire_all()
+        assert deliver(now=now + timedelta(seconds=3)) == (0, 1)
+        db.session.expire_all()
+        assert OutboxEvent.query.one().available_at is None
+        assert deliver(now=now + timedelta(days=1)) == (0, 0)
+
+    def test_retry_skips_handlers_that_succeeded(self, outbox_app, authenticated_client, smtp_server,
+                                                 webhook_server):
+        """A webhook failure retries the webhook only; the email is not sent again"""
+        webhook_server.status = 500
+        _book(authenticated_client)
+        now = utcnow()
+        assert deliver(now=now) == (0, 1)
+        assert OutboxEvent.query.one().delivered_to == ['app.outbox.send_booking_confirmation']
+
+        webhook_server.status = 204
+        db.session.expire_all()
+        assert deliver(now=now + timedelta(seconds=3)) == (1, 0)
+        assert len(smtp_server.messages) == 1
+        assert len(webhook_server.posts) == 2
+
+    def test_at_least_once_after_crash(self, outbox_app, authenticated_client):
+        """Events claimed by a worker that died are delivered once the lease runs out"""
+        _book(authenticated_client)
+        seen = []
+        register_handler(outbox_app, 'booking.created', lambda event: seen.append(event.event_id))
+        claim(10)
+        assert deliver() == (0, 0)
+        assert deliver(now=utcnow() + timedelta(hours=1)) == (1, 0)
+        assert len(seen) == 1
+
+    def test_interleaved_claims_take_each_event_once(self, outbox_app):
+        """Two workers that read the same due events can't both lease them"""
+        outbox_app.extensions['outbox_handlers'] = {'audit': [lambda event: None]}
+        for n in range(3):
+            emit('audit', {'n': n})
+        db.session.commit()
+        now = utcnow()
+
+        # Both workers read the due events before either leases them
+        first, second = _due(10, now), _due(10, now)
+        assert first == second and len(first) == 3
+        taken = _lease(first, now)
+        db.session.commit()
+        assert [event.event_id for event in taken] == first
+        assert _lease(second, now) == []
+        db.session.commit()
+
+    def test_lease_takes_only_due_events(self, outbox_app):
+        """Events leased or parked since they were read are left out"""
+        outbox_app.extensions['outbox_handlers'] = {'audit': [lambda event: None]}
+        for n in range(3):
+            emit('audit', {'n': n})
+        db.session.commit()
+        now = utcnow()
+        ids = _due(10, now)
+        OutboxEvent.query.filter_by(event_id=ids[0]).update({'available_at': None})
+        db.session.commit()
+        assert [event.event_id for event in _lease(ids, now)] == ids[1:]
+
+    def test_batches(self, outbox_app, assert_max_queries):
+        """Events are claimed and cleared a batch at a time"""
+        outbox_app.extensions['outbox_handlers'] = {'audit': [lambda event: None]}
+        for n in range(5):
+            emit('audit', {'n': n})
+        db.session.commit()
+        with assert_max_queries(6):
+            assert deliver(batch_size=3) == (3, 0)
+        assert deliver(batch_size=3) == (2, 0)
+
+    def test_cli(self, outbox_app, runner, authenticated_client):
+        """`flask outbox status` lists waiting events; `work --once` drains them"""
+        _book(authenticated_client)
+        assert 'booking.created: 1 waiting' in runner.invoke(args=['outbox', 'status']).output
+        assert 'Delivered 1 event(s).' in runner.invoke(args=['outbox', 'work', '--once']).output
+        assert 'The outbox is empty.' in runner.invoke(args=['outbox', 'status']).output
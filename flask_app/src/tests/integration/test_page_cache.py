@@ -0,0 +1,216 @@
+"""
+Integration tests for the anonymous full-page cache
+"""
+import pytest
+import sys
+import os
+from unittest.mock import MagicMock
+from datetime import datetime
+from flask import template_rendered
+
+# Add the main directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'main'))
+
+
+@pytest.fixture
+def rendered(app):
+    """Names of the templates rendered while the test runs"""
+    names = []
+
+    def record(sender, template, context, **extra):
+        names.append(template.name)
+
+    template_rendered.connect(record, app)
+    yield names
+    template_rendered.disconnect(record, app)
+
+
+class TestPageCache:
+    """Test @cached_page on index and park_detail"""
+
+    def test_second_anonymous_hit_skips_rendering(self, client, rendered):
+        """Test that a cached page is served without rendering index.html"""
+        first = client.get('/')
+        rendered.clear()
+        second = client.get('/')
+        assert second.status_code == 200
+        assert 'index.html' not in rendered
+        assert second.data == first.data
+
+    def test_pages_cached_per_park(self, client, app):
+        """Test that each park gets its own cache entry"""
+        with app.app_context():
+            from app.models import Park
+            first, second = Park.query.order_by(Park.park_id).limit(2).all()
+        assert first.name.encode() in client.get(f'/parks/{first.park_id}').data
+        assert second.name.encode() in client.get(f'/parks/{second.park_id}').data
+        assert first.name.encode() in client.get(f'/parks/{first.park_id}').data
+
+    def test_csrf_hole_is_filled(self, client):
+        """Test that the CSRF placeholder never reaches the browser"""
+        client.get('/')
+        response = client.get('/')
+        assert b'page-cache-hole' not in response.data
+        assert b'name="csrf_token" value="' in response.data
+
+    def test_flash_messages_are_filled(self, client):
+        """Test that flash messages appear on a cached page"""
+        client.get('/')
+        response = client.post('/contact', data={
+            'name': 'Visitor', 'email': 'visitor@example.com', 'message': 'Hello there, park!'
+        }, follow_redirects=True)
+        assert b'Thank you for your message!' in response.data
+        # The message is consumed and not cached into the page
+        assert b'Thank you for your message!' not in client.get('/').data
+
+    def test_authenticated_pages_not_cached(self, authenticated_client, rendered):
+        """Test that logged-in users always get a fresh render"""
+        authenticated_client.get('/')
+        rendered.clear()
+        response = authenticated_client.get('/')
+        assert 'index.html' in rendered
+        assert b'Welcome, Test!' in response.data
+
+    def test_anonymous_page_not_served_to_logged_in_user(self, client, authenticated_client):
+        """Test that a page cached for visitors is not reused once logged in"""
+        client.get('/')
+        assert b'Welcome, Test!' in authenticated_client.get('/').data
+
+    def test_park_save_purges(self, client, app, rendered):
+        """Test that saving a park through ParkView purges cached pages"""
+        client.get('/')
+        with app.app_context():
+            from app import db
+            from app.models import Park, ParkView
+            ParkView(Park, db.session).after_model_change(MagicMock(), MagicMock(), is_created=False)
+            assert len(app.extensions['page_cache']) == 0
+        rendered.clear()
+        client.get('/')
+        assert 'index.html' in rendered
+
+    def test_missing_park_still_404(self, client):
+        """Test that 404s are not cached as pages"""
+        assert client.get('/parks/99999').status_code == 404
+        assert client.get('/parks/99999').status_code == 404
+
+    def test_disabled_by_config(self, client, app, rendered):
+        """Test that PAGE_CACHE_ENABLED=False renders every time"""
+        app.config['PAGE_CACHE_ENABLED'] = False
+        client.get('/')
+        rendered.clear()
+        client.get('/')
+        assert 'index.html' in rendered
+
+
+class TestConditionalGet:
+    """Test ETag / Last-Modified handling on index and park_detail"""
+
+    def test_validators_present(self, client):
+        """Test that anonymous pages carry an ETag and Last-Modified"""
+        response = client.get('/parks/1')
+        assert response.status_code == 200
+        assert response.headers.get('ETag')
+        assert response.headers.get('Last-Modified')
+        assert 'no-cache' in response.headers['Cache-Control']
+
+    def test_if_none_match_returns_304(self, client, rendered):
+        """Test that a matching ETag short-circuits rendering"""
+        client.get('/')
+        etag = client.get('/').headers['ETag']
+        rendered.clear()
+        response = client.get('/', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+        assert rendered == []
+
+    def test_if_modified_since_returns_304(self, client):
+        """Test that an up-to-date If-Modified-Since gets a 304"""
+        client.get('/parks/1')
+        last_modified = client.get('/parks/1').headers['Last-Modified']
+        response = client.get('/parks/1', headers={'If-Modified-Since': last_modified})
+        assert response.status_code == 304
+
+    def test_stale_etag_renders(self, client):
+        """Test that an old ETag gets the full page"""
+        response = client.get('/', headers={'If-None-Match': '"stale"'})
+        assert response.status_code == 200
+        assert b"Wednesday's Wicked Adventures" in response.data
+
+    def test_park_edit_changes_validators(self, client, app):
+        """Test that saving a park changes its ETag and Last-Modified"""
+        client.get('/parks/1')
+        before = client.get('/parks/1')
+        with app.app_context():
+            from app import db
+            from app.models import Park, ParkView
+            park = db.session.get(Park, 1)
+            park.updated_at = datetime(2099, 1, 1)
+            db.session.commit()
+            ParkView(Park, db.session).after_model_change(MagicMock(), park, is_created=False)
+
+        response = client.get('/parks/1', headers={'If-None-Match': before.headers['ETag']})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != before.headers['ETag']
+        assert '2099' in response.headers['Last-Modified']
+
+    def test_park_delete_changes_last_modified(self, client, app):
+        """Test that deleting a park moves the index's Last-Modified on"""
+        with app.app_context():
+            from app import db
+            from app.models import Booking, Park, ParkView
+            for park in Park.query:
+                park.updated_at = datetime(2000, 1, 1)
+            db.session.commit()
+        last_modified = client.get('/').headers['Last-Modified']
+
+        with app.app_context():
+            park = db.session.get(Park, 3)
+            Booking.query.filter_by(park_id=3).delete()
+            db.session.delete(park)
+            db.session.commit()
+            ParkView(Park, db.session).after_model_delete(park)
+
+        response = client.get('/', headers={'If-Modified-Since': last_modified})
+        assert response.status_code == 200
+        assert response.headers['Last-Modified'] != last_modified
+
+    def test_updated_at_is_utc(self, app):
+        """Test that updated_at is set in UTC whatever the database's time zone"""
+        from datetime import timezone
+        with app.app_context():
+            from app import db
+            from app.models import Park
+            park = db.session.get(Park, 1)
+            park.name = 'Renamed'
+            db.session.commit()
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            assert abs((now - park.updated_at).total_seconds()) < 60
+
+    def test_updated_at_maintained(self, app):
+        """Test that updating a park bumps updated_at"""
+        with app.app_context():
+            from app import db
+            from app.models import Park
+            park = db.session.get(Park, 1)
+            park.updated_at = datetime(2000, 1, 1)
+            db.session.commit()
+            park.name = 'Renamed'
+            db.session.commit()
+            assert park.updated_at > datetime(2000, 1, 1)
+
+    def test_flash_messages_bypass_304(self, client):
+        """Test that pending flash messages always get a fresh page"""
+        client.get('/')
+        etag = client.get('/').headers['ETag']
+        client.post('/contact', data={
+            'name': 'Visitor', 'email': 'visitor@example.com', 'message': 'Hello there, park!'
+        })
+        response = client.get('/', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert b'Thank you for your message!' in response.data
+
+    def test_authenticated_not_revalidated(self, authenticated_client):
+        """Test that logged-in pages carry no validators"""
+        response = authenticated_client.get('/')
+        assert 'ETag' not in response.headers
+        assert 'private' in response.headers['Cache-Control']
@@ -0,0 +1,133 @@
+"""
+Integration tests for read-replica routing
+
+The app runs on two SQLite files: the primary and a "replica" that is never
+replicated to, so every read shows which database served it.
+"""
+import pytest
+import sys
+import os
+from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from werkzeug.security import generate_password_hash
+
+# Add the main directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'main'))
+
+from config import TestingConfig
+from app import create_app, db
+from app.models import Booking, Park, Role, User
+
+
+def _seed(engine, park_name, booking_dates):
+    db.metadata.create_all(engine)
+    with Session(engine) as session:
+        user_role, admin_role = Role(name='user'), Role(name='admin')
+        session.add_all([user_role, admin_role])
+        session.flush()
+        session.add_all([
+            User(name='Test', last_name='User', email='test@example.com',
+                 password=generate_password_hash('password123', method='pbkdf2:sha256'),
+                 role_id=user_role.role_id),
+            User(name='Admin', last_name='User', email='admin@example.com',
+                 password=generate_password_hash('admin123', method='pbkdf2:sha256'),
+                 role_id=admin_role.role_id),
+            Park(name=park_name, location='Dublin', description='Capital park',
+                 short_description='Step into a world of spells', slug='park-1', folder='witches'),
+        ])
+        session.flush()
+        session.add_all([Booking(user_id=1, park_id=1, date=when, num_tickets=1) for when in booking_dates])
+        session.commit()
+
+
+def _booking_count(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(Booking)).scalar()
+
+
+@pytest.fixture
+def routed_app(tmp_path, monkeypatch):
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{tmp_path / "primary.db"}')
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_BINDS', {'replica1': f'sqlite:///{tmp_path / "replica.db"}'})
+    monkeypatch.setattr(TestingConfig, 'REPLICA_BINDS', ['replica1'])
+    routed_app = create_app('testing')
+    with routed_app.app_context():
+        # The replica lags: it has an older park name and misses the newest booking
+        _seed(db.engines[None], 'Leprechaun Park', [datetime(2030, 1, 1), datetime(2030, 1, 2)])
+        _seed(db.engines['replica1'], 'Stale Park', [datetime(2030, 1, 1)])
+    yield routed_app
+    with routed_app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    # init_app registered a metadata for the bind on the shared extension
+    db.metadatas.pop('replica1', None)
+
+
+def _client(app, user_id=1):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+    return client
+
+
+def _upcoming(client):
+    return [booking['date'] for booking in client.get('/api/bookings').get_json()['bookings']]
+
+
+class TestReplicaRouting:
+    """Test which database serves each request"""
+
+    def test_read_only_views_use_replica(self, routed_app):
+        """Profile and the bookings API read from the replica"""
+        client = _client(routed_app)
+        assert b'<strong>1</strong> total bookings' in client.get('/profile').data
+        assert _upcoming(client) == ['2030-01-01T00:00:00']
+
+    def test_writes_go_to_primary(self, routed_app):
+        """A booking is written to the primary only"""
+        client = _client(routed_app)
+        response = client.post('/booking', data={'park_id': '1', 'date': '2030-03-01', 'num_tickets': '1'})
+        assert response.status_code == 302
+        with routed_app.app_context():
+            assert _booking_count(db.engines[None]) == 3
+            assert _booking_count(db.engines['replica1']) == 1
+
+    def test_reads_own_writes(self, routed_app):
+        """After writing, a visitor reads from the primary"""
+        client = _client(routed_app)
+        client.post('/booking', data={'park_id': '1', 'date': '2030-03-01', 'num_tickets': '1'})
+
+        assert b'<strong>3</strong> total bookings' in client.get('/profile').data
+        assert len(_upcoming(client)) == 3
+
+        # Other visitors are unaffected
+        other = _client(routed_app)
+        assert len(_upcoming(other)) == 1
+
+    def test_stickiness_expires(self, routed_app):
+        """Once the sticky window has passed, reads return to the replica"""
+        routed_app.config['REPLICA_STICKY_SECONDS'] = 0
+        client = _client(routed_app)
+        client.post('/booking', data={'park_id': '1', 'date': '2030-03-01', 'num_tickets': '1'})
+        assert len(_upcoming(client)) == 1
+
+    def test_catalogue_reads_primary(self, routed_app):
+        """The park catalogue is never loaded from a replica"""
+        response = routed_app.test_client().get('/')
+        assert b'Leprechaun Park' in response.data
+        assert b'Stale Park' not in response.data
+
+    def test_admin_list_uses_replica(self, routed_app):
+        """Flask-Admin list pages read from the replica"""
+        client = _client(routed_app, user_id=2)
+        response = client.get('/admin/booking/')
+        assert response.status_code == 200
+        assert b'2030-01-01' in response.data
+        assert b'2030-01-02' not in response.data
+
+    def test_without_replicas_everything_reads_primary(self, routed_app):
+        """With no replica binds configured, replica_reads() is a no-op"""
+        routed_app.config['REPLICA_BINDS'] = []
+        assert len(_upcoming(_client(routed_app))) == 2
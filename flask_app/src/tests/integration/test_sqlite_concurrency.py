@@ -0,0 +1,157 @@
+"""
+Concurrency tests for the SQLite performance profile
+
+These use database files rather than the in-memory test database, since
+journal modes and locking only apply to files.
+"""
+import pytest
+import sys
+import os
+import threading
+from datetime import date, timedelta
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from werkzeug.security import generate_password_hash
+
+# Add the main directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'main'))
+
+from config import SQLITE_PROFILES, TestingConfig
+from app import create_app, configure_sqlite, db
+from app.models import Booking, Park, Role, User
+
+
+PARK = dict(name='Leprechaun Park', location='Dublin', description='Capital park',
+            short_description='Step into a world of spells', slug='park-1')
+
+
+def _engine(path, profile):
+    # A short driver timeout, so a blocked reader fails fast instead of waiting 5s
+    engine = create_engine(f'sqlite:///{path}', connect_args={'timeout': 0.2})
+    configure_sqlite(engine, SQLITE_PROFILES[profile])
+    return engine
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = tmp_path / 'wwa.db'
+    engine = create_engine(f'sqlite:///{path}')
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(Park.__table__.insert(), PARK)
+    engine.dispose()
+    return path
+
+
+class TestReadersDuringWrites:
+    """Test that readers are not locked out while a booking is being written"""
+
+    def _hold_write_lock(self, engine):
+        # The lock a writer holds while committing
+        conn = engine.raw_connection()
+        conn.execute('BEGIN EXCLUSIVE')
+        conn.execute("INSERT INTO messages (name, email, message) VALUES ('a', 'a@example.com', 'hi')")
+        return conn
+
+    def test_rollback_journal_blocks_readers(self, database):
+        """Without the profile a reader fails with 'database is locked'"""
+        writer, reader = _engine(database, 'default'), _engine(database, 'default')
+        conn = self._hold_write_lock(writer)
+        try:
+            with pytest.raises(OperationalError, match='database is locked'):
+                with reader.connect() as read:
+                    read.execute(text('SELECT name FROM parks')).all()
+        finally:
+            conn.rollback()
+            conn.close()
+
+    def test_wal_readers_not_blocked(self, database):
+        """With WAL the reader sees the last committed data immediately"""
+        writer, reader = _engine(database, 'performance'), _engine(database, 'performance')
+        conn = self._hold_write_lock(writer)
+        try:
+            with reader.connect() as read:
+                assert read.execute(text('SELECT name FROM parks')).scalars().all() == ['Leprechaun Park']
+                assert read.execute(text('SELECT COUNT(*) FROM messages')).scalar() == 0
+        finally:
+            conn.rollback()
+            conn.close()
+
+    def test_profile_pragmas_applied(self, database):
+        """Every connection gets the profile's settings"""
+        engine = _engine(database, 'performance')
+        with engine.connect() as conn:
+            assert conn.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+            assert conn.execute(text('PRAGMA synchronous')).scalar() == 1
+            assert conn.execute(text('PRAGMA busy_timeout')).scalar() == 5000
+            assert conn.execute(text('PRAGMA temp_store')).scalar() == 2
+            assert conn.execute(text('PRAGMA foreign_keys')).scalar() == 1
+
+
+@pytest.mark.slow
+class TestConcurrentBookings:
+    """Drive concurrent booking writes and reads through the app on a file database"""
+
+    @pytest.fixture
+    def file_app(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{tmp_path / "app.db"}')
+        monkeypatch.setattr(TestingConfig, 'SQLITE_PRAGMAS', SQLITE_PROFILES['performance'])
+        file_app = create_app('testing')
+        with file_app.app_context():
+            db.create_all()
+            role = Role(name='user')
+            db.session.add_all([
+                role,
+                Park(**PARK),
+            ])
+            db.session.flush()
+            for n in range(4):
+                db.session.add(User(name='Load', last_name=str(n), email=f'load{n}@example.com',
+                                    password=generate_password_hash('x', method='pbkdf2:sha256'),
+                                    role_id=role.role_id))
+            db.session.commit()
+        yield file_app
+        with file_app.app_context():
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+
+    def _client(self, app, user_id):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+        return client
+
+    def test_writes_and_reads_interleave(self, file_app):
+        """Bookings and reads run side by side without lock errors"""
+        bookings_per_writer, reads_per_reader = 20, 40
+        failures = []
+
+        def write(user_id):
+            client = self._client(file_app, user_id)
+            for n in range(bookings_per_writer):
+                response = client.post('/booking', data={
+                    'park_id': '1',
+                    'date': (date(2030, 1, 1) + timedelta(days=n)).isoformat(),
+                    'num_tickets': '1',
+                })
+                if response.status_code != 302 or '/profile' not in response.location:
+                    failures.append(('write', response.status_code))
+
+        def read(user_id):
+            client = self._client(file_app, user_id)
+            for _ in range(reads_per_reader):
+                response = client.get('/api/bookings?window=upcoming')
+                if response.status_code != 200:
+                    failures.append(('read', response.status_code))
+
+        threads = [threading.Thread(target=write, args=(user_id,)) for user_id in (1, 2)]
+        threads += [threading.Thread(target=read, args=(user_id,)) for user_id in (3, 4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert failures == []
+        with file_app.app_context():
+            assert Booking.query.count() == 2 * bookings_per_writer
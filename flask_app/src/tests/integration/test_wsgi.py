@@ -0,0 +1,150 @@
+"""
+Load tests for the production entry point under Gunicorn
+
+These start real Gunicorn servers on wsgi:app with gunicorn.conf.py, so they
+are marked slow and skipped when Gunicorn is not installed.
+"""
+import pytest
+import sys
+import os
+import socket
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+pytest.importorskip('gunicorn')
+
+MAIN_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'main'))
+
+pytestmark = pytest.mark.slow
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def server_env(tmp_path):
+    env = dict(
+        os.environ,
+        FLASK_APP='wsgi',
+        FLASK_CONFIG='production',
+        PROD_DATABASE_URL=f'sqlite:///{tmp_path / "wwa.db"}',
+        CACHE_STORE_URL=f'sqlite:///{tmp_path / "cache.db"}',
+        SECRET_KEY='load-test-key',
+    )
+    subprocess.run([sys.executable, '-m', 'flask', 'schema', 'upgrade'],
+                   cwd=MAIN_DIR, env=env, check=True, capture_output=True)
+    return env
+
+
+@contextmanager
+def serve(env, **settings):
+    """Run Gunicorn with GUNICORN_* overrides and yield (host, port)"""
+    port = _free_port()
+    env = dict(env, GUNICORN_BIND=f'127.0.0.1:{port}',
+               **{f'GUNICORN_{name.upper()}': str(value) for name, value in settings.items()})
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+        cwd=MAIN_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=1)
+                break
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                if time.monotonic() > deadline or process.poll() is not None:
+                    raise RuntimeError('Gunicorn did not start')
+                time.sleep(0.2)
+        yield '127.0.0.1', port
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def _get_root(address, timeout):
+    return urllib.request.urlopen(f'http://{address[0]}:{address[1]}/', timeout=timeout).status
+
+
+def _throughput(address, requests, concurrency):
+    def get(_):
+        return _get_root(address, timeout=10)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(concurrency) as pool:
+        statuses = list(pool.map(get, range(requests)))
+    assert statuses == [200] * requests
+    return requests / (time.monotonic() - started)
+
+
+def _stall(address):
+    """Open a POST /contact whose body never arrives"""
+    sock = socket.create_connection(address)
+    sock.sendall(b'POST /contact HTTP/1.1\r\nHost: localhost\r\n'
+                 b'Content-Type: application/x-www-form-urlencoded\r\n'
+                 b'Content-Length: 100\r\n\r\n')
+    return sock
+
+
+class TestGunicorn:
+    """Test serving wsgi:app with gunicorn.conf.py"""
+
+    def test_workers_share_cache_store_by_default(self):
+        """Several workers get a shared cache store unless one is configured"""
+        script = ('import runpy; from config import Config; '
+                  'runpy.run_path("gunicorn.conf.py"); print(Config.CACHE_STORE_URL)')
+        env = {k: v for k, v in os.environ.items() if k != 'CACHE_STORE_URL'}
+        instance = os.path.join(MAIN_DIR, 'instance')
+        existed = os.path.isdir(instance)
+        try:
+            def store_for(workers, **extra):
+                return subprocess.run([sys.executable, '-c', script], cwd=MAIN_DIR, check=True, text=True,
+                                      capture_output=True, env=dict(env, GUNICORN_WORKERS=str(workers), **extra)
+                                      ).stdout.strip()
+
+            assert store_for(1) == 'memory://'
+            assert store_for(3) == f'sqlite:///{os.path.join(instance, "cache.db")}'
+            assert store_for(3, CACHE_STORE_URL='sqlite:////tmp/x.db') == 'sqlite:////tmp/x.db'
+        finally:
+            if not existed and os.path.isdir(instance) and not os.listdir(instance):
+                os.rmdir(instance)
+
+    def test_serves_production_app(self, server_env):
+        """The entry point serves pages with the production config"""
+        with serve(server_env) as address:
+            assert _get_root(address, timeout=5) == 200
+
+    def test_slow_client_does_not_block_others(self, server_env):
+        """A client stalled mid-request no longer holds up every other visitor"""
+        # The development server's model: one request at a time
+        with serve(server_env, workers=1, threads=1) as address:
+            with _stall(address):
+                with pytest.raises((socket.timeout, urllib.error.URLError)):
+                    _get_root(address, timeout=1)
+
+        with serve(server_env) as address:
+            with _stall(address):
+                assert _get_root(address, timeout=5) == 200
+
+    def test_throughput_scales_with_workers(self, server_env):
+        """CPU-bound throughput grows with the number of worker processes"""
+        cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+        if cpus < 2:
+            pytest.skip('needs at least two CPUs')
+        workers = min(cpus, 4)
+
+        with serve(server_env, workers=1, threads=1) as address:
+            _throughput(address, requests=20, concurrency=2)
+            single = _throughput(address, requests=200, concurrency=2 * workers)
+        with serve(server_env, workers=workers, threads=1) as address:
+            _throughput(address, requests=20, concurrency=2 * workers)
+            scaled = _throughput(address, requests=200, concurrency=2 * workers)
+
+        assert scaled > 1.3 * single
@@ -0,0 +1,118 @@
+"""
+Unit tests for static asset fingerprinting
+"""
+import pytest
+import sys
+import os
+
+# Add the main directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'main'))
+
+from app.assets import build_manifest, load_manifest, manifest_version, static_url
+
+
+@pytest.fixture
+def static_folder(tmp_path):
+    (tmp_path / 'css').mkdir()
+    (tmp_path / 'js').mkdir()
+    (tmp_path / 'images' / 'variants').mkdir(parents=True)
+    (tmp_path / 'css' / 'styles.css').write_text('.banner { background: url("/static/images/bg.png"); }')
+    (tmp_path / 'js' / 'main.js').write_text('console.log("hi");')
+    (tmp_path / 'images' / 'bg.png').write_bytes(b'png-bytes')
+    (tmp_path / 'images' / 'variants' / 'bg-abc-320.webp').write_bytes(b'webp-bytes')
+    (tmp_path / 'images' / 'variants' / 'manifest.json').write_text('{}')
+    return tmp_path
+
+
+@pytest.fixture
+def built_app(app, static_folder):
+    build_manifest(str(static_folder))
+    app.static_folder = str(static_folder)
+    app.extensions.pop('asset_manifest', None)
+    return app
+
+
+class TestBuildManifest:
+    """Test the fingerprinting build step"""
+
+    def test_hashed_copies(self, static_folder):
+        """Each file is copied to dist/ with a content hash in its name"""
+        manifest = build_manifest(str(static_folder))
+
+        hashed = manifest['js/main.js']
+        assert hashed.startswith('dist/js/main.') and hashed.endswith('.js')
+        assert (static_folder / hashed).read_text() == 'console.log("hi");'
+
+    def test_skips_hashed_directories(self, static_folder):
+        """Image variants and earlier builds are not fingerprinted again"""
+        build_manifest(str(static_folder))
+        manifest = build_manifest(str(static_folder))
+        assert sorted(manifest) == ['css/styles.css', 'images/bg.png', 'js/main.js']
+
+    def test_hash_follows_content(self, static_folder):
+        """Changing a file changes its fingerprint"""
+        before = build_manifest(str(static_folder))['js/main.js']
+        (static_folder / 'js' / 'main.js').write_text('console.log("bye");')
+        after = build_manifest(str(static_folder))['js/main.js']
+        assert before != after
+
+    def test_css_references_rewritten(self, static_folder):
+        """Stylesheets point at fingerprinted images, and change when they do"""
+        manifest = build_manifest(str(static_folder))
+        css = (static_folder / manifest['css/styles.css']).read_text()
+        assert f'url("/static/{manifest["images/bg.png"]}")' in css
+
+        (static_folder / 'images' / 'bg.png').write_bytes(b'new-png-bytes')
+        assert build_manifest(str(static_folder))['css/styles.css'] != manifest['css/styles.css']
+
+    def test_manifest_round_trip(self, static_folder):
+        """The manifest written by the build is what load_manifest returns"""
+        manifest = build_manifest(str(static_folder))
+        assert load_manifest(str(static_folder)) == manifest
+
+
+class TestStaticUrl:
+    """Test static_url and the cache headers"""
+
+    def test_unbuilt_falls_back(self, app):
+        """Without a manifest static_url is url_for('static')"""
+        app.extensions['asset_manifest'] = {}
+        with app.test_request_context():
+            assert static_url('css/styles.css') == '/static/css/styles.css'
+            assert manifest_version() == ''
+
+    def test_fingerprinted_url(self, built_app):
+        """Built assets resolve to their hashed name"""
+        with built_app.test_request_context():
+            url = static_url('css/styles.css')
+            assert url.startswith('/static/dist/css/styles.')
+            assert static_url('missing.js') == '/static/missing.js'
+            assert manifest_version() != ''
+
+    def test_hashed_files_are_immutable(self, built_app):
+        """Fingerprinted files and image variants get a one-year immutable lifetime"""
+        client = built_app.test_client()
+        with built_app.test_request_context():
+            url = static_url('js/main.js')
+
+        for path in (url, '/static/images/variants/bg-abc-320.webp'):
+            response = client.get(path)
+            assert response.status_code == 200
+            assert response.cache_control.public
+            assert response.cache_control.max_age == 31536000
+            assert response.cache_control.immutable
+
+    def test_plain_files_revalidate(self, built_app):
+        """Unhashed names and the manifests keep the default headers"""
+        client = built_app.test_client()
+        for path in ('/static/js/main.js', '/static/dist/manifest.json', '/static/images/variants/manifest.json'):
+            response = client.get(path)
+            assert response.status_code == 200
+            assert not response.cache_control.immutable
+            assert response.cache_control.max_age is None
+
+    def test_pages_link_fingerprinted_assets(self, built_app, client):
+        """The base layout links the hashed stylesheet and scripts"""
+        response = client.get('/')
+        assert b'href="/static/dist/css/styles.' in response.data
+        assert b'src="/static/dist/js/main.' in response.data
@@ -0,0 +1,125 @@
+"""
+Unit tests for bulk booking import and export
+"""
+import sys
+import os
+import io
+import json
+from datetime import date, datetime
+
+# Add the main directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'main'))
+
+from app import db
+from app.bulk import export_rows, import_bookings, read_rows
+from app.inventory import remaining
+from app.models import Booking, Park
+
+CSV = """user_email,park_slug,date,num_tickets,health_safety
+test@example.com,park-1-dublin,2030-05-01,2,yes
+admin@example.com,park-2-Cork,2030-05-01T10:00:00,1,
+nobody@example.com,park-1-dublin,2030-05-01,1,
+test@example.com,no-such-park,2030-05-01,1,
+test@example.com,park-1-dublin,01/05/2030,1,
+test@example.com,park-1-dublin,2030-05-02,0,
+"""
+
+
+def _import(text, fmt='csv', batch_size=1000):
+    return import_bookings(read_rows(io.StringIO(text), fmt), batch_size)
+
+
+class TestImport:
+    """Test import_bookings()"""
+
+    def test_valid_rows_imported_and_errors_reported(self, app):
+        """Good rows are inserted; bad ones are reported by line number"""
+        report = _import(CSV)
+        assert report.imported == 2
+        assert [line for line, _ in report.errors] == [4, 5, 6, 7]
+        messages = dict(report.errors)
+        assert 'unknown user' in messages[4]
+        assert 'unknown park' in messages[5]
+        assert 'ISO date' in messages[6]
+        assert 'positive' in messages[7]
+
+        booking = Booking.query.filter_by(park_id=1).one()
+        assert (booking.user_id, booking.num_tickets, booking.health_safety) == (1, 2, True)
+        assert booking.date == datetime(2030, 5, 1)
+
+    def test_tickets_taken_from_inventory(self, app):
+        """Imported bookings use up the day's capacity"""
+        _import(CSV)
+        assert remaining(1, date(2030, 5, 1)) == 498
+        assert remaining(2, date(2030, 5, 1)) == 499
+
+    def test_sold_out_rows_rejected_individually(self, app):
+        """When a day's rows don't all fit, as many as fit are imported"""
+        db.session.get(Park, 1).daily_capacity = 3
+        db.session.commit()
+        rows = '\n'.join(json.dumps({'user_id': 1, 'park_id': 1, 'date': '2030-06-01', 'num_tickets': n})
+                         for n in (2, 2, 1))
+        report = _import(rows, fmt='jsonl')
+        assert report.imported == 2
+        assert report.errors == [(2, 'not enough tickets left at park 1 on 2030-06-01')]
+        assert remaining(1, date(2030, 6, 1)) == 0
+
+    def test_batches_commit_separately(self, app, assert_max_queries):
+        """Each batch is one counter and rollup update per day and one executemany insert"""
+        rows = [(n, {'user_id': 1, 'park_id': 1, 'date': '2030-07-01'}) for n in range(1, 11)]
+        with assert_max_queries(30) as queries:
+            report = import_bookings(rows, batch_size=5)
+        assert report.imported == 10
+        assert len([sql for sql in queries if sql.startswith('INSERT INTO bookings')]) == 2
+        assert len([sql for sql in queries if sql.startswith('UPDATE park_day_capacity')]) == 3
+        assert len([sql for sql in queries if sql.startswith('UPDATE booking_daily_rollup')]) == 2
+        assert Booking.query.count() == 10
+        assert remaining(1, date(2030, 7, 1)) == 490
+
+    def test_invalid_json_line(self, app):
+        """A malformed JSON line is reported, not fatal"""
+        report = _import('{"user_id": 1, "park_id": 1, "date": "2030-05-01"}\nnot json\n[1, 2]\n', fmt='jsonl')
+        assert report.imported == 1
+        assert [line for line, _ in report.errors] == [2, 3]
+
+
+class TestExport:
+    """Test export_rows() and the CLI round trip"""
+
+    def test_export_rows(self, app):
+        """Rows carry emails and slugs, filtered in SQL"""
+        _import(CSV)
+        rows = list(export_rows())
+        assert [row['park_slug'] for row in rows] == ['park-1-dublin', 'park-2-Cork']
+        assert rows[0]['user_email'] == 'test@example.com'
+        assert rows[0]['date'] == '2030-05-01T00:00:00'
+        assert [row['park_slug'] for row in export_rows(park_id=2)] == ['park-2-Cork']
+        assert list(export_rows(since=datetime(2030, 6, 1))) == []
+
+    def test_cli_round_trip(self, app, runner, tmp_path):
+        """An export can be imported again"""
+        source = tmp_path / 'in.csv'
+        source.write_text(CSV)
+        result = runner.invoke(args=['bookings', 'import', str(source)])
+        assert result.exit_code == 1
+        assert 'line 4: unknown user' in result.output
+        assert 'Imported 2 booking(s); 4 row(s) rejected.' in result.output
+
+        exported = tmp_path / 'out.jsonl'
+        result = runner.invoke(args=['bookings', 'export', str(exported)])
+        assert result.exit_code == 0
+        lines = exported.read_text().splitlines()
+        assert len(lines) == 2 and json.loads(lines[0])['park_slug'] == 'park-1-dublin'
+
+        result = runner.invoke(args=['bookings', 'import', str(exported)])
+        assert result.exit_code == 0
+        assert Booking.query.count() == 4
+
+    def test_cli_export_csv_to_stdout(self, app, runner):
+        """Without a path, CSV goes to stdout"""
+        _import(CSV)
+        result = runner.invoke(args=['bookings', 'export', '--park', '2'])
+        assert result.output.splitlines() == [
+            'booking_id,user_email,park_slug,date,num_tickets,health_safety',
+            '2,admin@example.com,park-2-Cork,2030-05-01T10:00:00,1,False',
+        ]
@@ -0,0 +1,99 @@
+"""
+Unit tests for the shared key/value stores
+"""
+import pytest
+import sys
+import os
+import time
+from unittest.mock import patch
+
+# Add the main directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'main'))
+
+from app.cache import MemoryStore, SQLiteStore, store_from_url
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryStore()
+    return SQLiteStore(str(tmp_path / 'cache.db'))
+
+
+class TestStores:
+    """Behaviour shared by every store"""
+
+    def test_get_missing_returns_default(self, store):
+        """Missing keys return the default"""
+        assert store.get('missing') is None
+        assert store.get('missing', 7) == 7
+
+    def test_set_and_get(self, store):
+        """Stored values round-trip"""
+        store.set('key', {'a': 1})
+        assert store.get('key') == {'a': 1}
+
+    def test_incr_starts_at_zero(self, store):
+        """incr creates the counter and returns the new value"""
+        assert store.incr('counter') == 1
+        assert store.incr('counter', 5) == 6
+        assert store.get('counter') == 6
+
+    def test_update(self, store):
+        """update passes the current value (or None) and stores the result"""
+        assert store.update('pair', lambda value: [1, 2] if value is None else value + [3]) == [1, 2]
+        assert store.update('pair', lambda value: value + [3]) == [1, 2, 3]
+        assert store.get('pair') == [1, 2, 3]
+
+    def test_delete_and_clear(self, store):
+        """delete removes one key, clear removes all"""
+        store.set('a', 1)
+        store.set('b', 2)
+        store.delete('a')
+        assert store.get('a') is None
+        store.clear()
+        assert store.get('b') is None
+
+    def test_ttl_expiry(self, store):
+        """Values disappear once their TTL has passed"""
+        store.set('short', 'value', ttl=10)
+        store.incr('counter', ttl=10)
+        with patch('app.cache.time.time', return_value=time.time() + 11):
+            assert store.get('short') is None
+            assert store.incr('counter', ttl=10) == 1
+
+
+class TestSQLiteStore:
+    """SQLite-specific behaviour"""
+
+    def test_shared_between_instances(self, tmp_path):
+        """Two stores on the same file (e.g. two workers) see the same values"""
+        path = str(tmp_path / 'shared.db')
+        first, second = SQLiteStore(path), SQLiteStore(path)
+        first.incr('version')
+        assert second.get('version') == 1
+
+    def test_reads_do_not_wait_for_writer(self, tmp_path):
+        """get() answers while another worker holds the write lock"""
+        path = str(tmp_path / 'shared.db')
+        writer, reader = SQLiteStore(path), SQLiteStore(path, timeout=0.1)
+        writer.set('version', 3)
+        with writer.transaction() as conn:
+            conn.execute("UPDATE kv SET value = '4' WHERE key = 'version'")
+            assert reader.get('version') == 3
+        assert reader.get('version') == 4
+
+
+class TestStoreFromUrl:
+    """Test store_from_url()"""
+
+    def test_memory(self):
+        assert isinstance(store_from_url('memory://'), MemoryStore)
+
+    def test_sqlite(self, tmp_path):
+        store = store_from_url(f'sqlite:///{tmp_path}/cache.db')
+        assert isinstance(store, SQLiteStore)
+
+    def test_unknown_scheme(self):
+        with pytest.raises(ValueError):
+            store_from_url('redis://localhost')
@@ -0,0 +1,79 @@
+"""
+Unit tests for the cached park catalogue
+"""
+import pytest
+import sys
+import os
+from unittest.mock import MagicMock
+
+# Add the main directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'main'))
+
+from dataclasses import FrozenInstanceError
+from werkzeug.exceptions import NotFound
+from app import db
+from app.models import Park, ParkView
+from app.catalogue import get_catalogue, get_parks, get_park_or_404, invalidate, current_version
+
+
+class TestCatalogue:
+    """Test the park catalogue snapshot"""
+
+    def test_snapshot_matches_database(self, app):
+        """The catalogue holds every park, indexed by id and slug"""
+        with app.app_context():
+            catalogue = get_catalogue()
+            parks = Park.query.order_by(Park.park_id).all()
+            assert [p.park_id for p in catalogue.parks] == [p.park_id for p in parks]
+            assert catalogue.by_slug['park-1-dublin'].name == 'Leprechaun Park'
+            assert catalogue.by_id[parks[0].park_id].location == 'Dublin'
+
+    def test_snapshots_are_immutable(self, app):
+        """Cached parks can't be modified by callers"""
+        with app.app_context():
+            park = get_parks()[0]
+            with pytest.raises(FrozenInstanceError):
+                park.name = 'Changed'
+
+    def test_reused_until_invalidated(self, app):
+        """The same catalogue is served until the version changes"""
+        with app.app_context():
+            first = get_catalogue()
+            assert get_catalogue() is first
+
+            invalidate()
+            assert current_version() == first.version + 1
+            assert get_catalogue() is not first
+
+    def test_stale_until_invalidated(self, app):
+        """Direct database edits only show up after invalidation"""
+        with app.app_context():
+            park_id = get_parks()[0].park_id
+            db.session.get(Park, park_id).name = 'Renamed Park'
+            db.session.commit()
+
+            assert get_park_or_404(park_id).name == 'Leprechaun Park'
+            invalidate()
+            assert get_park_or_404(park_id).name == 'Renamed Park'
+
+    def test_unknown_park_is_404(self, app):
+        """Unknown ids abort with 404"""
+        with app.app_context():
+            with pytest.raises(NotFound):
+                get_park_or_404(99999)
+
+
+class TestParkViewInvalidation:
+    """ParkView saves and deletes invalidate the catalogue"""
+
+    def test_after_model_change(self, app):
+        with app.app_context():
+            version = current_version()
+            ParkView(Park, db.session).after_model_change(MagicMock(), MagicMock(), is_created=False)
+            assert current_version() == version + 1
+
+    def test_after_model_delete(self, app):
+        with app.app_context():
+            version = current_version()
+            ParkView(Park, db.session).after_model_delete(MagicMock())
+            assert current_version() == version + 1
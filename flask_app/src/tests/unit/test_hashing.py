@@ -0,0 +1,102 @@
+"""
+Unit tests for the password hashing service
+"""
+import pytest
+import sys
+import os
+import threading
+from werkzeug.security import check_password_hash
+
+# Add the main directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'main'))
+
+from app.hashing import HashingBusy, HashingService
+
+
+class TestInlineHashing:
+    """Test the service with no pool, as configured for tests"""
+
+    def test_hash_and_verify(self):
+        """Hashes are Werkzeug hashes and verify as before"""
+        service = HashingService(workers=0)
+        hashed = service.hash('password123', 'pbkdf2:sha256')
+        assert hashed.startswith('pbkdf2:sha256:')
+        assert check_password_hash(hashed, 'password123')
+        assert service.verify(hashed, 'password123')
+        assert not service.verify(hashed, 'wrong')
+        assert service.stats.jobs == {'hash': 1, 'verify': 2}
+        assert service.stats.wait_count == 3
+        assert service.stats.in_flight == 0
+
+    def test_cap_rejects_after_timeout(self):
+        """Calls beyond max_pending wait, then raise HashingBusy"""
+        service = HashingService(workers=0, max_pending=1, queue_timeout=0.05)
+        started, release = threading.Event(), threading.Event()
+
+        def slow(*args):
+            started.set()
+            release.wait(5)
+
+        holder = threading.Thread(target=service._run, args=('hash', slow))
+        holder.start()
+        try:
+            started.wait(5)
+            assert service.stats.in_flight == 1
+            with pytest.raises(HashingBusy):
+                service.hash('password123', 'pbkdf2:sha256')
+            assert service.stats.rejected == 1
+        finally:
+            release.set()
+            holder.join()
+        # The slot is free again
+        assert service.verify(service.hash('x', 'pbkdf2:sha256'), 'x')
+
+
+@pytest.mark.slow
+class TestPooledHashing:
+    """Test the process pool"""
+
+    @pytest.fixture
+    def service(self):
+        service = HashingService(workers=1, nice=3)
+        yield service
+        service.shutdown()
+
+    def test_runs_in_lower_priority_process(self, service):
+        """Work runs in a separate, niced process"""
+        assert service._run('hash', os.getpid) != os.getpid()
+        assert service._run('hash', os.nice, 0) == os.nice(0) + 3
+
+    def test_hash_and_verify(self, service):
+        """Hashes made in the pool verify in the pool"""
+        hashed = service.hash('password123', 'pbkdf2:sha256')
+        assert service.verify(hashed, 'password123')
+        assert service.stats.work_sum > 0
+
+    def test_pool_started_lazily(self):
+        """Nothing is started until the first hash, e.g. in the Gunicorn master"""
+        service = HashingService(workers=1)
+        assert service._executor is None
+
+
+class TestHashingInApp:
+    """Test the service as wired into the app"""
+
+    def test_login_uses_service(self, app, client):
+        """Logging in verifies through the service and shows on /metrics"""
+        response = client.post('/login', data={'email': 'test@example.com', 'password': 'password123'})
+        assert response.status_code == 302
+        assert app.extensions['password_hashing'].stats.jobs['verify'] == 1
+        body = client.get('/metrics', headers={'Authorization': 'Bearer test-metrics-token'}).get_data(as_text=True)
+        assert 'password_hash_jobs_total{op="verify"' in body
+        assert '# TYPE password_hash_wait_seconds histogram' in body
+        assert 'password_hash_wait_seconds_bucket{le="+Inf",pid=' in body
+
+    def test_busy_returns_503(self, app, client, monkeypatch):
+        """A login that cannot get a hashing slot is told to retry"""
+        def busy(*args):
+            raise HashingBusy('full')
+        monkeypatch.setattr(app.extensions['password_hashing'], 'verify', busy)
+        response = client.post('/login', data={'email': 'test@example.com', 'password': 'password123'})
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
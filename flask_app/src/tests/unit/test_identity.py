@@ -0,0 +1,193 @@
+"""
+Unit tests for the cached Flask-Login identity
+"""
+import pytest
+import sys
+import os
+from unittest.mock import patch
+from flask import g
+
+# Add the main directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'main'))
+
+from app import db
+from app.identity import SESSION_KEY, IdentityCache, Principal, bump_session_epoch, invalidate, load_principal
+from app.models import Booking, Role, User
+
+
+def _get(client, url):
+    # The test's app context outlives each request, and with it Flask-Login's
+    # g._login_user; drop it so the user loader runs as on a real request
+    g.pop('_login_user', None)
+    return client.get(url)
+
+
+def _principal(user_id=1, role_name='user'):
+    return Principal(user_id, 'Test', 'User', 'test@example.com', role_name)
+
+
+class TestIdentityCache:
+    """Test the LRU itself"""
+
+    def test_version_and_ttl(self):
+        """Entries are dropped when the version changes or the TTL passes"""
+        cache = IdentityCache(max_entries=10, ttl=60)
+        cache.set(1, 0, _principal())
+        assert cache.get(1, 0) == _principal()
+        assert cache.get(1, 1) is None
+        assert len(cache) == 0
+
+        cache.set(1, 0, _principal())
+        with patch('app.identity.time.monotonic', return_value=10**9):
+            assert cache.get(1, 0) is None
+
+    def test_bounded(self):
+        """The least recently used principal is evicted first"""
+        cache = IdentityCache(max_entries=2, ttl=60)
+        for user_id in (1, 2):
+            cache.set(user_id, 0, _principal(user_id))
+        cache.get(1, 0)
+        cache.set(3, 0, _principal(3))
+        assert cache.get(2, 0) is None
+        assert cache.get(1, 0) is not None
+
+
+class TestLoadPrincipal:
+    """Test the user loader"""
+
+    def test_principal_fields(self, app):
+        """The principal carries what templates and admin checks need"""
+        principal = load_principal('2')
+        assert principal.get_id() == '2'
+        assert principal.name == 'Admin'
+        assert principal.has_role('admin') and not principal.has_role('user')
+        assert principal.is_authenticated
+
+    def test_unknown_user(self, app):
+        """A deleted user's session resolves to nobody"""
+        assert load_principal('999') is None
+
+    def test_single_query_then_cached(self, app, assert_max_queries):
+        """One joined query on a miss, none on a hit"""
+        with assert_max_queries(1):
+            load_principal('1')
+        with assert_max_queries(0):
+            assert load_principal('1').has_role('user')
+
+    def test_authenticated_pages_skip_auth_queries(self, app, assert_max_queries):
+        """Once cached, an authenticated admin page reads no users or roles"""
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = '2'
+        _get(client, '/admin/')
+        with assert_max_queries(10) as queries:
+            assert _get(client, '/admin/').status_code == 200
+        assert not [sql for sql in queries if 'FROM users' in sql or 'FROM roles' in sql]
+
+
+class TestInvalidation:
+    """Test that changes reach cached principals"""
+
+    def _as_admin(self, app):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = '2'
+        return client
+
+    def test_role_view_change(self, app):
+        """Renaming a role in the admin panel reloads its users"""
+        client = self._as_admin(app)
+        assert client.get('/admin/').status_code == 200
+        role = db.session.get(Role, 1)
+        client.post(f'/admin/role/edit/?id={role.role_id}', data={'name': 'member'})
+        assert load_principal('1').role_name == 'member'
+
+    def test_user_view_change(self, app):
+        """Editing a user in the admin panel reloads their principal"""
+        client = self._as_admin(app)
+        assert load_principal('1').name == 'Test'
+        client.post('/admin/user/edit/?id=1', data={
+            'name': 'Renamed', 'last_name': 'User', 'email': 'test@example.com',
+            'password': 'password123', 'role': '1'})
+        assert load_principal('1').name == 'Renamed'
+
+    def test_password_reset(self, app, client):
+        """A password reset invalidates cached principals"""
+        load_principal('1')
+        cache = app.extensions['identity_cache']
+        assert len(cache) == 1
+        client.post('/forgot_password', data={'email': 'test@example.com', 'new_password': 'changed'})
+        assert len(cache) == 0
+
+    def test_changes_outside_the_admin_need_ttl(self, app):
+        """Direct database edits are only picked up once the entry expires"""
+        load_principal('1')
+        db.session.get(User, 1).name = 'Direct'
+        db.session.commit()
+        assert load_principal('1').name == 'Test'
+        with patch('app.identity.time.monotonic', return_value=10**9):
+            assert load_principal('1').name == 'Direct'
+
+
+class TestSessionPrincipal:
+    """Test SESSION_PRINCIPAL, the principal carried in the session cookie"""
+
+    @pytest.fixture
+    def signed_in(self, app):
+        app.config['SESSION_PRINCIPAL'] = True
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = '1'
+        _get(client, '/profile')
+        return client
+
+    def _user_queries(self, queries):
+        return [sql for sql in queries if 'FROM users' in sql]
+
+    def test_cold_worker_skips_database(self, app, signed_in, assert_max_queries):
+        """With the cookie principal, an empty identity cache costs no user queries"""
+        with signed_in.session_transaction() as sess:
+            assert sess[SESSION_KEY][2:4] == [1, 'Test']
+        app.extensions['identity_cache'].clear()
+        with assert_max_queries(10) as queries:
+            assert b'Welcome, Test!' in _get(signed_in, '/profile').data
+        assert not self._user_queries(queries)
+
+    def test_password_reset_bumps_epoch(self, app, signed_in):
+        """A reset moves the epoch on, so the cookie principal is reloaded"""
+        app.test_client().post('/forgot_password', data={'email': 'test@example.com', 'new_password': 'changed'})
+        assert db.session.get(User, 1).session_epoch == 1
+        _get(signed_in, '/profile')
+        with signed_in.session_transaction() as sess:
+            assert sess[SESSION_KEY][-1] == 1
+
+    def test_deleted_user_signed_out(self, app, signed_in):
+        """Once a user is deleted their cookie principal is refused"""
+        db.session.execute(db.delete(Booking).where(Booking.user_id == 1))
+        db.session.delete(db.session.get(User, 1))
+        db.session.commit()
+        invalidate(1)
+        response = _get(signed_in, '/profile')
+        assert response.status_code == 302
+        assert '/login' in response.location
+
+    def test_stale_epoch_reloaded(self, app, signed_in):
+        """An epoch bumped outside this worker is noticed once the store forgets the old one"""
+        user = db.session.get(User, 1)
+        bump_session_epoch(user)
+        user.name = 'Elsewhere'
+        db.session.commit()
+        invalidate(1)
+        assert b'Welcome, Elsewhere!' in _get(signed_in, '/profile').data
+
+    def test_logout_drops_principal(self, app, signed_in):
+        """Signing out removes the principal from the cookie"""
+        _get(signed_in, '/logout')
+        with signed_in.session_transaction() as sess:
+            assert SESSION_KEY not in sess
+
+    def test_off_by_default(self, app, authenticated_client):
+        """Without SESSION_PRINCIPAL the cookie carries no principal"""
+        _get(authenticated_client, '/profile')
+        with authenticated_client.session_transaction() as sess:
+            assert SESSION_KEY not in sess
@@ -0,0 +1,133 @@
+"""
+Unit tests for the responsive image pipeline
+"""
+import pytest
+import sys
+import os
+
+# Add the main directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'main'))
+
+PIL = pytest.importorskip('PIL')
+from PIL import Image
+
+from app.images import build_variants, load_manifest, responsive_image, image_srcset, background_image
+
+
+@pytest.fixture
+def static_folder(tmp_path):
+    (tmp_path / 'images' / 'parks').mkdir(parents=True)
+    Image.new('RGB', (1000, 500), 'orange').save(tmp_path / 'images' / 'parks' / 'banner.png')
+    Image.new('RGB', (150, 100), 'purple').save(tmp_path / 'images' / 'thumb.jpg')
+    (tmp_path / 'images' / 'logo.svg').write_text('<svg/>')
+    return tmp_path
+
+
+class TestBuildVariants:
+    """Test generating variants and the manifest"""
+
+    def test_variants_per_width(self, static_folder):
+        """Each original gets one variant per width no larger than itself"""
+        manifest = build_variants(str(static_folder), widths=(320, 640, 1280), formats=['webp'])
+
+        entry = manifest['images/parks/banner.png']
+        assert (entry['width'], entry['height']) == (1000, 500)
+        assert [width for width, _ in entry['variants']['webp']] == [320, 640, 1000]
+        for width, name in entry['variants']['webp']:
+            with Image.open(static_folder / name) as variant:
+                assert variant.format == 'WEBP'
+                assert variant.size == (width, width // 2)
+
+    def test_small_originals_keep_their_size(self, static_folder):
+        """Images narrower than every width get a single same-size variant"""
+        manifest = build_variants(str(static_folder), widths=(320, 640), formats=['webp'])
+        assert [width for width, _ in manifest['images/thumb.jpg']['variants']['webp']] == [150]
+
+    def test_only_raster_images(self, static_folder):
+        """SVGs and previously built variants are not processed"""
+        build_variants(str(static_folder), widths=(320,), formats=['webp'])
+        manifest = build_variants(str(static_folder), widths=(320,), formats=['webp'])
+        assert sorted(manifest) == ['images/parks/banner.png', 'images/thumb.jpg']
+
+    def test_names_change_with_content(self, static_folder):
+        """Variant names carry a hash of the original, so edits get new URLs"""
+        first = build_variants(str(static_folder), widths=(320,), formats=['webp'])
+        Image.new('RGB', (1000, 500), 'black').save(static_folder / 'images' / 'parks' / 'banner.png')
+        second = build_variants(str(static_folder), widths=(320,), formats=['webp'])
+
+        old = first['images/parks/banner.png']['variants']['webp'][0][1]
+        new = second['images/parks/banner.png']['variants']['webp'][0][1]
+        assert old != new
+
+    def test_rebuild_skips_existing(self, static_folder):
+        """Re-running the build leaves existing variants untouched"""
+        manifest = build_variants(str(static_folder), widths=(320,), formats=['webp'])
+        variant = static_folder / manifest['images/thumb.jpg']['variants']['webp'][0][1]
+        os.utime(variant, (0, 0))
+
+        build_variants(str(static_folder), widths=(320,), formats=['webp'])
+
+        assert variant.stat().st_mtime == 0
+
+    def test_manifest_round_trip(self, static_folder):
+        """The manifest written by the build is what load_manifest returns"""
+        manifest = build_variants(str(static_folder), widths=(320,), formats=['webp'])
+        assert load_manifest(str(static_folder)) == manifest
+
+    def test_missing_manifest(self, tmp_path):
+        """Without a build the manifest is empty"""
+        assert load_manifest(str(tmp_path)) == {}
+
+
+class TestHelpers:
+    """Test the Jinja helpers"""
+
+    @pytest.fixture
+    def manifest(self, app, static_folder):
+        manifest = build_variants(str(static_folder), widths=(320, 640), formats=['webp'])
+        app.extensions['image_manifest'] = manifest
+        return manifest
+
+    def test_picture_with_sources(self, app, manifest):
+        """Built images render as a <picture> with a srcset and intrinsic size"""
+        with app.test_request_context():
+            html = responsive_image('images/parks/banner.png', alt='Banner', sizes='100vw', class_='banner-image')
+
+        assert html.startswith('<picture><source type="image/webp"')
+        assert 'srcset="/static/images/variants/parks/banner-' in html
+        assert '-320.webp 320w, ' in html and '-640.webp 640w' in html
+        assert 'sizes="100vw"' in html
+        assert '<img src="/static/images/parks/banner.png" alt="Banner"' in html
+        assert 'class="banner-image"' in html
+        assert 'width="1000" height="500"' in html
+        assert 'loading="lazy"' in html
+
+    def test_fallback_without_variants(self, app, manifest):
+        """Images missing from the manifest render as a plain <img>"""
+        with app.test_request_context():
+            html = responsive_image('images/parks/default.jpg', alt='<Park>')
+        assert html == ('<img src="/static/images/parks/default.jpg" alt="&lt;Park&gt;"'
+                        ' loading="lazy" decoding="async">')
+
+    def test_srcset(self, app, manifest):
+        """image_srcset lists every width, or nothing when not built"""
+        with app.test_request_context():
+            assert image_srcset('images/thumb.jpg').endswith('-150.webp 150w')
+            assert image_srcset('images/missing.jpg') == ''
+
+    def test_background_image(self, app, manifest):
+        """Backgrounds prefer the largest variant and keep the original as a fallback"""
+        with app.test_request_context():
+            css = background_image('images/parks/banner.png')
+            fallback = background_image('images/missing.png')
+        assert css.startswith('image-set(url("/static/images/variants/parks/banner-')
+        assert '-640.webp") type("image/webp")' in css
+        assert css.endswith('url("/static/images/parks/banner.png"))')
+        assert fallback == 'url("/static/images/missing.png")'
+
+    def test_park_page_uses_variants(self, client, manifest):
+        """The park detail page serves its thumbnails from the variants"""
+        manifest['images/parks/witches/gallery/thumb1.jpg'] = manifest['images/thumb.jpg']
+        response = client.get('/parks/1')
+        assert response.status_code == 200
+        assert b'<picture><source type="image/webp"' in response.data
@@ -0,0 +1,195 @@
+"""
+Unit tests for the per-park, per-day ticket inventory
+"""
+import pytest
+import sys
+import os
+from datetime import date, datetime
+from unittest.mock import MagicMock
+
+# Add the main directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'main'))
+
+from app import db
+from app.models import Park, User, Booking, ParkDayCapacity, BookingView
+from app.inventory import reserve, release, remaining, rebuild, sync_capacity, SoldOut
+
+
+class TestReserve:
+    """Test inventory.reserve()"""
+
+    def test_first_reservation_creates_counter(self, app):
+        """The first booking of a day creates the counter row"""
+        with app.app_context():
+            park = Park.query.first()
+            reserve(park.park_id, date(2026, 11, 1), 3)
+            db.session.commit()
+
+            counter = db.session.get(ParkDayCapacity, (park.park_id, date(2026, 11, 1)))
+            assert counter.sold == 3
+            assert counter.capacity == park.daily_capacity
+
+    def test_reservations_accumulate(self, app):
+        """Further reservations bump the same counter"""
+        with app.app_context():
+            park = Park.query.first()
+            reserve(park.park_id, datetime(2026, 11, 1, 10, 0), 2)
+            reserve(park.park_id, datetime(2026, 11, 1, 18, 0), 5)
+            db.session.commit()
+
+            assert remaining(park.park_id, date(2026, 11, 1)) == park.daily_capacity - 7
+
+    def test_oversell_raises_sold_out(self, app):
+        """A reservation that does not fit is rejected and changes nothing"""
+        with app.app_context():
+            park = Park.query.first()
+            park.daily_capacity = 5
+            db.session.commit()
+
+            reserve(park.park_id, date(2026, 11, 2), 4)
+            with pytest.raises(SoldOut):
+                reserve(park.park_id, date(2026, 11, 2), 2)
+            db.session.commit()
+
+            assert remaining(park.park_id, date(2026, 11, 2)) == 1
+
+    def test_days_are_independent(self, app):
+        """Counters are kept per day"""
+        with app.app_context():
+            park = Park.query.first()
+            park.daily_capacity = 2
+            db.session.commit()
+
+            reserve(park.park_id, date(2026, 11, 3), 2)
+            reserve(park.park_id, date(2026, 11, 4), 2)
+            db.session.commit()
+
+            assert remaining(park.park_id, date(2026, 11, 3)) == 0
+            assert remaining(park.park_id, date(2026, 11, 4)) == 0
+
+    def test_unknown_park(self, app):
+        """Reserving for a park that does not exist fails"""
+        with app.app_context():
+            with pytest.raises(LookupError):
+                reserve(99999, date(2026, 11, 1), 1)
+
+
+class TestRelease:
+    """Test inventory.release()"""
+
+    def test_release_returns_tickets(self, app):
+        """Released tickets become available again"""
+        with app.app_context():
+            park = Park.query.first()
+            reserve(park.park_id, date(2026, 11, 5), 4)
+            release(park.park_id, date(2026, 11, 5), 3)
+            db.session.commit()
+
+            assert remaining(park.park_id, date(2026, 11, 5)) == park.daily_capacity - 1
+
+    def test_release_never_goes_negative(self, app):
+        """Releasing more than was sold clamps at zero"""
+        with app.app_context():
+            park = Park.query.first()
+            reserve(park.park_id, date(2026, 11, 6), 1)
+            release(park.park_id, date(2026, 11, 6), 5)
+            db.session.commit()
+
+            counter = db.session.get(ParkDayCapacity, (park.park_id, date(2026, 11, 6)))
+            assert counter.sold == 0
+
+
+class TestCapacityMaintenance:
+    """Test rebuild() and sync_capacity()"""
+
+    def test_rebuild_from_existing_bookings(self, app):
+        """rebuild() recomputes counters from the bookings table"""
+        with app.app_context():
+            park = Park.query.first()
+            user = User.query.first()
+            db.session.add_all([
+                Booking(user_id=user.user_id, park_id=park.park_id, date=datetime(2026, 12, 1, 10), num_tickets=2),
+                Booking(user_id=user.user_id, park_id=park.park_id, date=datetime(2026, 12, 1, 15), num_tickets=3),
+                Booking(user_id=user.user_id, park_id=park.park_id, date=datetime(2026, 12, 2, 10), num_tickets=1),
+            ])
+            db.session.commit()
+
+            assert rebuild() == 2
+            assert db.session.get(ParkDayCapacity, (park.park_id, date(2026, 12, 1))).sold == 5
+            assert db.session.get(ParkDayCapacity, (park.park_id, date(2026, 12, 2))).sold == 1
+
+    def test_rebuild_cli(self, app, runner):
+        """flask inventory rebuild reports the counters it built"""
+        result = runner.invoke(args=['inventory', 'rebuild'])
+        assert result.exit_code == 0
+        assert 'Rebuilt 0' in result.output
+
+    def test_sync_capacity_updates_future_days(self, app):
+        """Changing a park's capacity is applied to upcoming counters only"""
+        with app.app_context():
+            park = Park.query.first()
+            reserve(park.park_id, date(2026, 1, 1), 1)
+            reserve(park.park_id, date(2026, 12, 1), 1)
+            park.daily_capacity = 50
+            sync_capacity(park, from_day=date(2026, 6, 1))
+            db.session.commit()
+
+            assert db.session.get(ParkDayCapacity, (park.park_id, date(2026, 1, 1))).capacity == 500
+            assert db.session.get(ParkDayCapacity, (park.park_id, date(2026, 12, 1))).capacity == 50
+
+
+class TestBookingViewInventory:
+    """Test that admin booking edits keep the counters in step"""
+
+    def test_admin_create_and_delete(self, app):
+        """Creating then deleting a booking from the admin nets out"""
+        with app.app_context():
+            park = Park.query.first()
+            user = User.query.first()
+            view = BookingView(Booking, db.session)
+
+            booking = Booking(user=user, park=park, date=datetime(2026, 11, 10), num_tickets=4)
+            db.session.add(booking)
+            view.on_model_change(MagicMock(), booking, is_created=True)
+            db.session.commit()
+            assert remaining(park.park_id, date(2026, 11, 10)) == park.daily_capacity - 4
+
+            view.on_model_delete(booking)
+            db.session.delete(booking)
+            db.session.commit()
+            assert remaining(park.park_id, date(2026, 11, 10)) == park.daily_capacity
+
+    def test_admin_edit_moves_tickets(self, app):
+        """Moving a booking to another day releases the old day"""
+        with app.app_context():
+            park = Park.query.first()
+            user = User.query.first()
+            booking = Booking(user=user, park=park, date=datetime(2026, 11, 11), num_tickets=2)
+            db.session.add(booking)
+            reserve(park.park_id, booking.date, booking.num_tickets)
+            db.session.commit()
+
+            # Flask-Admin edits a freshly loaded instance
+            booking = db.session.get(Booking, booking.booking_id)
+            booking.date = datetime(2026, 11, 12)
+            booking.num_tickets = 3
+            BookingView(Booking, db.session).on_model_change(MagicMock(), booking, is_created=False)
+            db.session.commit()
+
+            assert remaining(park.park_id, date(2026, 11, 11)) == park.daily_capacity
+            assert remaining(park.park_id, date(2026, 11, 12)) == park.daily_capacity - 3
+
+    def test_admin_oversell_is_a_validation_error(self, app):
+        """Sold-out admin edits surface as form validation errors"""
+        from wtforms.validators import ValidationError
+        with app.app_context():
+            park = Park.query.first()
+            park.daily_capacity = 1
+            user = User.query.first()
+            db.session.commit()
+
+            booking = Booking(user=user, park=park, date=datetime(2026, 11, 13), num_tickets=2)
+            db.session.add(booking)
+            with pytest.raises(ValidationError):
+                BookingView(Booking, db.session).on_model_change(MagicMock(), booking, is_created=True)
+            db.session.rollback()
@@ -0,0 +1,217 @@
+"""
+Unit tests for engine pool options and the metrics endpoint
+"""
+import pytest
+import sys
+import os
+import json
+import subprocess
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+
+# Add the main directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'main'))
+
+from config import engine_options
+from app.metrics import InstrumentedQueuePool, WAIT_BUCKETS, configure_engine_options, publish, register_collector
+
+MYSQL_URL = 'mysql+pymysql://user:pass@db/wwa'
+AUTH = {'Authorization': 'Bearer test-metrics-token'}
+
+
+@pytest.fixture(autouse=True)
+def clean_env(monkeypatch):
+    for name in ('DB_POOL_SIZE', 'DB_MAX_OVERFLOW', 'DB_MAX_CONNECTIONS', 'DB_POOL_TIMEOUT',
+                 'DB_POOL_RECYCLE', 'DB_POOL_PRE_PING', 'GUNICORN_WORKERS', 'GUNICORN_THREADS'):
+        monkeypatch.delenv(name, raising=False)
+
+
+class TestEngineOptions:
+    """Test environment-driven engine options"""
+
+    def test_sqlite_keeps_defaults(self):
+        """SQLite URLs get no pool options"""
+        assert engine_options('sqlite:///flask_app.db') == {}
+        assert engine_options(None) == {}
+
+    def test_server_defaults(self, monkeypatch):
+        """Server databases get one connection per thread, pre-ping and recycling"""
+        monkeypatch.setenv('GUNICORN_THREADS', '6')
+        options = engine_options(MYSQL_URL)
+        assert options == {
+            'pool_size': 6,
+            'max_overflow': 3,
+            'pool_timeout': 10.0,
+            'pool_recycle': 1800,
+            'pool_pre_ping': True,
+        }
+
+    def test_environment_overrides(self, monkeypatch):
+        """Every option can be set from the environment"""
+        monkeypatch.setenv('DB_POOL_SIZE', '10')
+        monkeypatch.setenv('DB_MAX_OVERFLOW', '0')
+        monkeypatch.setenv('DB_POOL_TIMEOUT', '2.5')
+        monkeypatch.setenv('DB_POOL_RECYCLE', '280')
+        monkeypatch.setenv('DB_POOL_PRE_PING', 'false')
+        assert engine_options(MYSQL_URL) == {
+            'pool_size': 10,
+            'max_overflow': 0,
+            'pool_timeout': 2.5,
+            'pool_recycle': 280,
+            'pool_pre_ping': False,
+        }
+
+    def test_connection_budget_split_across_workers(self, monkeypatch):
+        """DB_MAX_CONNECTIONS caps each worker's pool at its share"""
+        monkeypatch.setenv('GUNICORN_WORKERS', '5')
+        monkeypatch.setenv('DB_POOL_SIZE', '4')
+        monkeypatch.setenv('DB_MAX_CONNECTIONS', '25')
+        options = engine_options(MYSQL_URL)
+        assert options['pool_size'] == 4
+        assert options['max_overflow'] == 1
+
+        monkeypatch.setenv('DB_MAX_CONNECTIONS', '10')
+        options = engine_options(MYSQL_URL)
+        assert (options['pool_size'], options['max_overflow']) == (2, 0)
+
+    def test_instrumented_pool_for_server_databases(self, app):
+        """Pool-sized options switch to the instrumented pool"""
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': 4}
+        configure_engine_options(app)
+        assert app.config['SQLALCHEMY_ENGINE_OPTIONS']['poolclass'] is InstrumentedQueuePool
+
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+        configure_engine_options(app)
+        assert 'poolclass' not in app.config['SQLALCHEMY_ENGINE_OPTIONS']
+
+
+class TestInstrumentedQueuePool:
+    """Test the pool's wait-time accounting"""
+
+    @pytest.fixture
+    def engine(self, tmp_path):
+        engine = create_engine(f'sqlite:///{tmp_path / "pool.db"}', poolclass=InstrumentedQueuePool,
+                               pool_size=1, max_overflow=0, pool_timeout=0.2)
+        yield engine
+        engine.dispose()
+
+    def test_records_waits(self, engine):
+        """Every checkout is timed"""
+        with engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+        stats = engine.pool.stats
+        assert stats.wait_count == 1
+        assert stats.timeouts == 0
+
+    def test_records_exhaustion(self, engine):
+        """A checkout that times out is counted along with its wait"""
+        with engine.connect():
+            with pytest.raises(PoolTimeout):
+                engine.connect()
+        stats = engine.pool.stats
+        assert stats.timeouts == 1
+        # The 0.2s wait lands in the (0.1, 0.5] bucket
+        assert stats.wait_buckets[WAIT_BUCKETS.index(0.5)] == 1
+
+    def test_stats_survive_dispose(self, engine):
+        """Recreating the pool (as after a fork) keeps its counters"""
+        with engine.connect():
+            pass
+        stats = engine.pool.stats
+        engine.dispose()
+        assert engine.pool.stats is stats
+
+
+class TestMetricsEndpoint:
+    """Test GET /metrics"""
+
+    def test_pool_metrics(self, client):
+        """The endpoint exposes pool counters in the Prometheus text format"""
+        client.get('/')
+        response = client.get('/metrics', headers=AUTH)
+        assert response.status_code == 200
+        assert response.content_type.startswith('text/plain; version=0.0.4')
+        body = response.get_data(as_text=True)
+        assert '# TYPE db_pool_checkouts_total counter' in body
+        assert f'db_pool_checkouts_total{{bind="default",pid="{os.getpid()}"}}' in body
+        assert '# TYPE db_pool_wait_seconds histogram' in body
+        assert f'db_pool_wait_seconds_bucket{{bind="default",le="0.001",pid="{os.getpid()}"}}' in body
+        assert body.count('# TYPE db_pool_wait_seconds histogram') == 1
+
+    def test_samples_grouped_by_metric(self, app, client):
+        """Samples of one metric stay together under a single TYPE line"""
+        register_collector(app, lambda app: [('demo_total', 'counter', {'kind': 'a'}, 1),
+                                             ('other', 'gauge', {}, 2),
+                                             ('demo_total', 'counter', {'kind': 'b'}, 3)])
+        lines = client.get('/metrics', headers=AUTH).get_data(as_text=True).splitlines()
+        start = lines.index('# TYPE demo_total counter')
+        assert lines[start + 1].startswith('demo_total{kind="a"')
+        assert lines[start + 2].startswith('demo_total{kind="b"')
+        assert lines.count('# TYPE demo_total counter') == 1
+
+    def test_closed_without_token(self, app, client):
+        """Without METRICS_TOKEN nobody can scrape"""
+        app.config['METRICS_TOKEN'] = None
+        assert client.get('/metrics').status_code == 401
+        assert client.get('/metrics', headers={'Authorization': 'Bearer '}).status_code == 401
+
+    def test_token_required_when_configured(self, app, client):
+        """With METRICS_TOKEN set, scrapes must present it"""
+        app.config['METRICS_TOKEN'] = 'scrape-secret'
+        assert client.get('/metrics').status_code == 401
+        assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+        response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'})
+        assert response.status_code == 200
+
+
+class TestSharedMetrics:
+    """Test METRICS_DIR, where workers share their samples"""
+
+    def test_scrape_covers_every_live_worker(self, app, client, tmp_path):
+        """A scrape returns this worker's samples and those other live workers published"""
+        app.config['METRICS_DIR'] = str(tmp_path)
+        register_collector(app, lambda app: [('demo_total', 'counter', {}, 1)])
+        other = subprocess.Popen(['sleep', '30'])
+        try:
+            with open(tmp_path / f'{other.pid}.json', 'w') as f:
+                json.dump([['demo_total', 'counter', {'pid': str(other.pid)}, 5]], f)
+            body = client.get('/metrics', headers=AUTH).get_data(as_text=True)
+        finally:
+            other.kill()
+            other.wait()
+        assert f'demo_total{{pid="{os.getpid()}"}} 1' in body
+        assert f'demo_total{{pid="{other.pid}"}} 5' in body
+        assert body.count('# TYPE demo_total counter') == 1
+
+        # Once that worker is gone its samples are dropped
+        body = client.get('/metrics', headers=AUTH).get_data(as_text=True)
+        assert f'pid="{other.pid}"' not in body
+        assert sorted(os.listdir(tmp_path)) == [f'{os.getpid()}.json']
+
+    def test_publish(self, app, tmp_path):
+        """publish() writes this process's samples, labelled with its pid"""
+        app.config['METRICS_DIR'] = str(tmp_path)
+        register_collector(app, lambda app: [('demo_total', 'counter', {'kind': 'a'}, 2)])
+        publish(app)
+        with open(tmp_path / f'{os.getpid()}.json') as f:
+            samples = json.load(f)
+        assert ['demo_total', 'counter', {'kind': 'a', 'pid': str(os.getpid())}, 2] in samples
+
+    def test_publisher_thread(self, tmp_path):
+        """With METRICS_DIR configured, each worker publishes from a thread and cleans up on exit"""
+        from unittest.mock import patch
+        from app import create_app
+        from app.metrics import start_publisher, stop_publisher
+        from config import TestingConfig
+
+        with patch.multiple(TestingConfig, METRICS_DIR=str(tmp_path / 'metrics'), METRICS_PUBLISH_INTERVAL=60):
+            app = create_app('testing')
+        path = tmp_path / 'metrics' / f'{os.getpid()}.json'
+        with patch('app.metrics.threading.Thread') as thread:
+            thread.return_value.start.side_effect = lambda: publish(app)
+            start_publisher(app)
+            start_publisher(app)
+        thread.assert_called_once()
+        assert path.exists()
+        stop_publisher(app)
+        assert not path.exists()
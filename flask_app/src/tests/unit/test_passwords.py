@@ -0,0 +1,105 @@
+"""
+Unit tests for the password policy and hash upgrades
+"""
+import pytest
+import sys
+import os
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash
+
+# Add the main directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'main'))
+
+from app import db
+from app.models import User
+from app.passwords import canonical_method, needs_rehash, passwords_cli, tune
+
+# Cheap enough for tests
+SCRYPT = 'scrypt:1024:8:1'
+
+
+class TestPolicy:
+    """Test method strings and outdated-hash detection"""
+
+    def test_canonical_method(self):
+        """Defaults are filled in as Werkzeug records them"""
+        assert canonical_method('scrypt') == 'scrypt:32768:8:1'
+        assert canonical_method('scrypt:65536') == 'scrypt:65536:8:1'
+        assert canonical_method('pbkdf2') == f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}'
+        assert canonical_method('pbkdf2:sha512:600000') == 'pbkdf2:sha512:600000'
+
+    def test_unsupported_method(self):
+        """Unknown methods fail loudly"""
+        with pytest.raises(ValueError):
+            canonical_method('argon2')
+        with pytest.raises(ValueError):
+            canonical_method('scrypt:1:2:3:4')
+
+    def test_needs_rehash(self, app):
+        """Hashes made by another method or with other parameters are outdated"""
+        user = User.query.filter_by(email='test@example.com').first()
+        assert not needs_rehash(user.password)
+        app.config['PASSWORD_HASH_METHOD'] = SCRYPT
+        assert needs_rehash(user.password)
+        app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:600000'
+        assert needs_rehash(user.password)
+
+    def test_tune(self):
+        """Tuning returns a usable method within the memory limit"""
+        method, elapsed = tune(target_ms=1, kind='scrypt', max_memory_mb=1)
+        assert method.startswith('scrypt:') and int(method.split(':')[1]) <= 1024
+        method, elapsed = tune(target_ms=5, kind='pbkdf2')
+        assert method.startswith('pbkdf2:sha256:') and elapsed > 0
+
+
+class TestUpgradeOnLogin:
+    """Test that outdated hashes are replaced after a successful login"""
+
+    def _login(self, client, password):
+        return client.post('/login', data={'email': 'test@example.com', 'password': password})
+
+    def test_outdated_hash_upgraded(self, app, client):
+        """A pbkdf2 hash becomes an scrypt hash and keeps working"""
+        app.config['PASSWORD_HASH_METHOD'] = SCRYPT
+        assert self._login(client, 'password123').status_code == 302
+        app.extensions['password_rehash'].drain()
+
+        db.session.expire_all()
+        user = User.query.filter_by(email='test@example.com').first()
+        assert user.password.startswith(SCRYPT + '$')
+        assert check_password_hash(user.password, 'password123')
+        assert self._login(app.test_client(), 'password123').location.endswith('/profile')
+
+    def test_failed_login_not_upgraded(self, app, client):
+        """A wrong password never triggers a rehash"""
+        app.config['PASSWORD_HASH_METHOD'] = SCRYPT
+        self._login(client, 'wrong')
+        app.extensions['password_rehash'].drain()
+        db.session.expire_all()
+        assert User.query.filter_by(email='test@example.com').first().password.startswith('pbkdf2:')
+
+    def test_changed_password_not_overwritten(self, app):
+        """A rehash of a hash that has since changed is dropped"""
+        user = User.query.filter_by(email='test@example.com').first()
+        app.extensions['password_rehash'].submit(user.user_id, 'stale-hash', 'password123').result()
+        db.session.expire_all()
+        assert User.query.filter_by(email='test@example.com').first().password.startswith('pbkdf2:')
+
+    def test_new_hashes_use_policy(self, app, client):
+        """Registration stores hashes made with the current method"""
+        app.config['PASSWORD_HASH_METHOD'] = SCRYPT
+        client.post('/register', data={'email': 'new@example.com', 'name': 'New',
+                                       'last_name': 'User', 'password': 'secret'})
+        assert User.query.filter_by(email='new@example.com').first().password.startswith(SCRYPT + '$')
+
+
+class TestStatusCommand:
+    """Test flask passwords status"""
+
+    def test_counts_outdated(self, app):
+        """Hashes not made with the current method are flagged"""
+        app.config['PASSWORD_HASH_METHOD'] = SCRYPT
+        result = app.test_cli_runner().invoke(passwords_cli, ['status'])
+        assert result.exit_code == 0
+        assert f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}' in result.output
+        assert '(outdated)' in result.output
+        assert f'Current method: {SCRYPT}' in result.output
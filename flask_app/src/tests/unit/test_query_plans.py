@@ -0,0 +1,118 @@
+"""
+Query-plan tests for the hot query paths, and the schema upgrade that
+delivers the indexes to existing databases
+"""
+import sys
+import os
+from datetime import datetime
+
+# Add the main directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'main'))
+
+from sqlalchemy import func, inspect, select
+from app import db
+from app.models import User, Booking, Message
+from app.schema import upgrade
+
+
+def _query_plan(stmt):
+    """Return the EXPLAIN QUERY PLAN detail lines for a SQLAlchemy statement"""
+    compiled = stmt.compile(dialect=db.engine.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    with db.engine.connect() as connection:
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params).all()
+    return [row[-1] for row in rows]
+
+
+def _assert_uses_index(plan, table):
+    """Every access to `table` must go through an index, with no sort step"""
+    accesses = [line for line in plan if f' {table}' in line]
+    assert accesses, plan
+    for line in accesses:
+        assert 'USING' in line and 'INDEX' in line, plan
+    assert not any('TEMP B-TREE' in line for line in plan), plan
+
+
+class TestHotQueryPlans:
+    """Each hot query must be answered from an index, not a full scan"""
+
+    def test_user_by_email(self, app):
+        """login_post / register_post / forgot_password_submit lookup"""
+        with app.app_context():
+            plan = _query_plan(select(User).where(User.email == 'test@example.com'))
+            _assert_uses_index(plan, 'users')
+
+    def test_user_bookings_by_date(self, app):
+        """Profile page: a user's bookings in date order"""
+        with app.app_context():
+            stmt = select(Booking).where(Booking.user_id == 1).order_by(Booking.date, Booking.booking_id)
+            _assert_uses_index(_query_plan(stmt), 'bookings')
+
+    def test_user_booking_count(self, app):
+        """Profile page: total bookings counter"""
+        with app.app_context():
+            stmt = select(func.count()).select_from(Booking).where(Booking.user_id == 1)
+            _assert_uses_index(_query_plan(stmt), 'bookings')
+
+    def test_park_bookings_for_day(self, app):
+        """Per-park, per-day booking lookups"""
+        with app.app_context():
+            stmt = select(Booking).where(
+                Booking.park_id == 1,
+                Booking.date >= datetime(2026, 11, 1),
+                Booking.date < datetime(2026, 11, 2)
+            )
+            _assert_uses_index(_query_plan(stmt), 'bookings')
+
+    def test_messages_newest_first(self, app):
+        """MessageView default sort (created_at DESC)"""
+        with app.app_context():
+            stmt = select(Message).order_by(Message.created_at.desc()).limit(20)
+            _assert_uses_index(_query_plan(stmt), 'messages')
+
+
+class TestSchemaUpgrade:
+    """Test schema.upgrade() on a database created by an older release"""
+
+    def test_upgrade_restores_missing_indexes_columns_and_tables(self, app):
+        """Missing indexes, columns and tables are created"""
+        with app.app_context():
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql('DROP INDEX ix_bookings_user_date')
+                connection.exec_driver_sql('DROP INDEX ix_messages_created_at')
+                connection.exec_driver_sql('DROP TABLE park_day_capacity')
+                connection.exec_driver_sql('ALTER TABLE parks DROP COLUMN daily_capacity')
+
+            changes = upgrade()
+
+            assert 'index ix_bookings_user_date' in changes
+            assert 'index ix_messages_created_at' in changes
+            assert 'table park_day_capacity' in changes
+            assert 'column parks.daily_capacity' in changes
+
+            inspector = inspect(db.engine)
+            assert 'ix_bookings_user_date' in {i['name'] for i in inspector.get_indexes('bookings')}
+            assert 'daily_capacity' in {c['name'] for c in inspector.get_columns('parks')}
+            with db.engine.connect() as connection:
+                capacities = connection.exec_driver_sql('SELECT daily_capacity FROM parks').scalars().all()
+            assert capacities == [500, 500, 500]
+
+    def test_upgrade_is_idempotent(self, app):
+        """Running upgrade on an up-to-date schema changes nothing"""
+        with app.app_context():
+            assert upgrade() == []
+
+    def test_no_duplicate_email_index(self, app):
+        """users.email is indexed once, by its unique constraint"""
+        with app.app_context():
+            inspector = inspect(db.engine)
+            indexes = inspector.get_indexes('users') + inspector.get_unique_constraints('users')
+            assert any(i['column_names'] == ['email'] for i in indexes)
+            assert 'ix_users_email' not in {i['name'] for i in inspector.get_indexes('users')}
+            assert upgrade() == []
+
+    def test_upgrade_cli(self, runner):
+        """flask schema upgrade reports success"""
+        result = runner.invoke(args=['schema', 'upgrade'])
+        assert result.exit_code == 0
+        assert 'Schema up to date' in result.output
@@ -0,0 +1,133 @@
+"""
+Unit tests for the sign-in rate limits
+"""
+import pytest
+import sys
+import os
+from unittest.mock import patch
+
+# Add the main directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'main'))
+
+from app.cache import MemoryStore, SQLiteStore
+from app.ratelimit import SlidingWindow, take_token
+
+NOW = 1_000_000.0
+
+
+class TestTokenBucket:
+    """Test take_token()"""
+
+    def test_burst_then_refill(self):
+        """A full bucket allows a burst, then refills at the configured rate"""
+        store = MemoryStore()
+        assert [take_token(store, 'k', 3, 60, now=NOW) for _ in range(3)] == [0, 0, 0]
+        assert take_token(store, 'k', 3, 60, now=NOW) == pytest.approx(1.0)
+        assert take_token(store, 'k', 3, 60, now=NOW + 1) == 0
+
+    def test_never_exceeds_burst(self):
+        """An idle bucket holds at most `burst` tokens"""
+        store = MemoryStore()
+        take_token(store, 'k', 2, 60, now=NOW)
+        assert [take_token(store, 'k', 2, 60, now=NOW + 3600) for _ in range(3)][-1] > 0
+
+    def test_shared_through_sqlite_store(self, tmp_path):
+        """Workers using the same SQLite store share one bucket"""
+        path = str(tmp_path / 'cache.db')
+        first, second = SQLiteStore(path), SQLiteStore(path)
+        assert take_token(first, 'k', 2, 60, now=NOW) == 0
+        assert take_token(second, 'k', 2, 60, now=NOW) == 0
+        assert take_token(first, 'k', 2, 60, now=NOW) > 0
+
+
+class TestSlidingWindow:
+    """Test the two-window approximation"""
+
+    def test_previous_window_weighted(self):
+        """Half-way through a window, the previous one counts half"""
+        window = SlidingWindow(MemoryStore(), 'w', 100)
+        for _ in range(4):
+            window.add('a', now=NOW + 50)
+        assert window.count('a', now=NOW + 50) == 4
+        assert window.count('a', now=NOW + 150) == pytest.approx(2)
+        assert window.count('a', now=NOW + 250) == 0
+        assert window.count('b', now=NOW + 50) == 0
+
+
+class TestAuthLimits:
+    """Test the limits applied to the auth blueprint"""
+
+    def _login(self, client, password='wrong', email='test@example.com'):
+        return client.post('/login', data={'email': email, 'password': password})
+
+    def test_ip_bucket(self, app, client):
+        """Form POSTs from one address are throttled; other addresses and GETs are not"""
+        app.config['RATELIMIT_IP_BURST'] = 3
+        assert [self._login(client, email=f'u{n}@example.com').status_code for n in range(3)] == [302] * 3
+        response = self._login(client, email='u4@example.com')
+        assert response.status_code == 429
+        assert int(response.headers['Retry-After']) >= 1
+        assert client.get('/login').status_code == 200
+
+        other = app.test_client()
+        other.environ_base['REMOTE_ADDR'] = '10.0.0.2'
+        assert self._login(other).status_code == 302
+
+    @pytest.mark.parametrize('hops, separate', [(0, False), (1, True)])
+    def test_clients_behind_proxy(self, hops, separate):
+        """With TRUSTED_PROXY_HOPS, visitors behind one proxy get their own buckets"""
+        from app import create_app, db
+        from config import TestingConfig
+
+        with patch.multiple(TestingConfig, TRUSTED_PROXY_HOPS=hops, RATELIMIT_IP_BURST=1, WTF_CSRF_ENABLED=False):
+            app = create_app('testing')
+        with app.app_context():
+            db.create_all()
+        client = app.test_client()
+
+        def login(client_ip):
+            return client.post('/login', data={'email': 'x@example.com', 'password': 'wrong'},
+                               environ_base={'REMOTE_ADDR': '10.0.0.1'},
+                               headers={'X-Forwarded-For': client_ip}).status_code
+
+        assert login('203.0.113.1') == 302
+        assert login('203.0.113.2') == (302 if separate else 429)
+        assert login('203.0.113.1') == 429
+
+    def test_email_window_stops_verification(self, app, client):
+        """After too many failures an account is refused without checking the password"""
+        app.config['RATELIMIT_EMAIL_ATTEMPTS'] = 3
+        for _ in range(3):
+            self._login(client)
+        service = app.extensions['password_hashing']
+        verified = service.stats.jobs['verify']
+
+        assert self._login(client, password='password123').status_code == 429
+        assert service.stats.jobs['verify'] == verified
+        # Other accounts can still sign in
+        assert self._login(client, password='admin123', email='admin@example.com').status_code == 302
+
+    def test_successful_logins_not_counted(self, app, client):
+        """Only failed logins count against an address"""
+        app.config['RATELIMIT_EMAIL_ATTEMPTS'] = 2
+        for _ in range(3):
+            assert self._login(app.test_client(), password='password123').status_code == 302
+
+    def test_password_resets_counted(self, app, client):
+        """Password reset submissions count against the address"""
+        app.config['RATELIMIT_EMAIL_ATTEMPTS'] = 2
+        data = {'email': 'TEST@example.com', 'new_password': 'changed'}
+        assert [client.post('/forgot_password', data=data).status_code for _ in range(3)] == [302, 302, 429]
+
+    def test_disabled(self, app, client):
+        """RATELIMIT_ENABLED=False turns both limits off"""
+        app.config.update(RATELIMIT_ENABLED=False, RATELIMIT_IP_BURST=1, RATELIMIT_EMAIL_ATTEMPTS=1)
+        assert [self._login(client).status_code for _ in range(3)] == [302] * 3
+
+    def test_rejections_in_metrics(self, app, client):
+        """Rejections are counted per limit on /metrics"""
+        app.config['RATELIMIT_IP_BURST'] = 1
+        self._login(client)
+        self._login(client)
+        body = client.get('/metrics', headers={'Authorization': 'Bearer test-metrics-token'}).get_data(as_text=True)
+        assert f'ratelimit_rejected_total{{limit="ip",pid="{os.getpid()}"}} 1' in body
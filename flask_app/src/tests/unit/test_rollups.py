@@ -0,0 +1,191 @@
+"""
+Unit tests for the booking rollups and the admin dashboard
+"""
+import pytest
+import sys
+import os
+import io
+from datetime import date, datetime
+from unittest.mock import MagicMock
+from flask import g
+
+# Add the main directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'main'))
+
+from app import db
+from app.bulk import import_bookings, read_rows
+from app.models import Booking, BookingDailyRollup, BookingUserRollup, BookingView, Park, User
+from app.rollups import compact, dashboard, record
+
+
+def _day(park_id, day):
+    row = db.session.get(BookingDailyRollup, (park_id, day))
+    return row and (row.bookings, row.tickets, row.health_safety)
+
+
+def _user(user_id):
+    row = db.session.get(BookingUserRollup, user_id)
+    return row and (row.bookings, row.tickets)
+
+
+def _insert_bookings(rows):
+    """Bookings written behind the rollups' back, as SQL run by hand would."""
+    db.session.execute(db.insert(Booking), [
+        dict(user_id=user_id, park_id=park_id, date=datetime.combine(day, datetime.min.time()),
+             num_tickets=tickets, health_safety=health_safety)
+        for user_id, park_id, day, tickets, health_safety in rows])
+    db.session.commit()
+
+
+class TestRecord:
+    """Test rollups.record()"""
+
+    def test_booking_form_updates_rollups(self, app, authenticated_client):
+        """A booking made through the form is counted straight away"""
+        authenticated_client.post('/booking', data={
+            'park_id': '1', 'date': '2030-05-01', 'num_tickets': '3', 'health_safety': 'on'})
+        authenticated_client.post('/booking', data={'park_id': '1', 'date': '2030-05-01', 'num_tickets': '2'})
+        assert _day(1, date(2030, 5, 1)) == (2, 5, 1)
+        assert _user(1) == (2, 5)
+
+    def test_one_update_per_day_and_user(self, app, assert_max_queries):
+        """Many bookings for one park/day and user cost one statement each once the rows exist"""
+        bookings = [dict(park_id=1, user_id=1, date=datetime(2030, 5, 1, 10), num_tickets=1)] * 50
+        record(bookings)
+        db.session.commit()
+        with assert_max_queries(2):
+            record(bookings)
+        db.session.commit()
+        assert _day(1, date(2030, 5, 1)) == (100, 100, 0)
+
+    def test_negative_sign_takes_off(self, app):
+        """sign=-1 undoes what was recorded"""
+        booking = dict(park_id=2, user_id=1, date=date(2030, 5, 1), num_tickets=4, health_safety=True)
+        record([booking])
+        record([booking], sign=-1)
+        db.session.commit()
+        assert _day(2, date(2030, 5, 1)) == (0, 0, 0)
+        assert _user(1) == (0, 0)
+
+    def test_bulk_import_updates_rollups(self, app):
+        """Imported rows are counted in the same batch"""
+        text = ("user_email,park_slug,date,num_tickets,health_safety\n"
+                "test@example.com,park-1-dublin,2030-05-01,2,yes\n"
+                "admin@example.com,park-1-dublin,2030-05-01,1,\n")
+        assert import_bookings(read_rows(io.StringIO(text), 'csv')).imported == 2
+        assert _day(1, date(2030, 5, 1)) == (2, 3, 1)
+        assert _user(2) == (1, 1)
+
+    def test_admin_edit_moves_totals(self, app):
+        """Editing a booking in the admin moves it between days and users"""
+        park, user = db.session.get(Park, 1), db.session.get(User, 1)
+        booking = Booking(user=user, park=park, date=datetime(2030, 5, 1), num_tickets=2, health_safety=True)
+        db.session.add(booking)
+        view = BookingView(Booking, db.session)
+        view.on_model_change(MagicMock(), booking, is_created=True)
+        db.session.commit()
+
+        # Flask-Admin edits a freshly loaded instance
+        booking, admin = db.session.get(Booking, booking.booking_id), db.session.get(User, 2)
+        booking.date = datetime(2030, 5, 2)
+        booking.num_tickets = 3
+        booking.user = admin
+        view.on_model_change(MagicMock(), booking, is_created=False)
+        db.session.commit()
+        assert _day(1, date(2030, 5, 1)) == (0, 0, 0)
+        assert _day(1, date(2030, 5, 2)) == (1, 3, 1)
+        assert (_user(1), _user(2)) == ((0, 0), (1, 3))
+
+        view.on_model_delete(booking)
+        db.session.delete(booking)
+        db.session.commit()
+        assert _day(1, date(2030, 5, 2)) == (0, 0, 0)
+
+
+class TestCompact:
+    """Test rollups.compact()"""
+
+    def test_rebuilds_from_bookings(self, app):
+        """Bookings the rollups missed are picked up"""
+        _insert_bookings([(1, 1, date(2030, 5, 1), 2, True), (1, 1, date(2030, 5, 1), 1, False),
+                          (2, 3, date(2030, 5, 2), 5, False)])
+        assert compact() == 2
+        assert _day(1, date(2030, 5, 1)) == (2, 3, 1)
+        assert _day(3, date(2030, 5, 2)) == (1, 5, 0)
+        assert (_user(1), _user(2)) == ((2, 3), (1, 5))
+
+    def test_window_leaves_older_days(self, app):
+        """A windowed run only rewrites days from `since` onwards"""
+        record([dict(park_id=1, user_id=1, date=date(2030, 4, 1), num_tickets=7)])
+        db.session.commit()
+        _insert_bookings([(1, 1, date(2030, 5, 1), 2, False)])
+        assert compact(since=date(2030, 4, 15)) == 1
+        assert _day(1, date(2030, 4, 1)) == (1, 7, 0)
+        assert _day(1, date(2030, 5, 1)) == (1, 2, 0)
+
+    def test_window_only_recounts_its_users(self, app, assert_max_queries):
+        """A windowed run recounts the users who booked in the window, and no others"""
+        _insert_bookings([(1, 1, date(2030, 4, 1), 3, False), (1, 1, date(2030, 5, 1), 2, False)])
+        record([dict(park_id=1, user_id=2, date=date(2030, 4, 1), num_tickets=9)])
+        db.session.commit()
+        with assert_max_queries(6) as queries:
+            compact(since=date(2030, 4, 15))
+        assert (_user(1), _user(2)) == ((2, 5), (1, 9))
+        # Every read of bookings is bounded by the window
+        reads = [sql for sql in queries if 'FROM bookings' in sql]
+        assert reads and all('bookings.date >=' in sql for sql in reads)
+
+    def test_drops_stale_rows(self, app):
+        """Rows for bookings that no longer exist are removed"""
+        record([dict(park_id=1, user_id=1, date=date(2030, 5, 1), num_tickets=7)])
+        db.session.commit()
+        assert compact() == 0
+        assert BookingDailyRollup.query.count() == 0
+        assert BookingUserRollup.query.count() == 0
+
+    def test_cli(self, app, runner):
+        """`flask rollups compact --all` rebuilds every day"""
+        _insert_bookings([(1, 1, date(2020, 1, 1), 2, False)])
+        result = runner.invoke(args=['rollups', 'compact', '--all'])
+        assert 'Rebuilt 1 park/day rollup(s)' in result.output
+        assert _day(1, date(2020, 1, 1)) == (1, 2, 0)
+
+
+class TestDashboard:
+    """Test rollups.dashboard() and the admin landing page"""
+
+    def test_reads_only_rollups(self, app, assert_max_queries):
+        """The dashboard is a handful of small queries, none of them on bookings"""
+        record([dict(park_id=1, user_id=1, date=date(2030, 5, 1), num_tickets=3, health_safety=True),
+                dict(park_id=2, user_id=2, date=date(2030, 5, 2), num_tickets=6)])
+        db.session.commit()
+        with assert_max_queries(4) as queries:
+            stats = dashboard(date(2030, 5, 1), date(2030, 5, 2))
+        assert not [sql for sql in queries if 'bookings' in sql.replace('.bookings', '')]
+        assert stats['days'] == [date(2030, 5, 1), date(2030, 5, 2)]
+        assert [park['tickets'] for park in stats['parks']] == [[3, 0], [0, 6], [0, 0]]
+        assert stats['bookings'] == 2
+        assert stats['health_safety_rate'] == 0.5
+        assert [(c.email, c.tickets) for c in stats['top_customers']] == [
+            ('admin@example.com', 6), ('test@example.com', 3)]
+
+    def test_empty_window(self, app):
+        """No bookings means no opt-in rate rather than a division by zero"""
+        stats = dashboard(date(2030, 5, 1), date(2030, 5, 1))
+        assert stats['bookings'] == 0
+        assert stats['health_safety_rate'] is None
+
+    @pytest.mark.parametrize('days, shown', [(None, 14), ('3', 3), ('1000', 92)])
+    def test_admin_page(self, app, days, shown):
+        """The admin landing page shows the dashboard for the requested window"""
+        record([dict(park_id=1, user_id=1, date=date.today(), num_tickets=4)])
+        db.session.commit()
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = '2'
+        g.pop('_login_user', None)
+        response = client.get('/admin/', query_string={'days': days} if days else {})
+        html = response.get_data(as_text=True)
+        assert response.status_code == 200
+        assert f'Next {shown} day(s)' in html
+        assert '<td>4</td>' in html and 'test@example.com' in html
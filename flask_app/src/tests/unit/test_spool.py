@@ -0,0 +1,152 @@
+"""
+Unit tests for the contact-form write-behind spool
+"""
+import pytest
+import sys
+import os
+from unittest.mock import patch
+
+# Add the main directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'main'))
+
+from app import db
+from app.models import Message
+from app.spool import LEASE_SECONDS, MessageSpool
+
+NOW = 1_000_000.0
+
+
+@pytest.fixture
+def spool(app, tmp_path):
+    spool = MessageSpool(str(tmp_path / 'spool.db'))
+    app.extensions['contact_spool'] = spool
+    yield spool
+    app.extensions.pop('contact_spool')
+
+
+class TestMessageSpool:
+    """Test MessageSpool on its own"""
+
+    def test_leased_rows_not_taken_twice(self, tmp_path):
+        """A second worker can't take rows another is flushing until the lease ends"""
+        path = str(tmp_path / 'spool.db')
+        first, second = MessageSpool(path), MessageSpool(path)
+        for n in range(3):
+            first.append(f'N{n}', 'a@example.com', 'hi')
+        assert len(first.take(2, now=NOW)) == 2
+        assert [fields['name'] for _, _, fields in second.take(10, now=NOW)] == ['N2']
+        assert second.take(10, now=NOW) == []
+        assert len(second.take(10, now=NOW + LEASE_SECONDS)) == 3
+
+    def test_retry_backs_off(self, tmp_path):
+        """Each failed attempt doubles the wait"""
+        spool = MessageSpool(str(tmp_path / 'spool.db'))
+        spool.append('Ann', 'a@example.com', 'hi')
+        rows = spool.take(10, now=NOW)
+        spool.retry(rows, now=NOW)
+        assert spool.take(10, now=NOW + 0.5) == []
+        rows = spool.take(10, now=NOW + 1)
+        assert rows[0][1] == 1
+        spool.retry(rows, now=NOW + 1)
+        assert spool.take(10, now=NOW + 2) == []
+        assert spool.take(10, now=NOW + 3) != []
+
+
+class TestFlush:
+    """Test moving spooled messages into the database"""
+
+    def test_contact_form_spools(self, app, client, spool):
+        """The form only appends to the spool; a flush inserts in one batch"""
+        response = client.post('/contact', data={'name': 'Ann', 'email': 'ann@example.com', 'message': 'Hello'})
+        assert response.status_code == 302
+        assert spool.pending() == 1
+        assert Message.query.count() == 0
+
+        assert spool.flush() == 1
+        message = Message.query.one()
+        assert (message.name, message.email, message.message) == ('Ann', 'ann@example.com', 'Hello')
+        assert message.created_at is not None
+        assert spool.pending() == 0
+
+    def test_batches(self, app, spool, assert_max_queries):
+        """Messages are inserted batch_size at a time, one executemany each"""
+        for n in range(5):
+            spool.append(f'N{n}', 'a@example.com', 'hi')
+        with assert_max_queries(5) as queries:
+            assert spool.flush(batch_size=2) == 5
+        assert len([sql for sql in queries if sql.startswith('INSERT INTO messages')]) == 3
+        assert Message.query.count() == 5
+
+    def test_failed_flush_kept_for_retry(self, app, spool):
+        """A database error leaves the messages in the spool"""
+        spool.append('Ann', 'ann@example.com', 'Hello')
+        with patch.object(db.session, 'commit', side_effect=RuntimeError('database is locked')):
+            assert spool.flush(now=NOW) == 0
+        assert spool.pending() == 1 and spool.failures == 1
+        assert spool.flush(now=NOW + 1) == 1
+        assert Message.query.count() == 1
+
+    def test_cli(self, app, runner, spool):
+        """`flask contact flush` drains the spool"""
+        spool.append('Ann', 'ann@example.com', 'Hello')
+        assert '1 message(s) spooled' in runner.invoke(args=['contact', 'status']).output
+        result = runner.invoke(args=['contact', 'flush'])
+        assert 'Flushed 1 message(s); 0 still spooled.' in result.output
+        assert Message.query.count() == 1
+
+    def test_unconfigured(self, app, client, runner):
+        """Without CONTACT_SPOOL_PATH messages are stored directly"""
+        client.post('/contact', data={'name': 'Ann', 'email': 'ann@example.com', 'message': 'Hello'})
+        assert Message.query.count() == 1
+        assert 'CONTACT_SPOOL_PATH is not set' in runner.invoke(args=['contact', 'status']).output
+
+
+class TestConfigured:
+    """Test an app created with CONTACT_SPOOL_PATH set"""
+
+    def _create_app(self, **settings):
+        from app import create_app
+        from config import TestingConfig
+
+        with patch.multiple(TestingConfig, **settings):
+            return create_app('testing')
+
+    def test_spool_and_metrics(self, tmp_path):
+        """The spool is opened at start-up and its depth is on /metrics"""
+        path = str(tmp_path / 'spool.db')
+        app = self._create_app(CONTACT_SPOOL_PATH=path, CONTACT_SPOOL_INTERVAL=0)
+        assert app.extensions['contact_spool'].path == path
+        assert 'contact_spool_flusher' not in app.extensions
+        app.extensions['contact_spool'].append('Ann', 'ann@example.com', 'Hello')
+        body = app.test_client().get('/metrics', headers={'Authorization': 'Bearer test-metrics-token'}).get_data(as_text=True)
+        assert f'contact_spool_pending{{pid="{os.getpid()}"}} 1' in body
+
+    def test_flusher_started_on_first_message(self, tmp_path):
+        """With an interval, the first spooled message starts the flusher thread"""
+        app = self._create_app(CONTACT_SPOOL_PATH=str(tmp_path / 'spool.db'), CONTACT_SPOOL_INTERVAL=60)
+        flusher = app.extensions['contact_spool_flusher']
+        with patch('app.spool.threading.Thread') as thread:
+            with app.test_request_context():
+                from app.spool import submit_message
+                submit_message('Ann', 'ann@example.com', 'Hello')
+                submit_message('Bob', 'bob@example.com', 'Hello')
+        thread.assert_called_once()
+        assert flusher._pid == os.getpid()
+        flusher.stop()
+
+    def test_worker_boot_and_exit(self, tmp_path):
+        """start_flusher() runs the thread at worker boot; stop_flusher() drains the spool"""
+        from app.spool import start_flusher, stop_flusher
+
+        app = self._create_app(CONTACT_SPOOL_PATH=str(tmp_path / 'spool.db'), CONTACT_SPOOL_INTERVAL=60)
+        with app.app_context():
+            db.create_all()
+        app.extensions['contact_spool'].append('Ann', 'ann@example.com', 'Hello')
+        start_flusher(app)
+        flusher = app.extensions['contact_spool_flusher']
+        assert flusher._thread.is_alive()
+        stop_flusher(app)
+        assert not flusher._thread.is_alive()
+        assert app.extensions['contact_spool'].pending() == 0
+        with app.app_context():
+            assert [m.name for m in Message.query.all()] == ['Ann']